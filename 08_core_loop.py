@@ -3,22 +3,38 @@
 # This file is part of Tablebot-pipe-Advanced and is licensed under the GNU GPL v3.0.
 # See the LICENSE file for details.
 #!/usr/bin/env python3
+import os
 import signal
 import asyncio
-import sys
+import argparse
+import ssl
+from contextlib import suppress
+from dataclasses import dataclass
 from pathlib import Path
 
-
+import certifi
+import aiogram
+from aiohttp import ClientSession, TCPConnector
+from aiohttp.hdrs import USER_AGENT
+from aiohttp.http import SERVER_SOFTWARE
 
 from aiogram import Bot, Dispatcher, types
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.client.telegram import TelegramAPIServer
 from aiogram.fsm.context import FSMContext
-from aiogram.fsm.storage.memory import MemoryStorage
 from aiogram.filters import Command
 
 # Микро-импорты
 from core.token_loader import load_bot_token
-from core.table_loader import load_table
-from core.fsm_builder import extract_states_from_table, create_fsm_from_states
+from core.bot_manifest import BotSpec, BotManifest, load_manifest
+from core.table_reloader import TableReloader
+from core.sqlite_storage import SQLiteStorage
+from core.webhook import run_webhook, webhook_config_from_env
+from core.chat_serializer import ChatSerializer
+from core.pipeline_executor import get_worker_pool
+from core.session_directory import get_session_directory
+from core.integrations import get_integration_engine
+from core.metrics import UpdateTimer, register_bot, start_metrics_server
 
 # Старый импорт:
 # from core.message_sender import send_message_by_content
@@ -27,232 +43,374 @@ from core.fsm_builder import extract_states_from_table, create_fsm_from_states
 from core.message_sender import *
 
 from pipeline import *
+from pipeline.payload import SessionPayload, persist_payload
+from core.log import get_logger, setup_logging
 
-from core.commands_loader import extract_commands
+logger = get_logger("main")
 
 # --- Основная функция main ---
-async def main():
-    TABLE_FILE = sys.argv[1] if len(sys.argv) > 1 else "table.csv"
-    table_path = Path(TABLE_FILE)
-    
-    if not table_path.exists():
-        print(f"❌ Файл не найден: {TABLE_FILE}")
-        return
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Табличный Telegram-бот")
+    parser.add_argument("table", nargs="?", default="table.csv", help="файл таблицы (CSV/XLSX)")
+    parser.add_argument("--webhook", action="store_true",
+                        help="режим webhook вместо long polling (также BOT_MODE=webhook)")
+    parser.add_argument("--manifest",
+                        help="JSON-манифест нескольких ботов в одном процессе (также BOTS_MANIFEST)")
+    return parser.parse_args(argv)
 
-    token = load_bot_token()
-    if not token:
-        print("❌ Токен не найден!")
-        return
 
-    # Загрузка FSM
-    rows = load_table(TABLE_FILE)
-    states_found = extract_states_from_table(rows)
-    DynFSM = create_fsm_from_states(states_found)
-    print(f"🧠 Создано {len(states_found)} состояний")
+def setup_handlers(dp, bot, reloader):
+    """Регистрирует хендлеры: одинаково для polling и webhook"""
 
-    # Настройка бота
-    dp = Dispatcher(storage=MemoryStorage())
-    bot = Bot(token)
-    
-    # --- НАЧАЛО: Добавленный код для установки командного меню ---
-    print("[main] 🔄 Начинаю загрузку командного меню из таблицы...", file=sys.stderr)
-    try:
-        cmds = extract_commands(TABLE_FILE) # <- Вызов функции из core.commands_loader
-        if cmds:  # Проверяем, что команды найдены
-            await bot.set_my_commands(cmds)     # <- Установка команд боту
-            print(f"[main] ✅ Командное меню обновлено: {len(cmds)} команд.", file=sys.stderr)
-        else:
-            print(f"[main] ⚠️ Команды не найдены в таблице, меню не обновлено.", file=sys.stderr)
-    except Exception as e:
-        print(f"[main] ❌ Ошибка при установке командного меню: {e}", file=sys.stderr)
-        import traceback
-        traceback.print_exc()
-    # --- КОНЕЦ: Добавленный код ---
+    # Апдейты одного чата — строго по очереди, разных чатов — параллельно;
+    # при перегрузке свободный текст (не команда и не кнопка таблицы) отбрасывается
+    def is_free_text(update):
+        message = update.message
+        return bool(
+            message and message.text and not message.text.startswith("/")
+            and not reloader.snapshot.index.is_command(message.text)
+        )
+
+    async def reply_busy(chat_id):
+        await send_plain_text(bot, chat_id, "⏳ Бот сейчас перегружен, повторите через минуту", priority=PRIORITY_NOTIFICATION)
+
+    dp.update.outer_middleware(ChatSerializer(is_low_priority=is_free_text, on_shed=reply_busy))
 
-    # Хендлеры
+    # Хендлеры: снимок таблицы берётся один раз на апдейт
     @dp.message(Command("start", "reset"))
     async def start_handler(msg: types.Message, state: FSMContext):
         await state.set_data({"current_state": "start"})
         if msg.text == "/reset":
-            await msg.answer("🔄 Бот сброшен")
-        await handle_message(msg, state, table_path, DynFSM, bot)
+            await send_plain_text(bot, msg.chat.id, "🔄 Бот сброшен")
+        await handle_message(msg, state, reloader.snapshot, bot)
 
         
     @dp.message()
     async def message_handler(msg: types.Message, state: FSMContext):
-        # --- команда перезагрузки меню из таблицы ---
+        # --- команда перезагрузки таблицы и меню ---
         if msg.text == "/reload_menu":
-            cmds = extract_commands(str(table_path))
-            await bot.set_my_commands(cmds)
-            await msg.answer("✅ Меню перезагружено из таблицы")
+            snapshot = await asyncio.to_thread(reloader.reload, True) or reloader.snapshot
+            await apply_commands(bot, snapshot)
+            await send_plain_text(bot, msg.chat.id, "✅ Меню перезагружено из таблицы")
             return   # дальше не идём по pipeline
         # --- основной pipeline ---
-        await handle_message(msg, state, table_path, DynFSM, bot)
+        await handle_message(msg, state, reloader.snapshot, bot)
 
     @dp.callback_query()
     async def callback_handler(callback: types.CallbackQuery, state: FSMContext):
-        await handle_callback(callback, state, table_path, DynFSM, bot)
+        await handle_callback(callback, state, reloader.snapshot, bot)
 
-    # Запуск
-    print("🚀 Бот запущен. Ctrl+C для остановки.")
-    
+
+@dataclass
+class BotApp:
+    """Запущенный бот процесса"""
+    spec: BotSpec
+    bot: Bot
+    dp: Dispatcher
+    reloader: TableReloader
+
+
+class PooledSession(AiohttpSession):
+    """AiohttpSession со своим TCPConnector(limit=...): aiogram 3.1 не принимает limit в конструкторе"""
+
+    def __init__(self, limit, **kwargs):
+        super().__init__(**kwargs)
+        self.limit = limit
+        self._client = None
+
+    async def create_session(self):
+        if self._client is None or self._client.closed:
+            connector = TCPConnector(limit=self.limit, ssl=ssl.create_default_context(cafile=certifi.where()))
+            self._client = ClientSession(
+                connector=connector,
+                headers={USER_AGENT: f"{SERVER_SOFTWARE} aiogram/{aiogram.__version__}"},
+            )
+        return self._client
+
+    async def close(self):
+        if self._client is not None and not self._client.closed:
+            await self._client.close()
+
+
+def create_shared_session(limit):
+    """Одна HTTP-сессия на всех ботов процесса: общий пул соединений к Bot API.
+
+    TELEGRAM_API_URL — свой сервер Bot API (локальный telegram-bot-api или bench.fake_telegram).
+    """
+    api_url = os.getenv("TELEGRAM_API_URL")
+    if api_url:
+        return PooledSession(limit, api=TelegramAPIServer.from_base(api_url))
+    return PooledSession(limit)
+
+
+async def start_bot(spec, session):
+    """Поднимает одного бота: своё FSM-хранилище, скомпилированная таблица, хендлеры и меню"""
+    if not Path(spec.table).exists():
+        raise FileNotFoundError(f"Файл не найден: {spec.table}")
+
+    # FSM-сессии переживают рестарт (SQLite, отложенная запись); у каждого бота свой файл
+    storage = SQLiteStorage(spec.fsm_db)
     try:
-        await dp.start_polling(bot)
-    except KeyboardInterrupt:
-        print("\n🛑 Остановка по запросу пользователя...")
+        dp = Dispatcher(storage=storage)
+        bot = Bot(spec.token, session=session)
+        register_bot(bot.id, spec.name)
+        # Справочник сессий для рассылок по ролям: заполняется один раз при старте
+        get_session_directory(bot.id).load(await storage.iter_sessions())
+
+        # Загрузка и компиляция таблицы: строки, индекс, FSM и команды в одном снимке
+        reloader = TableReloader(spec.table, on_reload=lambda snapshot: apply_commands(bot, snapshot))
+        snapshot = reloader.snapshot
+        logger.info("🧠 [%s] Создано %s состояний", spec.name, len(snapshot.states))
+
+        # --- Установка командного меню ---
+        await apply_commands(bot, snapshot)
+    except BaseException:
+        await storage.close()
+        raise
+
+    # Прогрев кэша file_id: локальные медиа загружаются в служебный чат один раз
+    if spec.warmup_chat_id:
+        asyncio.create_task(warm_up_media(bot, snapshot.rows, spec.warmup_chat_id))
+
+    setup_handlers(dp, bot, reloader)
+
+    # Горячая перезагрузка таблицы без рестарта
+    reloader.start()
+    return BotApp(spec=spec, bot=bot, dp=dp, reloader=reloader)
+
+
+def stop_on_signals():
+    """Событие остановки: SIGINT/SIGTERM (в т.ч. от менеджера процессов) ставят его, а не убивают процесс"""
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    with suppress(NotImplementedError):
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(sig, stop.set)
+    return stop
+
+
+async def run_polling(apps, stop):
+    """Long polling всех ботов в одном цикле событий; работает до события stop.
+
+    Бот, у которого polling упал (например, отозван токен), не останавливает остальных.
+    """
+    async def poll(app):
+        try:
+            await app.dp.start_polling(app.bot, handle_signals=False, close_bot_session=False)
+        except Exception as e:
+            logger.exception("❌ [%s] Polling остановлен: %s", app.spec.name, e)
+
+    polling = asyncio.gather(*(poll(app) for app in apps))
+    stopping = asyncio.create_task(stop.wait())
+    try:
+        await asyncio.wait([polling, stopping], return_when=asyncio.FIRST_COMPLETED)
+        if stop.is_set():
+            logger.info("🛑 Остановка по запросу пользователя...")
     finally:
-        print("⏳ Завершаем работу...")
+        stopping.cancel()
+        for app in apps:
+            with suppress(RuntimeError):    # polling этого бота уже завершён
+                await app.dp.stop_polling()
+        await polling
+
+
+def manifest_from_args(args):
+    """Боты процесса: из манифеста или один бот из аргументов и окружения"""
+    manifest_path = args.manifest or os.getenv("BOTS_MANIFEST")
+    if manifest_path:
+        return load_manifest(manifest_path)
+
+    token = load_bot_token()
+    if not token:
+        raise ValueError("Токен не найден!")
+    warmup_chat_id = os.getenv("MEDIA_WARMUP_CHAT_ID")
+    return BotManifest(bots=(BotSpec(
+        name="bot",
+        token=token,
+        table=args.table,
+        fsm_db=os.getenv("FSM_DB", ".fsm_sessions.sqlite"),
+        warmup_chat_id=int(warmup_chat_id) if warmup_chat_id else None,
+    ),))
+
+
+async def main():
+    setup_logging()
+    args = parse_args()
+    try:
+        manifest = manifest_from_args(args)
+    except (OSError, ValueError) as e:
+        logger.error("❌ %s", e)
+        return
+    multi = len(manifest.bots) > 1 or bool(args.manifest or os.getenv("BOTS_MANIFEST"))
+
+    # Все боты процесса — один цикл событий и один ограниченный пул HTTP-соединений
+    session = create_shared_session(manifest.http_limit)
+    apps = []
+    metrics_runner = None
+    try:
+        # /metrics для Prometheus (если задан METRICS_PORT)
+        metrics_runner = await start_metrics_server()
+        for spec, result in zip(manifest.bots, await asyncio.gather(
+            *(start_bot(spec, session) for spec in manifest.bots), return_exceptions=True
+        )):
+            if isinstance(result, BaseException):
+                logger.error("❌ [%s] Бот не запущен: %s", spec.name, result)
+            else:
+                apps.append(result)
+        if not apps:
+            return
+
+        # Запуск
+        webhook_mode = args.webhook or os.getenv("BOT_MODE", "polling") == "webhook"
+        logger.info("🚀 Запущено ботов: %s (%s). Ctrl+C для остановки.", len(apps), "webhook" if webhook_mode else "polling")
+
+        # Оба режима завершаются штатно по SIGINT/SIGTERM: finally ниже сбрасывает хранилища
+        stop = stop_on_signals()
+        if webhook_mode:
+            config = webhook_config_from_env()
+            # Несколько ботов — у каждого свой путь: /webhook/<name>
+            await run_webhook([
+                (app.dp, app.bot, f"{config.path}/{app.spec.name}" if multi else config.path)
+                for app in apps
+            ], config, stop)
+        else:
+            await run_polling(apps, stop)
+    except (KeyboardInterrupt, asyncio.CancelledError):
+        logger.info("🛑 Остановка по запросу пользователя...")
+    finally:
+        logger.info("⏳ Завершаем работу...")
+        for app in apps:
+            app.reloader.stop()
+        await close_schedulers()
+        await get_worker_pool().close()
+        await get_integration_engine().close()
+        if metrics_runner is not None:
+            await metrics_runner.cleanup()
         try:
-            await bot.session.close()
-            print("✅ Бот остановлен")
+            await session.close()
+            logger.info("✅ Боты остановлены")
         except:
-            print("✅ Бот остановлен (сессия уже закрыта)")
+            logger.info("✅ Боты остановлены (сессия уже закрыта)")
 
 
+# --- Командное меню ---
+async def apply_commands(bot, snapshot):
+    """Устанавливает командное меню бота из снимка таблицы"""
+    try:
+        if snapshot.commands:  # Проверяем, что команды найдены
+            await bot.set_my_commands(list(snapshot.commands))
+            logger.info("✅ Командное меню обновлено: %s команд.", len(snapshot.commands))
+        else:
+            logger.warning("⚠️ Команды не найдены в таблице, меню не обновлено.")
+    except Exception as e:
+        logger.exception("❌ Ошибка при установке командного меню: %s", e)
+
 
 # --- Обработчик сообщений ---
-async def handle_message(msg: types.Message, state: FSMContext, table_path, DynFSM, bot):
-    """Обрабатывает сообщение через pipeline функций с полным логированием"""
+async def handle_message(msg: types.Message, state: FSMContext, snapshot, bot):
+    """Обрабатывает сообщение через pipeline функций"""
+    # Замер этапов: метки — бот и process_name найденной строки
+    timer = UpdateTimer(bot.id)
+    process, outcome = None, "error"
     try:
-        print(f"🎯 [handler] НАЧАЛО ОБРАБОТКИ СООБЩЕНИЯ", file=sys.stderr)
-        
         # === ШАГ 1: Получение данных из FSM ===
-        print(f"📥 [handler] Получение данных из FSM...", file=sys.stderr)
         data = await state.get_data()
+        timer.lap("fsm_read")
         current_state = data.get("current_state", "start")
         user_role = data.get("user_role", "client")
         
-        print(f"📊 [handler] Текущее состояние: {current_state!r}", file=sys.stderr)
-        print(f"👤 [handler] Роль пользователя: {user_role!r}", file=sys.stderr)
-        print(f"🗂️ [handler] Все ключи в FSM: {list(data.keys())}", file=sys.stderr)
-        
-        # Детальное логирование важных полей
-        for key in ['address', 'from_address', 'to_address', 'phone', 'location']:
-            if key in data:
-                print(f"📋 [handler] {key} в FSM: {data[key]!r}", file=sys.stderr)
-        
         # === ШАГ 2: Обработка входящего сообщения ===
-        print(f"📨 [handler] Обработка входящего сообщения...", file=sys.stderr)
-        
         # ИНИЦИАЛИЗАЦИЯ user_input ДО использования (исправление ошибки)
         user_input = msg.text or ""
         location_data = None
         
         # Обработка геолокации
         if msg.location:
-            print(f"📍 [handler] Обнаружена геолокация!", file=sys.stderr)
             user_input = "<location>"
             location_data = {
                 "latitude": msg.location.latitude,
                 "longitude": msg.location.longitude
             }
-            print(f"📍 [handler] Координаты: {location_data}", file=sys.stderr)
         
-        print(f"📝 [handler] Обработанный ввод: {user_input!r}", file=sys.stderr)
+        logger.debug("📨 [handler] chat=%s state=%r role=%r input=%r", msg.chat.id, current_state, user_role, user_input)
         
         # === ШАГ 3: Формирование payload ===
-        print(f"🔄 [handler] Формирование payload...", file=sys.stderr)
-        
-        # ВАЖНО: Копируем ВСЕ данные из FSM в payload чтобы не потерять их
-        payload = data.copy()
-        payload.update({
-            "current_state": current_state,
-            "text": user_input,  # Используем инициализированную переменную
-            "user_role": user_role, 
-            "chat_id": msg.chat.id
-        })
+        # Payload поверх данных сессии: в FSM уйдут только изменённые ключи
+        payload = SessionPayload(data)
+        payload["current_state"] = current_state
+        payload["user_role"] = user_role
+        payload["chat_id"] = msg.chat.id
+        # Текст — вход текущего апдейта; в сессию попадает только через save:
+        payload.set_input("text", user_input)
         
         # Добавляем location в payload если есть
         if location_data:
             payload["location"] = location_data
-            print(f"📍 [handler] Location добавлен в payload", file=sys.stderr)
-        
-        print(f"📦 [handler] Payload сформирован. Ключи: {list(payload.keys())}", file=sys.stderr)
-        print(f"🔍 [handler] Детали payload:", file=sys.stderr)
-        for key, value in payload.items():
-            if key not in ['location']:  # Не логируем большие объекты
-                print(f"   {key}: {value!r}", file=sys.stderr)
         
         # === ШАГ 4: Запуск пайплайна обработки ===
-        print(f"⚙️ [handler] Запуск пайплайна обработки...", file=sys.stderr)
-        
         # 4.1 Поиск подходящей строки в таблице
-        print(f"🔍 [handler] Поиск строки в таблице...", file=sys.stderr)
-        row = find_row(table_path, current_state, payload['text'], user_role)
+        row, captures = match_row(snapshot.index, current_state, payload['text'], user_role)
+        timer.lap("find_row")
         
         if not row:
-            print(f"❌ [handler] Строка не найдена в таблице", file=sys.stderr)
-            await bot.send_message(msg.chat.id, "❌ Команда не распознана")
+            logger.info("❌ [handler] Строка не найдена: state=%r, input=%r", current_state, user_input)
+            await send_plain_text(bot, msg.chat.id, "❌ Команда не распознана")
+            timer.lap("send")
+            outcome = "not_found"
             return
-        
-        print(f"✅ [handler] Найдена строка: from_state={row.get('from_state')!r} -> to_state={row.get('to_state')!r}", file=sys.stderr)
+        process = row.get("process_name")
+        # Поля, захваченные шаблонной командой (re:, <phone>, range: ...), сохраняются в сессию
+        if captures:
+            payload.update(captures)
         
         # 4.2 Проверка условий (guards)
-        print(f"🛡️ [handler] Проверка условий...", file=sys.stderr)
         skip = check_guard(row, payload, current_state)
-        print(f"🛡️ [handler] Результат проверки условий: skip={skip}", file=sys.stderr)
+        timer.lap("check_guard")
         
         # 4.3 Выполнение эффектов (если условия пройдены)
         if not skip:
-            print(f"⚡ [handler] Выполнение эффектов...", file=sys.stderr)
             await execute_effect(row, payload, bot)
-            print(f"✅ [handler] Эффекты выполнены", file=sys.stderr)
-        else:
-            print(f"⏭️ [handler] Эффекты пропущены (skip=True)", file=sys.stderr)
+        timer.lap("execute_effect")
         
-        # 4.4 Построение сообщения
-        print(f"💬 [handler] Построение контента сообщения...", file=sys.stderr)
-        message_content = build_message_content(row, payload)
-        if message_content:
-            print(f"✅ [handler] Контент сообщения построен: type={message_content.get('type')}", file=sys.stderr)
-        else:
-            print(f"ℹ️ [handler] Контент сообщения пустой", file=sys.stderr)
-        
-        # 4.5 Подготовка интеграций
-        print(f"🔌 [handler] Подготовка интеграций...", file=sys.stderr)
+        # 4.4 Интеграции: поля ответа попадают в payload до построения сообщения
         integration = prepare_integration(row)
-        if integration:
-            print(f"🔌 [handler] Интеграция подготовлена: {integration}", file=sys.stderr)
+        if integration and not skip:
+            await run_integration(integration, payload)
+            timer.lap("integration")
+        
+        # 4.5 Построение сообщения
+        message_content = build_message_content(row, payload)
         
         # 4.6 Определение следующего состояния
-        print(f"🔄 [handler] Определение перехода...", file=sys.stderr)
         next_state = determine_transition(row, skip)
-        print(f"🔄 [handler] Следующее состояние: {next_state!r}", file=sys.stderr)
+        timer.lap("build_message")
         
         # === ШАГ 5: Отправка результата пользователю ===
-        print(f"📤 [handler] Отправка результата пользователю...", file=sys.stderr)
         if message_content:
             await send_message_by_content(bot, msg.chat.id, message_content)
-            print(f"✅ [handler] Сообщение отправлено", file=sys.stderr)
-        
-        if integration:
-            print(f"🔌 [handler] Интеграция: {integration}", file=sys.stderr)
+        timer.lap("send")
         
         # === ШАГ 6: Обновление состояния FSM ===
-        print(f"💾 [handler] Обновление состояния FSM...", file=sys.stderr)
+        if next_state and hasattr(snapshot.fsm, next_state):
+            await state.set_state(getattr(snapshot.fsm, next_state))
         
-        if next_state and hasattr(DynFSM, next_state):
-            await state.set_state(getattr(DynFSM, next_state))
-            print(f"✅ [handler] Состояние FSM установлено: {next_state!r}", file=sys.stderr)
+        # Сохраняем в FSM только изменения (без изменений запись пропускается)
+        payload['current_state'] = next_state if next_state else current_state
+        if await persist_payload(state, payload):
+            get_session_directory(bot.id).update(msg.chat.id, payload)
+        timer.lap("fsm_write")
+        outcome = "ok"
         
-        # ВАЖНО: ВСЕГДА сохраняем все данные payload в FSM
-        new_payload = payload.copy()
-        new_payload['current_state'] = next_state if next_state else current_state
-        await state.update_data(**new_payload)
-        
-        print(f"🔄 [handler] ПЕРЕХОД ВЫПОЛНЕН: {current_state!r} → {next_state!r}", file=sys.stderr)
-        print(f"💾 [handler] Сохраненные ключи в FSM: {list(new_payload.keys())}", file=sys.stderr)
-        print(f"🎯 [handler] ОБРАБОТКА ЗАВЕРШЕНА УСПЕШНО", file=sys.stderr)
+        logger.debug("🔄 [handler] Переход: %r → %r (строка %s, skip=%s)", current_state, next_state, row.line, skip)
 
     except Exception as e:
-        print(f"💥 [handler] КРИТИЧЕСКАЯ ОШИБКА: {e}", file=sys.stderr)
-        import traceback
-        print(f"💥 [handler] Трассировка ошибки:", file=sys.stderr)
-        traceback.print_exc(file=sys.stderr)
-        await bot.send_message(msg.chat.id, "⚠️ Ошибка обработки")
+        logger.exception("💥 [handler] КРИТИЧЕСКАЯ ОШИБКА: %s", e)
+        await send_plain_text(bot, msg.chat.id, "⚠️ Ошибка обработки")
+    finally:
+        timer.finish(process, outcome)
 
 # --- Обработчик callback'ов ---
-async def handle_callback(callback: types.CallbackQuery, state: FSMContext, table_path, DynFSM, bot):
+async def handle_callback(callback: types.CallbackQuery, state: FSMContext, snapshot, bot):
     """Обрабатывает нажатия на inline-кнопки"""
     # Создаем fake-message из callback данных
     fake_message = types.Message(
@@ -264,7 +422,7 @@ async def handle_callback(callback: types.CallbackQuery, state: FSMContext, tabl
     )
     
     # Обрабатываем как обычное сообщение
-    await handle_message(fake_message, state, table_path, DynFSM, bot)
+    await handle_message(fake_message, state, snapshot, bot)
     await callback.answer()  # Подтверждаем нажатие
 
 
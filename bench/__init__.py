@@ -0,0 +1,5 @@
+# Copyright (C) 2025 Leonid Yasin
+# This file is part of Tablebot-pipe-Advanced and is licensed under the GNU GPL v3.0.
+# See the LICENSE file for details.
+# Бенчмарк pipeline: table_gen — синтетические таблицы и трассы,
+# fake_bot — бот без сети, runner — прогон и отчёт, compare — сравнение отчётов.
@@ -0,0 +1,87 @@
+# \tablebot-pipe-advanced\bench\compare.py
+# Copyright (C) 2025 Leonid Yasin
+# This file is part of Tablebot-pipe-Advanced and is licensed under the GNU GPL v3.0.
+# See the LICENSE file for details.
+#!/usr/bin/env python3
+"""Сравнение двух отчётов bench.runner.
+
+    python -m bench.compare base.json new.json --threshold 0.15
+
+Код выхода 1, если p95 хотя бы одного этапа (или handle_message) вырос
+больше чем на threshold, либо пропускная способность упала больше чем на
+threshold. Этапы короче --min-us не проверяются: их шум больше сигнала.
+"""
+import sys
+import json
+import argparse
+
+METRICS = ("p50_us", "p95_us", "p99_us")
+
+
+def _load(path):
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _delta(base, new):
+    if not base:
+        return None
+    return (new - base) / base
+
+
+def compare(base, new, threshold=0.15, min_us=5.0):
+    """Строки таблицы сравнения и список регрессий"""
+    lines = []
+    regressions = []
+
+    rows = [("handle_message", base.get("handle_message", {}), new.get("handle_message", {}))]
+    for stage in sorted(set(base.get("stages", {})) | set(new.get("stages", {}))):
+        rows.append((stage, base["stages"].get(stage, {}), new["stages"].get(stage, {})))
+
+    lines.append(f"{'этап':<26}" + "".join(f"{m:>22}" for m in METRICS))
+    for stage, old, cur in rows:
+        cells = []
+        for metric in METRICS:
+            before, after = old.get(metric), cur.get(metric)
+            if before is None or after is None:
+                cells.append(f"{'—':>22}")
+                continue
+            delta = _delta(before, after)
+            cells.append(f"{before:>8.1f} → {after:>8.1f} {delta:+.0%}".rjust(22) if delta is not None else f"{after:>22.1f}")
+            if metric == "p95_us" and delta is not None and delta > threshold and max(before, after) >= min_us:
+                regressions.append(f"{stage}: p95 {before:.1f} → {after:.1f} мкс ({delta:+.0%})")
+        lines.append(f"{stage:<26}" + "".join(cells))
+
+    before, after = base.get("throughput_per_s"), new.get("throughput_per_s")
+    if before and after:
+        delta = _delta(before, after)
+        lines.append(f"{'throughput_per_s':<26}{before:>10.1f} → {after:.1f} ({delta:+.0%})")
+        if delta < -threshold:
+            regressions.append(f"throughput: {before:.1f} → {after:.1f} сообщений/с ({delta:+.0%})")
+    return lines, regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Сравнение отчётов бенчмарка")
+    parser.add_argument("base")
+    parser.add_argument("new")
+    parser.add_argument("--threshold", type=float, default=0.15, help="допустимый рост p95 (доля)")
+    parser.add_argument("--min-us", type=float, default=5.0, help="этапы быстрее не проверяются")
+    args = parser.parse_args(argv)
+
+    base, new = _load(args.base), _load(args.new)
+    if base["meta"].get("args") != new["meta"].get("args"):
+        print("⚠️ Параметры прогонов различаются — сравнение может быть некорректным", file=sys.stderr)
+
+    lines, regressions = compare(base, new, args.threshold, args.min_us)
+    print(f"{base['meta'].get('commit')} → {new['meta'].get('commit')}")
+    print("\n".join(lines))
+    if regressions:
+        print("\n❌ Регрессии:\n  " + "\n  ".join(regressions))
+        return 1
+    print("\n✅ Регрессий нет")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,60 @@
+# \tablebot-pipe-advanced\bench\fake_bot.py
+# Copyright (C) 2025 Leonid Yasin
+# This file is part of Tablebot-pipe-Advanced and is licensed under the GNU GPL v3.0.
+# See the LICENSE file for details.
+#!/usr/bin/env python3
+import asyncio
+import itertools
+from collections import Counter, deque
+from types import SimpleNamespace
+
+
+class FakeBot:
+    """Бот без сети: записывает вызовы Bot API и отвечает минимальным «сообщением».
+
+    Хранит последние max_records вызовов (method, kwargs) и счётчик по методам —
+    память не растёт на длинных прогонах. latency — искусственная задержка
+    ответа API в секундах (0 — без await-пауз, чистая стоимость pipeline).
+    """
+
+    def __init__(self, bot_id=4242, max_records=1000, latency=0.0):
+        self.id = bot_id
+        self.latency = latency
+        self.calls = Counter()
+        self.records = deque(maxlen=max_records)
+        self._message_ids = itertools.count(1)
+
+    async def _call(self, method, kwargs):
+        self.calls[method] += 1
+        self.records.append((method, kwargs))
+        if self.latency:
+            await asyncio.sleep(self.latency)
+
+    def _message(self, chat_id, **fields):
+        return SimpleNamespace(message_id=next(self._message_ids), chat=SimpleNamespace(id=chat_id), **fields)
+
+    async def send_message(self, chat_id, text, **kwargs):
+        await self._call("send_message", dict(chat_id=chat_id, text=text, **kwargs))
+        return self._message(chat_id, text=text)
+
+    async def _send_media(self, method, kind, chat_id, kwargs):
+        await self._call(method, dict(chat_id=chat_id, **kwargs))
+        file = SimpleNamespace(file_id=f"fake-{kind}-{self.calls[method]}")
+        return self._message(chat_id, **{kind: [file] if kind == "photo" else file})
+
+    async def send_photo(self, chat_id, photo, **kwargs):
+        return await self._send_media("send_photo", "photo", chat_id, dict(photo=photo, **kwargs))
+
+    async def send_document(self, chat_id, document, **kwargs):
+        return await self._send_media("send_document", "document", chat_id, dict(document=document, **kwargs))
+
+    async def send_video(self, chat_id, video, **kwargs):
+        return await self._send_media("send_video", "video", chat_id, dict(video=video, **kwargs))
+
+    async def send_poll(self, chat_id, question, options, **kwargs):
+        await self._call("send_poll", dict(chat_id=chat_id, question=question, options=options, **kwargs))
+        return self._message(chat_id, poll=SimpleNamespace(question=question))
+
+    async def set_my_commands(self, commands, **kwargs):
+        await self._call("set_my_commands", dict(commands=commands, **kwargs))
+        return True
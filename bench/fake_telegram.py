@@ -0,0 +1,480 @@
+# \tablebot-pipe-advanced\bench\fake_telegram.py
+# Copyright (C) 2025 Leonid Yasin
+# This file is part of Tablebot-pipe-Advanced and is licensed under the GNU GPL v3.0.
+# See the LICENSE file for details.
+#!/usr/bin/env python3
+"""Локальная замена Telegram Bot API для сквозного нагрузочного теста.
+
+    python -m bench.fake_telegram --users 500 --think 0.2 --duration 60 --out e2e.json
+    TELEGRAM_API_URL=http://127.0.0.1:8081 BOT_TOKEN=42:bench SEND_GLOBAL_RATE=1e9 \\
+        python 08_core_loop.py table_taxi_deliv.csv
+
+Сервер отдаёт getUpdates от популяции виртуальных пользователей и принимает
+sendMessage/sendPhoto/sendVideo/sendDocument/sendPoll/setMyCommands. Каждый
+пользователь работает по замкнутому циклу: отправил апдейт → дождался ответа
+бота → пауза think → нажал случайную кнопку из присланной клавиатуры (reply
+или inline). С --trace пользователи вместо кнопок воспроизводят трассу
+bench.table_gen по своим chat_id.
+
+Отказы Telegram включаются флагами и на лету через POST /_control
+({"error_429": 0.05, "retry_after": 1, "slow_ratio": 0.1, "slow_seconds": 2}):
+доля ответов 429 RetryAfter и доля медленных ответов на отправку.
+GET /_stats — текущий отчёт. Один сервер обслуживает одного бота.
+
+Отчёт — JSON: апдейты и ответы в секунду, задержка доставки (апдейт
+поставлен в очередь → забран getUpdates) и сквозная задержка (апдейт
+поставлен → первый ответ бота в этот чат), мкс.
+"""
+import sys
+import json
+import time
+import random
+import asyncio
+import argparse
+import itertools
+from array import array
+from collections import Counter, deque
+from contextlib import suppress
+from pathlib import Path
+
+from aiohttp import web
+
+from bench.runner import summarize
+from bench.table_gen import load_trace
+
+# Методы, на которые действуют 429 и медленные ответы
+SEND_METHODS = ("sendmessage", "sendphoto", "sendvideo", "senddocument", "sendpoll")
+
+
+class Stats:
+    """Счётчики и замеры с момента последнего reset()"""
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.started = time.monotonic()
+        self.updates = 0
+        self.replies = 0
+        self.timeouts = 0
+        self.methods = Counter()
+        self.injected = Counter()
+        self.delivery = array("d")
+        self.e2e = array("d")
+
+    def report(self):
+        elapsed = time.monotonic() - self.started
+        return {
+            "elapsed_s": round(elapsed, 2),
+            "updates": self.updates,
+            "updates_per_s": round(self.updates / elapsed, 1) if elapsed else None,
+            "replies": self.replies,
+            "replies_per_s": round(self.replies / elapsed, 1) if elapsed else None,
+            "reply_timeouts": self.timeouts,
+            "delivery": summarize(self.delivery),
+            "e2e": summarize(self.e2e),
+            "methods": dict(self.methods),
+            "injected": dict(self.injected),
+        }
+
+
+class VirtualUser:
+    __slots__ = ("chat_id", "name", "script", "keyboard", "inline", "sent_at", "replied")
+
+    def __init__(self, chat_id, script=None):
+        self.chat_id = chat_id
+        self.name = f"user{chat_id}"
+        self.script = deque(script) if script is not None else None
+        self.keyboard = []          # кнопки reply-клавиатуры (живут до remove_keyboard)
+        self.inline = None          # (message_id, кнопки) последнего сообщения бота
+        self.sent_at = None         # время постановки апдейта, ждущего ответа
+        self.replied = asyncio.Event()
+
+
+class FakeTelegram:
+    """Bot API на aiohttp с виртуальными пользователями и инъекцией отказов"""
+
+    def __init__(self, users=100, think=0.5, start_text="/start", trace=None,
+                 restart=0.02, reply_timeout=10.0, error_429=0.0, retry_after=1,
+                 slow_ratio=0.0, slow_seconds=1.0, seed=1):
+        self.rng = random.Random(seed)
+        self.think = think
+        self.start_text = start_text
+        self.restart = restart
+        self.reply_timeout = reply_timeout
+        self.error_429 = error_429
+        self.retry_after = retry_after
+        self.slow_ratio = slow_ratio
+        self.slow_seconds = slow_seconds
+
+        if trace is not None:
+            scripts = {}
+            for event in trace:
+                scripts.setdefault(int(event["chat_id"]), []).append(event)
+            self.users = {chat_id: VirtualUser(chat_id, events) for chat_id, events in scripts.items()}
+        else:
+            self.users = {10000 + i: VirtualUser(10000 + i) for i in range(users)}
+
+        self.stats = Stats()
+        self.polling = asyncio.Event()      # бот начал опрашивать getUpdates
+        self._updates = deque()
+        self._enqueued = {}                 # update_id -> время постановки (до первой выдачи)
+        self._arrived = asyncio.Event()
+        self._update_ids = itertools.count(1)
+        self._message_ids = itertools.count(1)
+        self._file_ids = itertools.count(1)
+        self._tasks = []
+        self._closed = False
+        self._methods = {
+            "getme": self._get_me,
+            "getupdates": self._get_updates,
+            "sendmessage": self._send_message,
+            "sendphoto": self._send_photo,
+            "sendvideo": self._send_video,
+            "senddocument": self._send_document,
+            "sendpoll": self._send_poll,
+        }
+
+    # --- HTTP ---
+
+    def create_app(self):
+        app = web.Application()
+        app.router.add_post("/bot{token}/{method}", self._api)
+        app.router.add_get("/bot{token}/{method}", self._api)
+        app.router.add_get("/_stats", self._stats_view)
+        app.router.add_post("/_control", self._control_view)
+        return app
+
+    async def _params(self, request):
+        params = dict(request.query)
+        if request.can_read_body:
+            if request.content_type == "application/json":
+                params.update(await request.json())
+            else:
+                params.update(await request.post())
+        return params
+
+    async def _api(self, request):
+        method = request.match_info["method"].lower()
+        self.stats.methods[method] += 1
+        params = await self._params(request)
+
+        if method in SEND_METHODS:
+            if self.error_429 and self.rng.random() < self.error_429:
+                self.stats.injected["429"] += 1
+                return web.json_response({
+                    "ok": False,
+                    "error_code": 429,
+                    "description": f"Too Many Requests: retry after {self.retry_after}",
+                    "parameters": {"retry_after": self.retry_after},
+                }, status=429)
+            if self.slow_ratio and self.rng.random() < self.slow_ratio:
+                self.stats.injected["slow"] += 1
+                await asyncio.sleep(self.slow_seconds)
+
+        handler = self._methods.get(method)
+        result = await handler(request.match_info["token"], params) if handler else True
+        return web.json_response({"ok": True, "result": result})
+
+    async def _stats_view(self, request):
+        return web.json_response(self.report())
+
+    async def _control_view(self, request):
+        """Инъекция отказов на лету: error_429, retry_after, slow_ratio, slow_seconds, think"""
+        changes = await request.json()
+        for name in ("error_429", "retry_after", "slow_ratio", "slow_seconds", "think"):
+            if name in changes:
+                setattr(self, name, type(getattr(self, name))(changes[name]))
+        print(f"⚙️ {changes}", file=sys.stderr)
+        return web.json_response({name: getattr(self, name) for name in
+                                  ("error_429", "retry_after", "slow_ratio", "slow_seconds", "think")})
+
+    # --- Методы Bot API ---
+
+    async def _get_me(self, token, params):
+        bot_id = int(token.split(":", 1)[0]) if token.split(":", 1)[0].isdigit() else 42
+        return {"id": bot_id, "is_bot": True, "first_name": "Bench", "username": "bench_bot"}
+
+    async def _get_updates(self, token, params):
+        self.polling.set()
+        offset = int(params.get("offset") or 0)
+        limit = min(int(params.get("limit") or 100), 100)
+        timeout = float(params.get("timeout") or 0)
+
+        # Апдейты до offset подтверждены ботом
+        while self._updates and self._updates[0]["update_id"] < offset:
+            self._updates.popleft()
+        if not self._updates and timeout and not self._closed:
+            self._arrived.clear()
+            with suppress(asyncio.TimeoutError):
+                await asyncio.wait_for(self._arrived.wait(), timeout)
+
+        batch = list(itertools.islice(self._updates, limit))
+        now = time.monotonic()
+        for update in batch:
+            enqueued = self._enqueued.pop(update["update_id"], None)
+            if enqueued is not None:
+                self.stats.delivery.append(now - enqueued)
+        return batch
+
+    def _message(self, chat_id, **fields):
+        return {
+            "message_id": next(self._message_ids),
+            "date": int(time.time()),
+            "chat": {"id": int(chat_id), "type": "private"},
+            **fields,
+        }
+
+    def _file(self, kind):
+        index = next(self._file_ids)
+        return {"file_id": f"fake-{kind}-{index}", "file_unique_id": f"u{index}"}
+
+    async def _send_message(self, token, params):
+        message = self._message(params["chat_id"], text=str(params.get("text", "")))
+        self._on_reply(message, params.get("reply_markup"))
+        return message
+
+    async def _send_photo(self, token, params):
+        sizes = [dict(self._file("photo"), width=w, height=w) for w in (90, 320)]
+        message = self._message(params["chat_id"], photo=sizes)
+        self._on_reply(message, params.get("reply_markup"))
+        return message
+
+    async def _send_video(self, token, params):
+        video = dict(self._file("video"), width=640, height=360, duration=1)
+        message = self._message(params["chat_id"], video=video)
+        self._on_reply(message, params.get("reply_markup"))
+        return message
+
+    async def _send_document(self, token, params):
+        message = self._message(params["chat_id"], document=self._file("document"))
+        self._on_reply(message, params.get("reply_markup"))
+        return message
+
+    async def _send_poll(self, token, params):
+        options = params.get("options") or "[]"
+        options = json.loads(options) if isinstance(options, str) else options
+        message = self._message(params["chat_id"], poll={
+            "id": str(next(self._message_ids)),
+            "question": str(params.get("question", "")),
+            "options": [{"text": str(text), "voter_count": 0} for text in options],
+            "total_voter_count": 0,
+            "is_closed": False,
+            "is_anonymous": True,
+            "type": "regular",
+            "allows_multiple_answers": False,
+        })
+        self._on_reply(message, params.get("reply_markup"))
+        return message
+
+    # --- Виртуальные пользователи ---
+
+    def _on_reply(self, message, markup):
+        """Ответ бота: запоминаем клавиатуру и закрываем замер сквозной задержки"""
+        self.stats.replies += 1
+        user = self.users.get(message["chat"]["id"])
+        if user is None:
+            return
+        markup = json.loads(markup) if isinstance(markup, str) else (markup or {})
+        if "keyboard" in markup:
+            user.keyboard = [button for row in markup["keyboard"] for button in row]
+        elif markup.get("remove_keyboard"):
+            user.keyboard = []
+        buttons = [button for row in markup.get("inline_keyboard", ()) for button in row
+                   if button.get("callback_data")]
+        user.inline = (message["message_id"], buttons) if buttons else None
+
+        if user.sent_at is not None:
+            self.stats.e2e.append(time.monotonic() - user.sent_at)
+            user.sent_at = None
+            user.replied.set()
+
+    def _user_json(self, user):
+        return {"id": user.chat_id, "is_bot": False, "first_name": user.name}
+
+    def _message_update(self, user, text=None, location=None):
+        message = {
+            "message_id": next(self._message_ids),
+            "date": int(time.time()),
+            "chat": {"id": user.chat_id, "type": "private", "first_name": user.name},
+            "from": self._user_json(user),
+        }
+        if location is not None:
+            message["location"] = {"latitude": location[0], "longitude": location[1]}
+        else:
+            message["text"] = text
+        return {"message": message}
+
+    def _callback_update(self, user, message_id, data):
+        return {"callback_query": {
+            "id": str(next(self._message_ids)),
+            "from": self._user_json(user),
+            "chat_instance": "bench",
+            "data": data,
+            "message": {
+                "message_id": message_id,
+                "date": int(time.time()),
+                "chat": {"id": user.chat_id, "type": "private"},
+                "text": "",
+            },
+        }}
+
+    def _random_location(self):
+        return [55.75 + self.rng.random() / 100, 37.62 + self.rng.random() / 100]
+
+    def _next_update(self, user, first):
+        """Следующее действие пользователя; None — сценарий закончен"""
+        if user.script is not None:
+            if not user.script:
+                return None
+            event = user.script.popleft()
+            return self._message_update(user, text=event.get("text"), location=event.get("location"))
+
+        if first or self.rng.random() < self.restart:
+            return self._message_update(user, text=self.start_text)
+        options = [("reply", button) for button in user.keyboard]
+        if user.inline:
+            options.extend(("inline", button) for button in user.inline[1])
+        if not options:
+            # Клавиатуры нет: свободный ввод (строки <text>) или перезапуск
+            if self.rng.random() < 0.7:
+                return self._message_update(user, text=f"ввод {self.rng.randrange(10 ** 6)}")
+            return self._message_update(user, text=self.start_text)
+
+        kind, button = self.rng.choice(options)
+        if kind == "inline":
+            return self._callback_update(user, user.inline[0], button["callback_data"])
+        if button.get("request_location"):
+            return self._message_update(user, location=self._random_location())
+        return self._message_update(user, text=button["text"])
+
+    def _enqueue(self, update):
+        update["update_id"] = update_id = next(self._update_ids)
+        self._updates.append(update)
+        self._enqueued[update_id] = time.monotonic()
+        self.stats.updates += 1
+        self._arrived.set()
+
+    async def _run_user(self, user):
+        first = True
+        while True:
+            update = self._next_update(user, first)
+            if update is None:
+                return
+            first = False
+            user.replied.clear()
+            user.sent_at = time.monotonic()
+            self._enqueue(update)
+            try:
+                await asyncio.wait_for(user.replied.wait(), self.reply_timeout)
+            except asyncio.TimeoutError:
+                # Бот не ответил (нет строки, ошибка) — идём дальше, без замера
+                user.sent_at = None
+                self.stats.timeouts += 1
+            if self.think:
+                await asyncio.sleep(self.rng.expovariate(1 / self.think))
+
+    def start_users(self):
+        self._tasks = [asyncio.create_task(self._run_user(user)) for user in self.users.values()]
+        return self._tasks
+
+    async def stop_users(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+
+    def close(self):
+        """Отпускает висящие long polling-запросы: иначе остановка сервера ждёт их таймаут"""
+        self._closed = True
+        self._arrived.set()
+
+    def report(self):
+        report = self.stats.report()
+        report["users"] = len(self.users)
+        report["queued"] = len(self._updates)
+        return report
+
+
+async def serve(server, host="127.0.0.1", port=8081, duration=60.0, warmup=5.0, progress=5.0):
+    """Ждёт бота, гоняет пользователей warmup + duration секунд; возвращает отчёт"""
+    runner = web.AppRunner(server.create_app(), access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    print(f"🛰️ Bot API: http://{host}:{port} — ждём getUpdates от бота", file=sys.stderr)
+    try:
+        await server.polling.wait()
+        tasks = server.start_users()
+        print(f"👥 Пользователей: {len(server.users)}, прогрев {warmup} с", file=sys.stderr)
+        await asyncio.sleep(warmup)
+        server.stats.reset()
+
+        deadline = time.monotonic() + duration
+        done = asyncio.gather(*tasks, return_exceptions=True)
+        while time.monotonic() < deadline and not done.done():
+            await asyncio.wait({done}, timeout=min(progress, max(0.0, deadline - time.monotonic())))
+            snapshot = server.report()
+            print(f"📊 {snapshot['updates_per_s']} апд/с, {snapshot['replies_per_s']} отв/с, "
+                  f"e2e p95 {snapshot['e2e'].get('p95_us')} мкс, "
+                  f"429: {snapshot['injected'].get('429', 0)}", file=sys.stderr)
+        report = server.report()
+        await server.stop_users()
+        return report
+    finally:
+        server.close()
+        await runner.cleanup()
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Локальный Bot API для сквозного нагрузочного теста")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8081)
+    users = parser.add_argument_group("пользователи")
+    users.add_argument("--users", type=int, default=100, help="виртуальных пользователей")
+    users.add_argument("--think", type=float, default=0.5, help="средняя пауза между действиями, секунд")
+    users.add_argument("--start-text", default="/start", help="первая команда пользователя")
+    users.add_argument("--restart", type=float, default=0.02, help="доля действий «начать заново»")
+    users.add_argument("--trace", help="JSONL-трасса bench.table_gen вместо случайных нажатий")
+    users.add_argument("--reply-timeout", type=float, default=10.0, help="сколько ждать ответа бота")
+    faults = parser.add_argument_group("отказы")
+    faults.add_argument("--error-429", type=float, default=0.0, help="доля отправок с 429 RetryAfter")
+    faults.add_argument("--retry-after", type=int, default=1, help="retry_after в ответе 429, секунд")
+    faults.add_argument("--slow-ratio", type=float, default=0.0, help="доля медленных отправок")
+    faults.add_argument("--slow-seconds", type=float, default=1.0, help="задержка медленной отправки")
+    run = parser.add_argument_group("прогон")
+    run.add_argument("--duration", type=float, default=60.0, help="длительность замера, секунд")
+    run.add_argument("--warmup", type=float, default=5.0, help="прогрев без статистики, секунд")
+    run.add_argument("--progress", type=float, default=5.0, help="период промежуточной сводки")
+    run.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--out", help="куда записать JSON (по умолчанию stdout)")
+    return parser.parse_args(argv)
+
+
+async def _main(args):
+    server = FakeTelegram(
+        users=args.users, think=args.think, start_text=args.start_text,
+        trace=load_trace(args.trace) if args.trace else None, restart=args.restart,
+        reply_timeout=args.reply_timeout, error_429=args.error_429, retry_after=args.retry_after,
+        slow_ratio=args.slow_ratio, slow_seconds=args.slow_seconds, seed=args.seed,
+    )
+    return await serve(server, args.host, args.port, args.duration, args.warmup, args.progress)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    try:
+        report = asyncio.run(_main(args))
+    except KeyboardInterrupt:
+        return
+    report["args"] = {k: v for k, v in vars(args).items() if k != "out"}
+
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.out:
+        Path(args.out).write_text(text + "\n", encoding="utf-8")
+        print(f"{args.out}: {report['updates_per_s']} апд/с, "
+              f"e2e p95 {report['e2e'].get('p95_us')} мкс", file=sys.stderr)
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
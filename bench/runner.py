@@ -0,0 +1,290 @@
+# \tablebot-pipe-advanced\bench\runner.py
+# Copyright (C) 2025 Leonid Yasin
+# This file is part of Tablebot-pipe-Advanced and is licensed under the GNU GPL v3.0.
+# See the LICENSE file for details.
+#!/usr/bin/env python3
+"""Прогон трассы сообщений через handle_message с замером этапов pipeline.
+
+    python -m bench.runner --rows 10000 --events 20000 --out bench_10k.json
+    python -m bench.runner --table table_taxi_deliv.csv --events 5000
+    python -m bench.compare bench_base.json bench_10k.json
+
+Этапы (find_row, check_guard, execute_effect, ...) замеряются обёртками
+вокруг функций в пространстве имён 08_core_loop — сам обработчик не
+меняется. Отчёт — JSON: пропускная способность и p50/p95/p99 по этапам, мкс.
+"""
+import os
+import sys
+import gc
+import json
+import time
+import asyncio
+import inspect
+import argparse
+import platform
+import importlib
+import subprocess
+import tempfile
+import shutil
+from array import array
+from datetime import datetime
+from pathlib import Path
+
+from aiogram import types
+from aiogram.fsm.context import FSMContext
+from aiogram.fsm.storage.base import StorageKey
+from aiogram.fsm.storage.memory import MemoryStorage
+
+from bench.fake_bot import FakeBot
+from bench.table_gen import generate_table, make_trace, load_trace
+
+# Функции 08_core_loop, которые вызывает handle_message
+STAGES = (
+    "match_row",
+    "find_row",
+    "check_guard",
+    "execute_effect",
+    "prepare_integration",
+    "run_integration",
+    "build_message_content",
+    "determine_transition",
+    "send_message_by_content",
+    "send_plain_text",
+    "persist_payload",
+)
+
+
+class StageTimer:
+    """Длительности вызовов по этапам (секунды, array('d') — без объектов на замер)"""
+
+    def __init__(self):
+        self.samples = {}
+        self.enabled = True
+
+    def add(self, stage, seconds):
+        if self.enabled:
+            samples = self.samples.get(stage)
+            if samples is None:
+                samples = self.samples[stage] = array("d")
+            samples.append(seconds)
+
+    def wrap(self, stage, func):
+        perf_counter = time.perf_counter
+        add = self.add
+        if inspect.iscoroutinefunction(func):
+            async def timed(*args, **kwargs):
+                started = perf_counter()
+                try:
+                    return await func(*args, **kwargs)
+                finally:
+                    add(stage, perf_counter() - started)
+        else:
+            def timed(*args, **kwargs):
+                started = perf_counter()
+                try:
+                    return func(*args, **kwargs)
+                finally:
+                    add(stage, perf_counter() - started)
+        return timed
+
+    def summary(self):
+        return {stage: summarize(samples) for stage, samples in self.samples.items()}
+
+
+def summarize(samples):
+    """count, mean и перцентили (ближайший ранг) в микросекундах"""
+    ordered = sorted(samples)
+    count = len(ordered)
+    if not count:
+        return {"count": 0}
+
+    def pct(p):
+        return round(ordered[min(count - 1, max(0, int(p / 100 * count + 0.5) - 1))] * 1e6, 2)
+
+    return {
+        "count": count,
+        "mean_us": round(sum(ordered) / count * 1e6, 2),
+        "p50_us": pct(50),
+        "p95_us": pct(95),
+        "p99_us": pct(99),
+        "max_us": round(ordered[-1] * 1e6, 2),
+    }
+
+
+def _git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, timeout=5,
+        ).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def _message(index, event):
+    chat = types.Chat(id=event["chat_id"], type="private")
+    location = event.get("location")
+    return types.Message(
+        message_id=index,
+        date=datetime.now(),
+        chat=chat,
+        from_user=types.User(id=event["chat_id"], is_bot=False, first_name="bench"),
+        text=event.get("text"),
+        location=types.Location(latitude=location[0], longitude=location[1]) if location else None,
+    )
+
+
+def _session_data(payload_fields, payload_size):
+    data = {"current_state": "start", "user_role": "client"}
+    for i in range(payload_fields):
+        data[f"p{i}"] = "x" * payload_size
+    return data
+
+
+async def run_benchmark(table, trace, payload_fields=0, payload_size=32, warmup=1000,
+                        storage="memory", latency=0.0):
+    """Прогоняет трассу через handle_message; возвращает отчёт (dict)"""
+    # Лимиты отправки Telegram в бенчмарке не нужны: меряем стоимость кода
+    for name in ("SEND_GLOBAL_RATE", "SEND_CHAT_RATE", "SEND_GROUP_RATE", "SEND_CHAT_BURST"):
+        os.environ.setdefault(name, "1e9")
+
+    core_loop = importlib.import_module("08_core_loop")
+    from core.table_reloader import build_snapshot
+    from core.message_sender import close_schedulers
+
+    started = time.perf_counter()
+    snapshot = build_snapshot(table)
+    compile_ms = (time.perf_counter() - started) * 1000
+
+    bot = FakeBot(latency=latency)
+    if storage == "sqlite":
+        from core.sqlite_storage import SQLiteStorage
+        db_dir = tempfile.mkdtemp(prefix="tablebot-bench-")
+        fsm_storage = SQLiteStorage(os.path.join(db_dir, "fsm.sqlite"))
+    else:
+        fsm_storage = MemoryStorage()
+
+    # Сессии заранее наполняются полями payload_fields × payload_size
+    contexts = {}
+    for chat_id in sorted({event["chat_id"] for event in trace}):
+        key = StorageKey(bot_id=bot.id, chat_id=chat_id, user_id=chat_id)
+        contexts[chat_id] = FSMContext(storage=fsm_storage, key=key)
+        await contexts[chat_id].set_data(_session_data(payload_fields, payload_size))
+
+    timer = StageTimer()
+    originals = {name: getattr(core_loop, name) for name in STAGES if hasattr(core_loop, name)}
+    for name, func in originals.items():
+        setattr(core_loop, name, timer.wrap(name, func))
+
+    handle_message = core_loop.handle_message
+    handler = array("d")
+    measured = 0
+    gc.collect()
+    try:
+        for index, event in enumerate(trace):
+            warm = index < warmup
+            timer.enabled = not warm
+            # Сообщение aiogram строится вне замера: это стоимость бенчмарка, а не бота
+            message = _message(index + 1, event)
+            t0 = time.perf_counter()
+            await handle_message(message, contexts[event["chat_id"]], snapshot, bot)
+            if not warm:
+                handler.append(time.perf_counter() - t0)
+                measured += 1
+    finally:
+        for name, func in originals.items():
+            setattr(core_loop, name, func)
+        await close_schedulers()
+        await fsm_storage.close()
+        if storage == "sqlite":
+            shutil.rmtree(db_dir, ignore_errors=True)
+    elapsed = sum(handler)
+
+    return {
+        "meta": {
+            "commit": _git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "table": str(table),
+            "table_rows": len(snapshot.rows),
+            "states": len(snapshot.states),
+            "events": measured,
+            "warmup": min(warmup, len(trace)),
+            "chats": len(contexts),
+            "payload_fields": payload_fields,
+            "payload_size": payload_size,
+            "storage": storage,
+            "latency": latency,
+        },
+        "compile_ms": round(compile_ms, 2),
+        "throughput_per_s": round(measured / elapsed, 1) if elapsed else None,
+        "handle_message": summarize(handler),
+        "stages": timer.summary(),
+        "bot_calls": dict(bot.calls),
+    }
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Бенчмарк pipeline табличного бота")
+    source = parser.add_argument_group("таблица")
+    source.add_argument("--table", help="готовая таблица; без неё генерируется синтетическая")
+    source.add_argument("--rows", type=int, default=1000, help="строк синтетической таблицы")
+    source.add_argument("--wildcards", type=float, default=0.1)
+    source.add_argument("--guards", type=float, default=0.2)
+    source.add_argument("--placeholders", type=float, default=0.5)
+    source.add_argument("--saves", type=float, default=0.3)
+    run = parser.add_argument_group("прогон")
+    run.add_argument("--trace", help="JSONL-трасса; без неё генерируется случайное блуждание")
+    run.add_argument("--events", type=int, default=5000)
+    run.add_argument("--chats", type=int, default=100)
+    run.add_argument("--warmup", type=int, default=1000, help="первые события не входят в статистику")
+    run.add_argument("--payload-fields", type=int, default=0, help="дополнительных полей в сессии")
+    run.add_argument("--payload-size", type=int, default=32, help="байт в каждом дополнительном поле")
+    run.add_argument("--storage", choices=("memory", "sqlite"), default="memory")
+    run.add_argument("--latency", type=float, default=0.0, help="задержка ответа FakeBot, секунд")
+    run.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--out", help="куда записать JSON (по умолчанию stdout)")
+    parser.add_argument("--log-level", default="ERROR")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    from core.log import setup_logging, shutdown_logging
+    setup_logging(args.log_level)
+    # Артефакт таблицы не используется: compile_ms — честная компиляция
+    os.environ.setdefault("TABLE_ARTIFACT", "0")
+
+    with tempfile.TemporaryDirectory(prefix="tablebot-bench-") as tmp:
+        table = args.table
+        if not table:
+            table = str(Path(tmp) / f"bench_{args.rows}.csv")
+            generate_table(
+                table, rows=args.rows, wildcards=args.wildcards, guards=args.guards,
+                placeholders=args.placeholders, saves=args.saves, seed=args.seed,
+            )
+
+        if args.trace:
+            trace = load_trace(args.trace)
+        else:
+            from core.table_loader import load_table
+            trace = make_trace(load_table(table), events=args.events + args.warmup,
+                               chats=args.chats, seed=args.seed)
+
+        report = asyncio.run(run_benchmark(
+            table, trace, payload_fields=args.payload_fields, payload_size=args.payload_size,
+            warmup=args.warmup, storage=args.storage, latency=args.latency,
+        ))
+    report["meta"]["args"] = {k: v for k, v in vars(args).items() if k not in ("out", "log_level")}
+    shutdown_logging()
+
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.out:
+        Path(args.out).write_text(text + "\n", encoding="utf-8")
+        print(f"{args.out}: {report['throughput_per_s']} сообщений/с, "
+              f"p95 handle_message {report['handle_message'].get('p95_us')} мкс", file=sys.stderr)
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
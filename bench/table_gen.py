@@ -0,0 +1,162 @@
+# \tablebot-pipe-advanced\bench\table_gen.py
+# Copyright (C) 2025 Leonid Yasin
+# This file is part of Tablebot-pipe-Advanced and is licensed under the GNU GPL v3.0.
+# See the LICENSE file for details.
+#!/usr/bin/env python3
+"""Синтетические таблицы и трассы сообщений для бенчмарка.
+
+    python -m bench.table_gen bench_10k.csv --rows 10000 --guards 0.3 --placeholders 0.5
+
+Таблица строится как граф состояний: у каждого состояния несколько точных
+команд и (с вероятностью wildcards) строка <text>. Одинаковые параметры и
+seed дают байт-в-байт одинаковый файл — результаты сравнимы между коммитами.
+"""
+import csv
+import json
+import random
+import argparse
+
+HEADER = (
+    "process_name", "from_state", "to_state", "command", "role", "condition",
+    "message_text", "caption", "media_file", "reply_markup", "inline_markup",
+    "notification", "integrations", "result_action", "bot_command", "bot_description",
+)
+
+# Условия, которые на сгенерированных данных чаще выполняются, но проверяются честно
+GUARDS = (
+    "not_empty:text",
+    "length>0:text",
+    "not_empty:text and not equals:text:stop",
+    "role:client or role:operator",
+    "in:user_role:client,operator",
+)
+
+
+def _state_name(i):
+    return "start" if i == 0 else f"s{i}"
+
+
+def _message_text(rng, fields, placeholder_ratio):
+    if rng.random() >= placeholder_ratio:
+        return "Шаг выполнен, выберите действие"
+    names = rng.sample(fields, k=min(len(fields), rng.randint(1, 3)))
+    return "Вы ввели {text}. " + " ".join(f"{name}: {{{name}}}" for name in names)
+
+
+def generate_table(path, rows=1000, states=None, wildcards=0.1, guards=0.2,
+                   placeholders=0.5, saves=0.3, roles=0.0, fields=8, seed=1):
+    """Пишет CSV-таблицу из rows строк; возвращает число состояний.
+
+    wildcards    — доля состояний со строкой <text>
+    guards       — доля строк с условием
+    placeholders — доля строк с плейсхолдерами в message_text
+    saves        — доля строк с save: в result_action
+    roles        — доля строк, ограниченных ролью operator
+    """
+    rng = random.Random(seed)
+    states = states or max(5, rows // 20)
+    field_names = [f"f{i}" for i in range(fields)]
+    per_state, extra = divmod(rows, states)
+
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(HEADER)
+        for i in range(states):
+            from_state = _state_name(i)
+            count = per_state + (1 if i < extra else 0)
+            wildcard = count > 1 and rng.random() < wildcards
+            for j in range(count):
+                is_wildcard = wildcard and j == count - 1
+                command = "<text>" if is_wildcard else ("/start" if i == 0 and j == 0 else f"cmd{j}")
+                actions = []
+                if rng.random() < saves:
+                    actions.append(f"save:{rng.choice(field_names)}:{{text}}")
+                writer.writerow((
+                    "Bench",
+                    from_state,
+                    _state_name(rng.randrange(states)),
+                    command,
+                    "operator" if rng.random() < roles else "",
+                    rng.choice(GUARDS) if rng.random() < guards else "",
+                    _message_text(rng, field_names, placeholders),
+                    "", "", "", "", "", "",
+                    "|".join(actions),
+                    "/start" if command == "/start" else "",
+                    "Начать" if command == "/start" else "",
+                ))
+    return states
+
+
+def make_trace(rows, events=1000, chats=100, seed=1, role="client"):
+    """Трасса сообщений: случайное блуждание каждого чата по таблице.
+
+    Возвращает список {"chat_id", "text"} или {"chat_id", "location"}. Переход
+    предсказывается по to_state выбранной строки; если условие его не пропустит,
+    бот просто ответит иначе — это тоже реальный путь.
+    """
+    rng = random.Random(seed)
+    by_state = {}
+    for row in rows:
+        row_role = (row.get("role") or "").strip()
+        if row_role and row_role not in ("any", role):
+            continue
+        from_state = (row.get("from_state") or "").strip()
+        if from_state and row.get("command"):
+            by_state.setdefault(from_state, []).append(row)
+
+    positions = {}
+    trace = []
+    for _ in range(events):
+        chat_id = 1000 + rng.randrange(chats)
+        state = positions.get(chat_id, "start")
+        candidates = by_state.get(state) or by_state.get("any") or by_state.get("start") or []
+        if not candidates:
+            trace.append({"chat_id": chat_id, "text": "/start"})
+            continue
+        row = rng.choice(candidates)
+        command = row["command"].strip()
+        if command == "<location>":
+            trace.append({"chat_id": chat_id, "location": [55.75 + rng.random() / 100, 37.62 + rng.random() / 100]})
+        elif command == "<text>":
+            trace.append({"chat_id": chat_id, "text": f"ввод {rng.randrange(10 ** 6)}"})
+        else:
+            trace.append({"chat_id": chat_id, "text": command})
+        positions[chat_id] = (row.get("to_state") or "").strip() or state
+    return trace
+
+
+def save_trace(trace, path):
+    with open(path, "w", encoding="utf-8") as f:
+        for event in trace:
+            f.write(json.dumps(event, ensure_ascii=False) + "\n")
+
+
+def load_trace(path):
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Генератор синтетической таблицы для бенчмарка")
+    parser.add_argument("output", help="путь к CSV")
+    parser.add_argument("--rows", type=int, default=1000, help="строк таблицы (100 … 1000000)")
+    parser.add_argument("--states", type=int, help="состояний (по умолчанию rows/20)")
+    parser.add_argument("--wildcards", type=float, default=0.1, help="доля состояний со строкой <text>")
+    parser.add_argument("--guards", type=float, default=0.2, help="доля строк с условием")
+    parser.add_argument("--placeholders", type=float, default=0.5, help="доля строк с плейсхолдерами")
+    parser.add_argument("--saves", type=float, default=0.3, help="доля строк с save:")
+    parser.add_argument("--roles", type=float, default=0.0, help="доля строк только для роли operator")
+    parser.add_argument("--fields", type=int, default=8, help="полей payload в шаблонах и save:")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args(argv)
+
+    states = generate_table(
+        args.output, rows=args.rows, states=args.states, wildcards=args.wildcards,
+        guards=args.guards, placeholders=args.placeholders, saves=args.saves,
+        roles=args.roles, fields=args.fields, seed=args.seed,
+    )
+    print(f"{args.output}: {args.rows} строк, {states} состояний")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+# \tablebot-pipe-advanced\core\bot_manifest.py
+# Copyright (C) 2025 Leonid Yasin
+# This file is part of Tablebot-pipe-Advanced and is licensed under the GNU GPL v3.0.
+# See the LICENSE file for details.
+#!/usr/bin/env python3
+"""Манифест нескольких ботов в одном процессе.
+
+JSON-файл со списком ботов: у каждого свой токен и своя таблица.
+
+    {
+      "http_limit": 100,
+      "bots": [
+        {"name": "taxi", "token_env": "TAXI_BOT_TOKEN", "table": "table_taxi_deliv.csv"},
+        {"name": "pizza", "token": "123456:ABC...", "table": "table_pizza.csv",
+         "fsm_db": ".fsm_pizza.sqlite", "warmup_chat_id": -100123}
+      ]
+    }
+
+token — токен строкой, token_env — имя переменной окружения с токеном.
+fsm_db по умолчанию — .fsm_sessions.<name>.sqlite, у каждого бота свой файл.
+"""
+import os
+import re
+import json
+from dataclasses import dataclass
+from pathlib import Path
+from core.log import get_logger
+
+logger = get_logger("bot_manifest")
+
+BOT_NAME_PATTERN = re.compile(r"^[A-Za-z0-9_-]+$")
+
+
+@dataclass(frozen=True)
+class BotSpec:
+    """Один бот процесса: токен, таблица и файл FSM-сессий"""
+    name: str
+    token: str
+    table: str
+    fsm_db: str
+    warmup_chat_id: int = None
+
+
+@dataclass(frozen=True)
+class BotManifest:
+    bots: tuple
+    http_limit: int = 100    # соединений к Bot API на весь процесс
+
+
+def _bot_spec(entry, base_dir):
+    name = str(entry.get("name") or "").strip()
+    if not BOT_NAME_PATTERN.match(name):
+        raise ValueError(f"Имя бота {name!r}: допустимы латиница, цифры, _ и -")
+
+    token = entry.get("token")
+    if not token and entry.get("token_env"):
+        token = os.getenv(entry["token_env"])
+    if not token:
+        raise ValueError(f"Бот {name}: не задан token или пуста переменная {entry.get('token_env')!r}")
+
+    table = entry.get("table")
+    if not table:
+        raise ValueError(f"Бот {name}: не задана table")
+
+    # Относительные пути — от каталога манифеста
+    table = base_dir / table
+    fsm_db = base_dir / entry.get("fsm_db", f".fsm_sessions.{name}.sqlite")
+    warmup_chat_id = entry.get("warmup_chat_id")
+    return BotSpec(
+        name=name,
+        token=token.strip(),
+        table=str(table),
+        fsm_db=str(fsm_db),
+        warmup_chat_id=int(warmup_chat_id) if warmup_chat_id else None,
+    )
+
+
+def load_manifest(path):
+    """Читает манифест ботов; ошибки описания — ValueError с именем бота"""
+    path = Path(path)
+    with open(path, encoding="utf-8") as f:
+        raw = json.load(f)
+
+    entries = raw.get("bots") or []
+    if not entries:
+        raise ValueError(f"В манифесте {path} нет ботов")
+
+    bots = tuple(_bot_spec(entry, path.parent) for entry in entries)
+    names = [bot.name for bot in bots]
+    duplicates = sorted({name for name in names if names.count(name) > 1})
+    if duplicates:
+        raise ValueError(f"Повторяющиеся имена ботов: {', '.join(duplicates)}")
+    tokens = [bot.token for bot in bots]
+    if len(set(tokens)) != len(tokens):
+        raise ValueError("Один токен указан у нескольких ботов")
+
+    manifest = BotManifest(bots=bots, http_limit=int(raw.get("http_limit", 100)))
+    logger.info("📋 Манифест %s: %s ботов (%s)", path, len(bots), ", ".join(names))
+    return manifest
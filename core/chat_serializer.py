@@ -0,0 +1,80 @@
+# \tablebot-pipe-advanced\core\chat_serializer.py
+# Copyright (C) 2025 Leonid Yasin
+# This file is part of Tablebot-pipe-Advanced and is licensed under the GNU GPL v3.0.
+# See the LICENSE file for details.
+#!/usr/bin/env python3
+import os
+import asyncio
+
+from aiogram import BaseMiddleware
+from core.log import get_logger
+
+logger = get_logger("chat_serializer")
+
+
+class _ChatLane:
+    __slots__ = ("lock", "users")
+
+    def __init__(self):
+        self.lock = asyncio.Lock()
+        self.users = 0
+
+
+class ChatSerializer(BaseMiddleware):
+    """Outer-middleware апдейтов: строгий порядок внутри чата, параллельность между чатами.
+
+    - апдейты одного чата обрабатываются по одному, в порядке поступления
+      (read-modify-write данных FSM не перетирает соседний апдейт);
+    - одновременно выполняется не больше max_concurrent апдейтов разных чатов;
+    - когда ожидающих апдейтов больше shed_backlog, низкоприоритетные
+      (is_low_priority) отбрасываются, а пользователю уходит on_shed.
+    """
+
+    def __init__(self, max_concurrent=None, shed_backlog=None, is_low_priority=None, on_shed=None):
+        self.max_concurrent = int(max_concurrent or os.getenv("MAX_CONCURRENT_UPDATES", "64"))
+        self.shed_backlog = int(shed_backlog or os.getenv("SHED_BACKLOG", "500"))
+        self.is_low_priority = is_low_priority or (lambda update: False)
+        self.on_shed = on_shed
+
+        self._slots = asyncio.Semaphore(self.max_concurrent)
+        self._lanes = {}       # chat_id -> _ChatLane
+        self._backlog = 0      # апдейты, ждущие своей очереди чата или свободного слота
+        self.shed_count = 0
+
+    @property
+    def backlog(self):
+        return self._backlog
+
+    async def __call__(self, handler, event, data):
+        chat = data.get("event_chat")
+        if chat is None:
+            return await handler(event, data)
+
+        if self._backlog >= self.shed_backlog and self.is_low_priority(event):
+            self.shed_count += 1
+            logger.warning("⚠️ Перегрузка (очередь %s): апдейт чата %s отброшен", self._backlog, chat.id)
+            if self.on_shed is not None:
+                try:
+                    await self.on_shed(chat.id)
+                except Exception as e:
+                    logger.error("❌ Ошибка ответа о перегрузке: %s", e)
+            return None
+
+        lane = self._lanes.get(chat.id)
+        if lane is None:
+            lane = self._lanes[chat.id] = _ChatLane()
+        lane.users += 1
+        self._backlog += 1
+        waiting = True
+        try:
+            async with lane.lock:
+                async with self._slots:
+                    self._backlog -= 1
+                    waiting = False
+                    return await handler(event, data)
+        finally:
+            if waiting:
+                self._backlog -= 1
+            lane.users -= 1
+            if lane.users == 0:
+                del self._lanes[chat.id]
@@ -0,0 +1,178 @@
+# \tablebot-pipe-advanced\core\command_patterns.py
+# Copyright (C) 2025 Leonid Yasin
+# This file is part of Tablebot-pipe-Advanced and is licensed under the GNU GPL v3.0.
+# See the LICENSE file for details.
+#!/usr/bin/env python3
+"""Шаблонные команды колонки command.
+
+Кроме точного текста, <text> и <location> команда может быть шаблоном:
+
+    re:^заказ (?P<order_id>\\d+)$   регулярное выражение (совпадение целиком),
+                                    именованные группы сохраняются в payload
+    prefix:/order                   текст начинается с префикса; остаток — в поле rest
+    range:1..100                    число в диапазоне (границы включены; range:18.. и
+                                    range:..100 — открытые); число — в поле number
+    <phone>                         похоже на телефон; значение — в поле phone
+    <email>                         похоже на e-mail; значение — в поле email
+    ci:Да                           текст без учёта регистра
+
+При загрузке таблицы шаблоны одного состояния (и роли) собираются в один
+PatternMatcher: словарь ci-литералов, одна регулярка-альтернатива с
+именованной группой на строку и список диапазонов. На сообщение — один
+поиск в словаре и один fullmatch на состояние, а не проверка каждой строки.
+Как и для точных команд, при нескольких совпадениях побеждает строка выше.
+"""
+import re
+
+PATTERN_PREFIXES = ("re:", "prefix:", "range:", "ci:")
+PATTERN_SHAPES = {
+    "<phone>": (r"(?P<phone>\+?\d[\d\s().-]{5,18}\d)", ("phone",)),
+    "<email>": (r"(?P<email>[^@\s]+@[^@\s]+\.[^@\s]+)", ("email",)),
+}
+
+_NUMBER_RE = re.compile(r"-?\d+(?:[.,]\d+)?")
+_GROUP_RE = re.compile(r"\(\?P<([A-Za-z_]\w*)>")
+_GROUP_REF_RE = re.compile(r"\(\?P=([A-Za-z_]\w*)\)")
+_NUMBERED_REF_RE = re.compile(r"(?<!\\)\\[1-9]")
+_GLOBAL_FLAGS_RE = re.compile(r"^\(\?([aiLmsux]+)\)")
+
+
+class PatternError(ValueError):
+    """Шаблон команды не удалось разобрать"""
+
+
+def is_pattern(command):
+    """True, если команда — шаблон, а не точный текст"""
+    return command.startswith(PATTERN_PREFIXES) or command in PATTERN_SHAPES
+
+
+def _parse_number(text):
+    text = text.strip()
+    if not _NUMBER_RE.fullmatch(text):
+        return None
+    return float(text.replace(",", "."))
+
+
+def _parse_range(spec):
+    low, sep, high = spec.partition("..")
+    if not sep:
+        raise PatternError(f"Ожидается range:от..до, получено {spec!r}")
+    bounds = []
+    for value in (low, high):
+        if not value.strip():
+            bounds.append(None)
+            continue
+        number = _parse_number(value)
+        if number is None:
+            raise PatternError(f"Граница диапазона не число: {value!r}")
+        bounds.append(number)
+    if bounds[0] is not None and bounds[1] is not None and bounds[0] > bounds[1]:
+        raise PatternError(f"Пустой диапазон: {spec!r}")
+    return tuple(bounds)
+
+
+def parse_pattern(command):
+    """Разбирает шаблон: ("ci", текст) | ("range", (от, до)) | ("regex", (регулярка, имена групп)).
+
+    Бросает PatternError, если шаблон не разбирается.
+    """
+    if command in PATTERN_SHAPES:
+        return "regex", PATTERN_SHAPES[command]
+    kind, _, value = command.partition(":")
+    if kind == "ci":
+        if not value:
+            raise PatternError("Пустой ci:")
+        return "ci", value
+    if kind == "range":
+        return "range", _parse_range(value)
+    if kind == "prefix":
+        if not value:
+            raise PatternError("Пустой prefix:")
+        # Ячейки таблицы обрезаются, поэтому пробел после префикса не пишется — пропускаем его здесь
+        return "regex", (re.escape(value) + r"\s*(?P<rest>(?s:.*))", ("rest",))
+    if kind == "re":
+        if _NUMBERED_REF_RE.search(value):
+            raise PatternError("Нумерованные ссылки \\1 не поддерживаются — используйте (?P=имя)")
+        # Глобальные флаги (?i) в начале допустимы только для всего выражения — делаем их локальными
+        flags = _GLOBAL_FLAGS_RE.match(value)
+        if flags:
+            value = f"(?{flags.group(1)}:{value[flags.end():]})"
+        try:
+            compiled = re.compile(value)
+        except re.error as e:
+            raise PatternError(f"Ошибка в регулярном выражении {value!r}: {e}")
+        return "regex", (value, tuple(compiled.groupindex))
+    raise PatternError(f"Неизвестный шаблон команды: {command!r}")
+
+
+def pattern_error(command):
+    """Текст ошибки шаблона команды или None (для проверки таблицы)"""
+    try:
+        parse_pattern(command)
+    except PatternError as e:
+        return str(e)
+    return None
+
+
+class PatternMatcher:
+    """Шаблонные команды одного состояния: ci-литералы, одна регулярка, диапазоны.
+
+    entries — (позиция строки, команда) в порядке таблицы; неразбираемые
+    шаблоны пропускаются (их показывает проверка таблицы).
+    """
+
+    def __init__(self, entries):
+        self.literals = {}      # casefold(текст) -> позиция
+        self.ranges = []        # (позиция, от, до) в порядке таблицы
+        self.groups = {}        # группа-обёртка -> (позиция, ((группа в регулярке, поле payload), ...))
+        alternatives = []
+
+        for pos, command in entries:
+            try:
+                kind, value = parse_pattern(command)
+            except PatternError:
+                continue
+            if kind == "ci":
+                self.literals.setdefault(value.casefold(), pos)
+            elif kind == "range":
+                self.ranges.append((pos, *value))
+            else:
+                source, names = value
+                # Имена групп уникальны в пределах общей регулярки: префикс строки
+                prefix = f"_p{pos}_"
+                source = _GROUP_RE.sub(lambda m: f"(?P<{prefix}{m.group(1)}>", source)
+                source = _GROUP_REF_RE.sub(lambda m: f"(?P={prefix}{m.group(1)})", source)
+                wrapper = f"_p{pos}"
+                alternatives.append(f"(?P<{wrapper}>{source})")
+                self.groups[wrapper] = (pos, tuple((prefix + name, name) for name in names))
+
+        # Альтернативы в порядке таблицы: fullmatch берёт первую подходящую — строку выше
+        self.regex = re.compile("|".join(alternatives)) if alternatives else None
+
+    def __len__(self):
+        return len(self.literals) + len(self.ranges) + len(self.groups)
+
+    def match(self, text):
+        """(позиция, захваты) первой подходящей строки или None"""
+        best, captures = self.literals.get(text.casefold()), None
+
+        if self.regex is not None:
+            match = self.regex.fullmatch(text)
+            if match is not None:
+                pos, names = self.groups[match.lastgroup]
+                if best is None or pos < best:
+                    best = pos
+                    captures = {field: match.group(group) for group, field in names
+                                if match.group(group) is not None}
+
+        if self.ranges:
+            number = _parse_number(text)
+            if number is not None:
+                for pos, low, high in self.ranges:
+                    if best is not None and pos > best:
+                        break
+                    if (low is None or number >= low) and (high is None or number <= high):
+                        best, captures = pos, {"number": text.strip()}
+                        break
+
+        return (best, captures) if best is not None else None
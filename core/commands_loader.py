@@ -5,8 +5,12 @@
 #!/usr/bin/env python3
 import csv
 import sys
+import logging
 from pathlib import Path
 from aiogram import types
+from core.log import get_logger
+
+logger = get_logger("commands_loader")
 
 def extract_commands(table_path):
     """Читает CSV и возвращает список BotCommand из строк с bot_command и bot_description"""
@@ -15,17 +19,21 @@ def extract_commands(table_path):
         with open(table_path, encoding="utf-8") as f:
             rows = list(csv.DictReader(f))
     except Exception as e:
-        print(f"[commands] ❌ Ошибка чтения таблицы {table_path}: {e}", file=sys.stderr)
+        logger.error("❌ Ошибка чтения таблицы %s: %s", table_path, e)
         return []
 
+    logger.debug("📊 Прочитано %s строк из %s", len(rows), table_path)
+    return extract_commands_from_rows(rows)
+
+def extract_commands_from_rows(rows):
+    """Возвращает список BotCommand из уже загруженных строк таблицы"""
     commands = []
-    print(f"[commands] 📊 Прочитано {len(rows)} строк из {table_path}", file=sys.stderr)
     
     # Отладочная информация о структуре таблицы
     if rows:
         headers = list(rows[0].keys())
-        print(f"[commands] 🔍 Заголовки таблицы: {headers}", file=sys.stderr)
-        print(f"[commands] 🔍 Доступные колонки: {', '.join(headers)}", file=sys.stderr)
+        logger.debug("🔍 Заголовки таблицы: %s", headers)
+        logger.debug("🔍 Доступные колонки: %s", ', '.join(map(str, headers)))
 
     for i, r in enumerate(rows):
         # БЕЗОПАСНОЕ извлечение значений с проверкой на None
@@ -43,43 +51,44 @@ def extract_commands(table_path):
             desc = str(desc_raw).strip()
 
         # Детальная отладка для первых нескольких строк (с безопасной проверкой)
-        if i < 3:
+        if i < 3 and logger.isEnabledFor(logging.DEBUG):
             # ИСПРАВЛЕНИЕ: безопасная проверка значений
             all_columns = {}
             for k, v in r.items():
                 if v is not None and str(v).strip():  # Проверяем что не None и не пустая строка
                     all_columns[k] = str(v).strip()
-            print(f"[commands] 🔍 Строка {i+1} значимые колонки: {all_columns}", file=sys.stderr)
+            logger.debug("🔍 Строка %s значимые колонки: %s", i+1, all_columns)
 
         if cmd and desc:
             if cmd.startswith('/'):
                 clean_cmd = cmd[1:]
                 commands.append(types.BotCommand(command=clean_cmd, description=desc))
-                print(f"[commands] ✅ Найдена команда: /{clean_cmd} -> {desc}", file=sys.stderr)
+                logger.debug("✅ Найдена команда: /%s -> %s", clean_cmd, desc)
             else:
-                print(f"[commands] ⚠️ Найдена строка с bot_command не начинающимся с '/': '{cmd}', строка {i+1}", file=sys.stderr)
+                logger.warning("⚠️ Найдена строка с bot_command не начинающимся с '/': '%s', строка %s", cmd, i+1)
         else:
             # Логируем только если есть частичное заполнение (для отладки)
             if cmd and not desc:
-                print(f"[commands] ℹ️ Строка {i+1} имеет bot_command но нет bot_description: '{cmd}'", file=sys.stderr)
+                logger.debug("ℹ️ Строка %s имеет bot_command но нет bot_description: '%s'", i+1, cmd)
             elif desc and not cmd:
-                print(f"[commands] ℹ️ Строка {i+1} имеет bot_description но нет bot_command: '{desc}'", file=sys.stderr)
+                logger.debug("ℹ️ Строка %s имеет bot_description но нет bot_command: '%s'", i+1, desc)
 
-    print(f"[commands] 📋 Итого загружено {len(commands)} команд из таблицы.", file=sys.stderr)
+    logger.info("📋 Итого загружено %s команд из таблицы.", len(commands))
     if commands:
-        print(f"[commands] 📝 Список команд: {[f'/{cmd.command} - {cmd.description}' for cmd in commands]}", file=sys.stderr)
+        logger.debug("📝 Список команд: %s", [f'/{cmd.command} - {cmd.description}' for cmd in commands])
     else:
-        print(f"[commands] 📝 Команды для установки не найдены в таблице.", file=sys.stderr)
+        logger.debug("📝 Команды для установки не найдены в таблице.")
 
     return commands
 
 # Функция для тестирования
 if __name__ == "__main__":
-    import sys
+    from core.log import setup_logging
+    setup_logging("DEBUG")
     if len(sys.argv) > 1:
         table_file = sys.argv[1]
-        print(f"[commands] Тестируем извлечение команд из: {table_file}")
+        logger.info("Тестируем извлечение команд из: %s", table_file)
         cmds = extract_commands(table_file)
-        print(f"[commands] Найдено команд: {len(cmds)}")
+        logger.info("Найдено команд: %s", len(cmds))
     else:
-        print("Укажите путь к CSV файлу таблицы.")
\ No newline at end of file
+        logger.info("Укажите путь к CSV файлу таблицы.")
\ No newline at end of file
@@ -2,8 +2,10 @@
 # This file is part of Tablebot-pipe-Advanced and is licensed under the GNU GPL v3.0.
 # See the LICENSE file for details.
 #!/usr/bin/env python3
-import sys  
 from aiogram.fsm.state import State, StatesGroup
+from core.log import get_logger
+
+logger = get_logger("fsm_builder")
 
 def create_fsm_from_states(states_found):
     """Создает класс FSM с динамическими состояниями"""
@@ -13,12 +15,12 @@ def create_fsm_from_states(states_found):
     for state_name in states_found:
         setattr(DynFSM, state_name, State())
     
-    print(f"[fsm_builder] 🧠 Создано FSM с {len(states_found)} состояниями", file=sys.stderr)
+    logger.debug("🧠 Создано FSM с %s состояниями", len(states_found))
     return DynFSM
 
 def extract_states_from_table(rows):
     """Извлекает уникальные состояния из таблицы"""
     states_found = {r["from_state"] for r in rows} | {r["to_state"] for r in rows}
     states_found = {s for s in states_found if s and s != "—"}
-    print(f"[fsm_builder] 🔍 Извлечено состояний: {len(states_found)}", file=sys.stderr)
+    logger.debug("🔍 Извлечено состояний: %s", len(states_found))
     return states_found
\ No newline at end of file
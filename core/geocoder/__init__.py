@@ -0,0 +1,24 @@
+# Copyright (C) 2025 Leonid Yasin
+# This file is part of Tablebot-pipe-Advanced and is licensed under the GNU GPL v3.0.
+# See the LICENSE file for details.
+#!/usr/bin/env python3
+from .service import Geocoder, RateLimiter, RateLimitedProvider, get_geocoder
+from .cache import GeocodeCache
+from .providers import NominatimProvider, StubProvider, ChainProvider, create_provider
+from .offline import OfflineProvider, GridIndex, build_grid_index, open_grid_index
+
+__all__ = [
+    'Geocoder',
+    'RateLimiter',
+    'RateLimitedProvider',
+    'get_geocoder',
+    'GeocodeCache',
+    'NominatimProvider',
+    'StubProvider',
+    'ChainProvider',
+    'OfflineProvider',
+    'GridIndex',
+    'build_grid_index',
+    'open_grid_index',
+    'create_provider'
+]
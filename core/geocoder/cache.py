@@ -0,0 +1,86 @@
+# \tablebot-pipe-advanced\core\geocoder\cache.py
+# Copyright (C) 2025 Leonid Yasin
+# This file is part of Tablebot-pipe-Advanced and is licensed under the GNU GPL v3.0.
+# See the LICENSE file for details.
+#!/usr/bin/env python3
+import time
+import sqlite3
+import threading
+from collections import OrderedDict
+from core.log import get_logger
+
+logger = get_logger("geocode_cache")
+
+
+class GeocodeCache:
+    """Кэш адресов: LRU в памяти поверх таблицы SQLite, записи живут ttl секунд.
+
+    Ключ — (провайдер, округлённая широта, округлённая долгота).
+    Методы get_disk/put_disk блокирующие и вызываются из отдельного потока.
+    """
+
+    def __init__(self, db_path, ttl, memory_size=10000):
+        self.ttl = ttl
+        self.memory_size = memory_size
+        self._memory = OrderedDict()   # key -> (address, created)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(db_path), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS geocode ("
+            " provider TEXT NOT NULL, lat REAL NOT NULL, lon REAL NOT NULL,"
+            " address TEXT NOT NULL, created REAL NOT NULL,"
+            " PRIMARY KEY (provider, lat, lon))"
+        )
+        # Просроченные записи чистим при старте
+        self._conn.execute("DELETE FROM geocode WHERE created < ?", (time.time() - ttl,))
+        self._conn.commit()
+
+    def _fresh(self, created):
+        return time.time() - created < self.ttl
+
+    def get_memory(self, key):
+        entry = self._memory.get(key)
+        if entry is None:
+            return None
+        if not self._fresh(entry[1]):
+            del self._memory[key]
+            return None
+        self._memory.move_to_end(key)
+        return entry[0]
+
+    def _remember(self, key, address, created):
+        self._memory[key] = (address, created)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_size:
+            self._memory.popitem(last=False)
+
+    def get_disk(self, key):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT address, created FROM geocode WHERE provider = ? AND lat = ? AND lon = ?", key
+            ).fetchone()
+        if row is None or not self._fresh(row[1]):
+            return None
+        return row
+
+    def remember(self, key, row):
+        """Поднимает найденную на диске запись в память"""
+        self._remember(key, row[0], row[1])
+
+    def put(self, key, address):
+        created = time.time()
+        self._remember(key, address, created)
+        return created
+
+    def put_disk(self, key, address, created):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO geocode (provider, lat, lon, address, created) VALUES (?, ?, ?, ?, ?)",
+                (*key, address, created),
+            )
+            self._conn.commit()
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,219 @@
+# \tablebot-pipe-advanced\core\geocoder\offline.py
+# Copyright (C) 2025 Leonid Yasin
+# This file is part of Tablebot-pipe-Advanced and is licensed under the GNU GPL v3.0.
+# See the LICENSE file for details.
+#!/usr/bin/env python3
+"""Офлайн-геокодер: ближайший адрес из локального справочника.
+
+Справочник — CSV с колонками lat/lon (или latitude/longitude) и address.
+Из него один раз строится бинарный сеточный индекс (<файл>.grid), который
+открывается через mmap: большие регионы не загружаются в память целиком,
+а поиск ближайшей точки просматривает только соседние ячейки сетки.
+
+Построить индекс вручную:
+    python -m core.geocoder.offline addresses.csv [--cell 0.01]
+"""
+import os
+import csv
+import math
+import mmap
+import struct
+from bisect import bisect_left
+from pathlib import Path
+from core.log import get_logger
+
+logger = get_logger("geocoder")
+
+_MAGIC = b"TBGRID01"
+_HEADER = struct.Struct("<8sdQQ")   # magic, размер ячейки (градусы), точек, ячеек
+_EARTH_RADIUS_M = 6371000.0
+
+
+def _cell_of(lat, lon, cell_size):
+    return int((lat + 90.0) // cell_size), int((lon + 180.0) // cell_size)
+
+
+def _cell_key(cy, cx):
+    return (cy << 32) | cx
+
+
+def _distance_m(lat1, lon1, lat2, lon2):
+    """Расстояние в метрах (равнопромежуточное приближение, точно на масштабе города)"""
+    x = math.radians(lon2 - lon1) * math.cos(math.radians((lat1 + lat2) / 2))
+    y = math.radians(lat2 - lat1)
+    return _EARTH_RADIUS_M * math.hypot(x, y)
+
+
+def _read_points(csv_path):
+    points = []
+    with open(csv_path, encoding="utf-8", newline="") as f:
+        for line, row in enumerate(csv.DictReader(f), start=2):
+            try:
+                lat = float(row.get("lat") or row.get("latitude"))
+                lon = float(row.get("lon") or row.get("longitude"))
+            except (TypeError, ValueError):
+                logger.warning("⚠️ %s, строка %s: нет координат", csv_path, line)
+                continue
+            address = (row.get("address") or "").strip()
+            if address:
+                points.append((lat, lon, address))
+    return points
+
+
+def build_grid_index(csv_path, index_path=None, cell_size=0.01):
+    """Строит бинарный сеточный индекс из CSV справочника. Возвращает путь к индексу"""
+    index_path = Path(index_path or str(csv_path) + ".grid")
+    points = _read_points(csv_path)
+
+    keyed = sorted(
+        (_cell_key(*_cell_of(lat, lon, cell_size)), lat, lon, address)
+        for lat, lon, address in points
+    )
+
+    cell_keys = []
+    cell_starts = []
+    for i, (key, _, _, _) in enumerate(keyed):
+        if not cell_keys or cell_keys[-1] != key:
+            cell_keys.append(key)
+            cell_starts.append(i)
+    cell_starts.append(len(keyed))
+
+    blob = bytearray()
+    offsets = []
+    for _, _, _, address in keyed:
+        offsets.append(len(blob))
+        blob += address.encode("utf-8")
+    offsets.append(len(blob))
+
+    tmp_path = index_path.with_suffix(index_path.suffix + ".tmp")
+    with open(tmp_path, "wb") as f:
+        f.write(_HEADER.pack(_MAGIC, cell_size, len(keyed), len(cell_keys)))
+        f.write(struct.pack(f"<{len(cell_keys)}q", *cell_keys))
+        f.write(struct.pack(f"<{len(cell_starts)}Q", *cell_starts))
+        f.write(struct.pack(f"<{len(keyed)}d", *(p[1] for p in keyed)))
+        f.write(struct.pack(f"<{len(keyed)}d", *(p[2] for p in keyed)))
+        f.write(struct.pack(f"<{len(offsets)}Q", *offsets))
+        f.write(blob)
+    os.replace(tmp_path, index_path)
+
+    logger.info("🗺️ Индекс адресов построен: %s точек, %s ячеек -> %s", len(keyed), len(cell_keys), index_path)
+    return index_path
+
+
+class GridIndex:
+    """Сеточный индекс адресов, открытый через mmap"""
+
+    def __init__(self, index_path):
+        self.path = str(index_path)
+        with open(self.path, "rb") as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self.cell_size, self.count, n_cells = _HEADER.unpack_from(self._mmap, 0)
+        if magic != _MAGIC:
+            raise ValueError(f"{self.path}: не индекс адресов")
+
+        view = memoryview(self._mmap)
+        pos = _HEADER.size
+
+        def take(fmt, n, size):
+            nonlocal pos
+            part = view[pos:pos + n * size].cast(fmt)
+            pos += n * size
+            return part
+
+        self._cell_keys = take("q", n_cells, 8)
+        self._cell_starts = take("Q", n_cells + 1, 8)
+        self._lats = take("d", self.count, 8)
+        self._lons = take("d", self.count, 8)
+        self._offsets = take("Q", self.count + 1, 8)
+        self._blob = pos
+
+    def __len__(self):
+        return self.count
+
+    def _cell_range(self, cy, cx):
+        key = _cell_key(cy, cx)
+        i = bisect_left(self._cell_keys, key)
+        if i < len(self._cell_keys) and self._cell_keys[i] == key:
+            return self._cell_starts[i], self._cell_starts[i + 1]
+        return 0, 0
+
+    def address(self, i):
+        start = self._blob + self._offsets[i]
+        end = self._blob + self._offsets[i + 1]
+        return self._mmap[start:end].decode("utf-8")
+
+    def nearest(self, lat, lon, max_distance_m):
+        """(адрес, расстояние в метрах) ближайшей точки в радиусе или None"""
+        if not self.count:
+            return None
+        cy, cx = _cell_of(lat, lon, self.cell_size)
+        # Минимальный размер ячейки в метрах (по долготе ячейки уже к полюсам)
+        cell_m = math.radians(self.cell_size) * _EARTH_RADIUS_M * max(math.cos(math.radians(min(abs(lat) + self.cell_size, 90.0))), 1e-6)
+        max_ring = int(max_distance_m // cell_m) + 1
+
+        best = None
+        best_distance = max_distance_m
+        for ring in range(max_ring + 1):
+            # Точки в кольце ring не ближе (ring - 1) ячеек — дальше искать незачем
+            if best is not None and (ring - 1) * cell_m > best_distance:
+                break
+            for dy in range(-ring, ring + 1):
+                for dx in range(-ring, ring + 1):
+                    if max(abs(dy), abs(dx)) != ring:
+                        continue
+                    start, end = self._cell_range(cy + dy, cx + dx)
+                    for i in range(start, end):
+                        distance = _distance_m(lat, lon, self._lats[i], self._lons[i])
+                        if distance <= best_distance:
+                            best, best_distance = i, distance
+        if best is None:
+            return None
+        return self.address(best), best_distance
+
+    def close(self):
+        for part in (self._cell_keys, self._cell_starts, self._lats, self._lons, self._offsets):
+            part.release()
+        self._mmap.close()
+
+
+def open_grid_index(path, cell_size=0.01):
+    """Открывает индекс; для CSV строит (или перестраивает устаревший) <файл>.grid рядом"""
+    path = Path(path)
+    if path.suffix.lower() == ".csv":
+        index_path = Path(str(path) + ".grid")
+        if not index_path.exists() or index_path.stat().st_mtime_ns < path.stat().st_mtime_ns:
+            build_grid_index(path, index_path, cell_size)
+        path = index_path
+    return GridIndex(path)
+
+
+class OfflineProvider:
+    """Провайдер по локальному справочнику адресов (без сети)"""
+
+    name = "offline"
+    rate_limited = False
+
+    def __init__(self, path=None, max_distance_m=None, cell_size=None):
+        path = path or os.getenv("GEOCODER_OFFLINE_DB")
+        if not path:
+            raise ValueError("Не задан справочник адресов (GEOCODER_OFFLINE_DB)")
+        self.max_distance_m = float(max_distance_m or os.getenv("GEOCODER_OFFLINE_MAX_DISTANCE", "150"))
+        self.index = open_grid_index(path, float(cell_size or os.getenv("GEOCODER_OFFLINE_CELL", "0.01")))
+        logger.info("🗺️ Офлайн-геокодер: %s адресов из %s", len(self.index), self.index.path)
+
+    async def reverse(self, lat, lon):
+        found = self.index.nearest(lat, lon, self.max_distance_m)
+        return found[0] if found else None
+
+
+if __name__ == "__main__":
+    import argparse
+    from core.log import setup_logging
+
+    setup_logging("INFO")
+    parser = argparse.ArgumentParser(description="Построение индекса адресов для офлайн-геокодера")
+    parser.add_argument("csv", help="CSV с колонками lat, lon, address")
+    parser.add_argument("--cell", type=float, default=0.01, help="размер ячейки сетки в градусах")
+    parser.add_argument("--out", help="файл индекса (по умолчанию <csv>.grid)")
+    args = parser.parse_args()
+    build_grid_index(args.csv, args.out, args.cell)
@@ -0,0 +1,105 @@
+# \tablebot-pipe-advanced\core\geocoder\providers.py
+# Copyright (C) 2025 Leonid Yasin
+# This file is part of Tablebot-pipe-Advanced and is licensed under the GNU GPL v3.0.
+# See the LICENSE file for details.
+#!/usr/bin/env python3
+import asyncio
+from core.log import get_logger
+
+logger = get_logger("geocoder")
+
+
+class NominatimProvider:
+    """Обратное геокодирование через Nominatim (OpenStreetMap).
+
+    Политика сервиса — не больше одного запроса в секунду; ограничение
+    соблюдает Geocoder, провайдер только выполняет запрос.
+    """
+
+    name = "nominatim"
+    rate_limited = True
+
+    def __init__(self, user_agent="tablebot_taxi", timeout=10):
+        from geopy.geocoders import Nominatim
+        self._geolocator = Nominatim(user_agent=user_agent, timeout=timeout)
+
+    async def reverse(self, lat, lon):
+        location = await asyncio.to_thread(self._geolocator.reverse, (lat, lon))
+        return location.address if location else None
+
+
+class StubProvider:
+    """Локальная заглушка без сети: адреса из словаря или координаты текстом"""
+
+    name = "stub"
+    rate_limited = False
+
+    def __init__(self, addresses=None):
+        self.addresses = dict(addresses or {})
+        self.calls = 0
+
+    async def reverse(self, lat, lon):
+        self.calls += 1
+        return self.addresses.get((lat, lon)) or f"Координаты: {lat}, {lon}"
+
+
+class ChainProvider:
+    """Провайдеры по очереди: первый непустой ответ; ошибка провайдера — переход к следующему"""
+
+    rate_limited = False
+
+    def __init__(self, providers):
+        self.providers = list(providers)
+        self.name = "+".join(provider.name for provider in self.providers)
+
+    async def reverse(self, lat, lon):
+        last_error = None
+        for provider in self.providers:
+            try:
+                address = await provider.reverse(lat, lon)
+            except Exception as e:
+                logger.warning("⚠️ Геокодер %s: %s — пробуем следующий", provider.name, e)
+                last_error = e
+                continue
+            if address:
+                return address
+        if last_error is not None:
+            raise last_error
+        return None
+
+
+def _offline_provider():
+    from .offline import OfflineProvider
+    return OfflineProvider()
+
+
+PROVIDERS = {
+    NominatimProvider.name: NominatimProvider,
+    StubProvider.name: StubProvider,
+    "offline": _offline_provider,
+}
+
+
+def create_provider(name):
+    """Создаёт провайдера по имени (nominatim, offline, stub).
+
+    Несколько имён через запятую — цепочка с откатом: "offline,nominatim".
+    Провайдер, который не удалось создать, в цепочке пропускается.
+    """
+    names = [part.strip() for part in name.split(",") if part.strip()]
+    if len(names) > 1:
+        providers = []
+        for part in names:
+            try:
+                providers.append(create_provider(part))
+            except (ImportError, ValueError, OSError) as e:
+                logger.warning("⚠️ Геокодер %s недоступен: %s", part, e)
+        if not providers:
+            raise ValueError(f"Ни один провайдер геокодирования не доступен: {name!r}")
+        return providers[0] if len(providers) == 1 else ChainProvider(providers)
+
+    try:
+        factory = PROVIDERS[names[0] if names else name]
+    except KeyError:
+        raise ValueError(f"Неизвестный провайдер геокодирования: {name!r}")
+    return factory()
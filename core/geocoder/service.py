@@ -0,0 +1,177 @@
+# \tablebot-pipe-advanced\core\geocoder\service.py
+# Copyright (C) 2025 Leonid Yasin
+# This file is part of Tablebot-pipe-Advanced and is licensed under the GNU GPL v3.0.
+# See the LICENSE file for details.
+#!/usr/bin/env python3
+import os
+import asyncio
+from .cache import GeocodeCache
+from .providers import create_provider, StubProvider, ChainProvider
+from core.log import get_logger
+
+logger = get_logger("geocoder")
+
+
+class RateLimiter:
+    """Не чаще одного вызова в interval секунд (с очередью ожидающих)"""
+
+    def __init__(self, interval):
+        self.interval = interval
+        self._lock = asyncio.Lock()
+        self._last = None
+
+    async def __aenter__(self):
+        await self._lock.acquire()
+        loop = asyncio.get_running_loop()
+        if self._last is not None:
+            wait = self._last + self.interval - loop.time()
+            if wait > 0:
+                await asyncio.sleep(wait)
+        return self
+
+    async def __aexit__(self, *exc):
+        self._last = asyncio.get_running_loop().time()
+        self._lock.release()
+
+
+class RateLimitedProvider:
+    """Обёртка провайдера: обращения не чаще rate в секунду"""
+
+    rate_limited = False
+
+    def __init__(self, provider, rate):
+        self.provider = provider
+        self.name = provider.name
+        self._limiter = RateLimiter(1.0 / rate)
+
+    async def reverse(self, lat, lon):
+        async with self._limiter:
+            return await self.provider.reverse(lat, lon)
+
+
+def _limit_rate(provider, rate):
+    """Оборачивает сетевых провайдеров (rate_limited) ограничителем частоты, в том числе внутри цепочки"""
+    if rate <= 0:
+        return provider
+    if isinstance(provider, ChainProvider):
+        provider.providers = [_limit_rate(p, rate) for p in provider.providers]
+        return provider
+    if getattr(provider, "rate_limited", True):
+        return RateLimitedProvider(provider, rate)
+    return provider
+
+
+def _is_local(provider):
+    """Провайдер отвечает без сети (offline, stub; цепочка — если все такие)"""
+    if isinstance(provider, ChainProvider):
+        return all(_is_local(p) for p in provider.providers)
+    return not getattr(provider, "rate_limited", True)
+
+
+class Geocoder:
+    """Обратное геокодирование с кэшем по ячейкам координат.
+
+    Координаты округляются до precision знаков (4 знака — ячейка около 11 м),
+    запрос к провайдеру делается по центру ячейки. Одновременные запросы одной
+    ячейки объединяются в один, обращения к провайдеру ограничены по частоте.
+    Неудачные ответы не кэшируются. Локальный провайдер отвечает быстрее
+    SQLite в отдельном потоке, поэтому для него дисковый кэш не используется.
+    """
+
+    def __init__(self, provider, cache, precision=4, rate=1.0):
+        self.local = _is_local(provider)
+        self.provider = _limit_rate(provider, rate)
+        self.cache = cache
+        self.precision = precision
+        self._inflight = {}    # key -> Future
+        self.hits = 0
+        self.misses = 0
+
+    def cell(self, lat, lon):
+        return round(float(lat), self.precision), round(float(lon), self.precision)
+
+    async def reverse(self, lat, lon):
+        """Адрес для координат или None, если провайдер не ответил"""
+        cell_lat, cell_lon = self.cell(lat, lon)
+        key = (self.provider.name, cell_lat, cell_lon)
+
+        address = self.cache.get_memory(key)
+        if address is not None:
+            self.hits += 1
+            return address
+
+        future = self._inflight.get(key)
+        if future is not None:
+            # Эта ячейка уже запрашивается — ждём тот же результат
+            return await asyncio.shield(future)
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            address = await self._lookup(key, cell_lat, cell_lon)
+            future.set_result(address)
+            return address
+        except BaseException as e:
+            # Отмена ведущего запроса не должна подвешивать остальных ожидающих этой ячейки
+            future.set_exception(e if isinstance(e, Exception) else ConnectionError("Геокодирование отменено"))
+            # Исключение получили ожидающие; для future без ожидающих — помечаем как прочитанное
+            future.exception()
+            raise
+        finally:
+            del self._inflight[key]
+
+    async def _lookup(self, key, lat, lon):
+        if not self.local:
+            row = await asyncio.to_thread(self.cache.get_disk, key)
+            if row is not None:
+                self.hits += 1
+                self.cache.remember(key, row)
+                return row[0]
+
+        self.misses += 1
+        address = await self.provider.reverse(lat, lon)
+
+        if address:
+            created = self.cache.put(key, address)
+            if not self.local:
+                await asyncio.to_thread(self.cache.put_disk, key, address, created)
+        logger.debug("🗺️ Геокодер %s: %s,%s -> %s", self.provider.name, lat, lon, address)
+        return address
+
+
+_geocoder = None
+
+
+def get_geocoder():
+    """Общий геокодер процесса, настраивается переменными окружения.
+
+    GEOCODER_PROVIDER  — nominatim (по умолчанию), offline, stub или цепочка
+                         с откатом через запятую, например offline,nominatim
+    GEOCODER_OFFLINE_DB — справочник адресов для offline (CSV или .grid)
+    GEOCODER_PRECISION — знаков после запятой в ключе кэша (4)
+    GEOCODER_TTL       — время жизни адреса в кэше, секунд (30 дней)
+    GEOCODER_CACHE_DB  — файл кэша (.geocode_cache.sqlite)
+    GEOCODER_RATE      — запросов к провайдеру в секунду (1)
+    """
+    global _geocoder
+    if _geocoder is None:
+        name = os.getenv("GEOCODER_PROVIDER", "nominatim")
+        try:
+            provider = create_provider(name)
+        except ImportError:
+            logger.warning("⚠️ Установите geopy: pip install geopy")
+            provider = StubProvider()
+        except (ValueError, OSError) as e:
+            logger.error("❌ Геокодер %s: %s — используется заглушка", name, e)
+            provider = StubProvider()
+        cache = GeocodeCache(
+            os.getenv("GEOCODER_CACHE_DB", ".geocode_cache.sqlite"),
+            ttl=float(os.getenv("GEOCODER_TTL", str(30 * 24 * 3600))),
+        )
+        _geocoder = Geocoder(
+            provider,
+            cache,
+            precision=int(os.getenv("GEOCODER_PRECISION", "4")),
+            rate=float(os.getenv("GEOCODER_RATE", "1")),
+        )
+    return _geocoder
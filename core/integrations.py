@@ -0,0 +1,422 @@
+# \tablebot-pipe-advanced\core\integrations.py
+# Copyright (C) 2025 Leonid Yasin
+# This file is part of Tablebot-pipe-Advanced and is licensed under the GNU GPL v3.0.
+# See the LICENSE file for details.
+#!/usr/bin/env python3
+"""HTTP-интеграции из колонки integrations.
+
+Формат ячейки:
+    http:GET https://api.example.com/price?from={from_address} timeout=2 cache=300 -> price=data.price, eta=data.eta
+    http:POST https://crm.example.com/orders body=order_id,phone concurrency=4 -> crm_id=id
+    http:@price    — именованная интеграция из INTEGRATIONS_FILE
+
+Плейсхолдеры {поле} в URL подставляются из payload (с URL-кодированием).
+После "->" — какие поля JSON-ответа (путь через точку, индексы списков —
+числами) записать в payload. Именованные интеграции описываются в JSON,
+там же задаются заголовки (ключи API не попадают в таблицу):
+
+    {"price": {"method": "GET", "url": "https://api.example.com/price?to={to_address}",
+               "headers": {"Authorization": "Bearer ..."}, "timeout": 2, "cache": 300,
+               "concurrency": 4, "body": {"order": "{order_id}"}, "map": {"price": "data.price"}}}
+"""
+import os
+import json
+import time
+import asyncio
+from collections import OrderedDict
+from dataclasses import dataclass
+from functools import lru_cache
+from urllib.parse import quote, urlsplit
+
+import aiohttp
+
+from pipeline.template import render_template
+from core.log import get_logger
+
+logger = get_logger("integrations")
+
+BODY_METHODS = ("POST", "PUT", "PATCH")
+OPTIONS = ("timeout", "cache", "concurrency", "body")
+
+
+class IntegrationError(Exception):
+    """Вызов интеграции не удался (сеть, таймаут, ответ с ошибкой, разомкнутая цепь)"""
+
+
+@dataclass(frozen=True)
+class IntegrationSpec:
+    name: str
+    method: str
+    url: str
+    headers: tuple = ()          # (заголовок, значение)
+    body: tuple = ()             # (ключ JSON, шаблон значения)
+    timeout: float = None        # None — INTEGRATION_TIMEOUT
+    cache_ttl: float = 0         # секунд; 0 — без кэша
+    concurrency: int = None      # None — INTEGRATION_CONCURRENCY
+    mapping: tuple = ()          # (поле payload, путь в ответе)
+
+
+def _parse_mapping(text):
+    mapping = []
+    for part in text.split(","):
+        if not part.strip():
+            continue
+        field, sep, path = part.partition("=")
+        if not sep or not field.strip() or not path.strip():
+            raise ValueError(f"Ожидается поле=путь, получено {part.strip()!r}")
+        mapping.append((field.strip(), path.strip()))
+    return tuple(mapping)
+
+
+def spec_from_dict(name, config):
+    """Именованная интеграция из файла описаний"""
+    if not config.get("url"):
+        raise ValueError(f"Интеграция {name}: не задан url")
+    body = config.get("body") or {}
+    return IntegrationSpec(
+        name=name,
+        method=str(config.get("method", "GET")).upper(),
+        url=config["url"],
+        headers=tuple((str(k), str(v)) for k, v in (config.get("headers") or {}).items()),
+        body=tuple((str(k), str(v)) for k, v in body.items()),
+        timeout=float(config["timeout"]) if config.get("timeout") else None,
+        cache_ttl=float(config.get("cache", 0)),
+        concurrency=int(config["concurrency"]) if config.get("concurrency") else None,
+        mapping=tuple((str(k), str(v)) for k, v in (config.get("map") or {}).items()),
+    )
+
+
+@lru_cache(maxsize=1024)
+def parse_integration(text):
+    """Разбирает http:-описание из ячейки (с кэшем по тексту). ValueError — ошибка формата"""
+    source = text[len("http:"):].strip()
+    request, _, mapping = source.partition("->")
+    tokens = request.split()
+    if len(tokens) < 2:
+        raise ValueError(f"Ожидается http:МЕТОД URL, получено {text!r}")
+
+    method, url = tokens[0].upper(), tokens[1]
+    options = {}
+    for token in tokens[2:]:
+        key, sep, value = token.partition("=")
+        if not sep or key not in OPTIONS:
+            raise ValueError(f"Неизвестный параметр интеграции {token!r} (допустимы: {', '.join(OPTIONS)})")
+        options[key] = value
+
+    fields = [f.strip() for f in options.get("body", "").split(",") if f.strip()]
+    return IntegrationSpec(
+        name=f"{method} {url}",
+        method=method,
+        url=url,
+        body=tuple((field, "{" + field + "}") for field in fields),
+        timeout=float(options["timeout"]) if "timeout" in options else None,
+        cache_ttl=float(options.get("cache", 0)),
+        concurrency=int(options["concurrency"]) if "concurrency" in options else None,
+        mapping=_parse_mapping(mapping),
+    )
+
+
+def load_integrations_file(path):
+    """Именованные интеграции: {имя: IntegrationSpec}; нет файла — пустой словарь"""
+    try:
+        with open(path, encoding="utf-8") as f:
+            raw = json.load(f)
+    except FileNotFoundError:
+        return {}
+    specs = {name: spec_from_dict(name, config) for name, config in raw.items()}
+    logger.info("🔌 Загружено %s именованных интеграций из %s", len(specs), path)
+    return specs
+
+
+def _render_value(template, payload):
+    """Значение поля тела запроса: шаблон из одного {поля} передаёт значение как есть (число, dict)"""
+    if template.startswith("{") and template.endswith("}") and template[1:-1] in payload:
+        return payload[template[1:-1]]
+    return render_template(template, payload)
+
+
+def _extract(data, path):
+    """Значение по пути "data.items.0.price" или None"""
+    value = data
+    for key in path.split("."):
+        if isinstance(value, dict) and key in value:
+            value = value[key]
+        elif isinstance(value, list) and key.isdigit() and int(key) < len(value):
+            value = value[int(key)]
+        else:
+            return None
+    return value
+
+
+class CircuitBreaker:
+    """Размыкатель для адреса: после failure_threshold ошибок подряд вызовы
+    отклоняются сразу, через reset_timeout секунд пропускается один пробный."""
+
+    def __init__(self, failure_threshold=5, reset_timeout=30.0, clock=time.monotonic):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._clock = clock
+        self.failures = 0
+        self.opened_at = None
+        self._probe = False
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return "closed"
+        if self._clock() - self.opened_at >= self.reset_timeout:
+            return "half-open"
+        return "open"
+
+    def allow(self):
+        state = self.state
+        if state == "closed":
+            return True
+        if state == "half-open" and not self._probe:
+            self._probe = True
+            return True
+        return False
+
+    def release_probe(self):
+        """Проба завершилась без ответа адреса (таймаут в очереди, отмена) — следующая проба разрешена"""
+        self._probe = False
+
+    def record_success(self):
+        self.failures = 0
+        self.opened_at = None
+        self._probe = False
+
+    def record_failure(self):
+        self.failures += 1
+        self._probe = False
+        if self.opened_at is not None or self.failures >= self.failure_threshold:
+            # Неудачная проба снова размыкает цепь на reset_timeout
+            self.opened_at = self._clock()
+
+
+class ResponseCache:
+    """Ответы интеграций в памяти: LRU на max_size записей, TTL задаётся при записи"""
+
+    def __init__(self, max_size=1000, clock=time.monotonic):
+        self.max_size = max_size
+        self._clock = clock
+        self._entries = OrderedDict()    # key -> (expires_at, data)
+
+    def get(self, key):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry[0] <= self._clock():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return entry[1]
+
+    def put(self, key, data, ttl):
+        self._entries[key] = (self._clock() + ttl, data)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+
+class IntegrationEngine:
+    """Исполнитель HTTP-интеграций.
+
+    Одна aiohttp-сессия с ограниченным пулом соединений на процесс, таймаут
+    на весь вызов (включая ожидание в очереди), ограничение одновременных
+    вызовов каждой интеграции, кэш ответов по отрендеренному запросу
+    и размыкатель на каждый адрес (схема + хост).
+    """
+
+    def __init__(self, limit=50, limit_per_host=10, timeout=5.0, concurrency=10,
+                 failure_threshold=5, reset_timeout=30.0, cache_size=1000, registry=None):
+        self.limit = limit
+        self.limit_per_host = limit_per_host
+        self.timeout = timeout
+        self.concurrency = concurrency
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.registry = registry if registry is not None else {}
+        self.cache = ResponseCache(cache_size)
+        self._session = None
+        self._semaphores = {}    # имя интеграции -> Semaphore
+        self._breakers = {}      # адрес -> CircuitBreaker
+        self._inflight = {}      # ключ кэша -> Future (одинаковые запросы объединяются)
+
+    def _get_session(self):
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(limit=self.limit, limit_per_host=self.limit_per_host)
+            self._session = aiohttp.ClientSession(connector=connector)
+        return self._session
+
+    def breaker(self, url):
+        parts = urlsplit(url)
+        endpoint = f"{parts.scheme}://{parts.netloc}"
+        breaker = self._breakers.get(endpoint)
+        if breaker is None:
+            breaker = self._breakers[endpoint] = CircuitBreaker(self.failure_threshold, self.reset_timeout)
+        return breaker
+
+    def resolve(self, integration):
+        """IntegrationSpec для ячейки integrations (ValueError — ошибка описания)"""
+        if integration.startswith("http:@"):
+            name = integration[len("http:@"):].strip()
+            try:
+                return self.registry[name]
+            except KeyError:
+                raise ValueError(f"Неизвестная интеграция @{name}")
+        return parse_integration(integration)
+
+    def render(self, spec, payload):
+        """(method, url, body) запроса для payload"""
+        url = render_template(spec.url, payload, escape=lambda value: quote(value, safe=""))
+        body = None
+        if spec.body or spec.method in BODY_METHODS:
+            body = {key: _render_value(template, payload) for key, template in spec.body}
+        return spec.method, url, body
+
+    async def call(self, spec, payload):
+        """Выполняет запрос интеграции и возвращает ответ (JSON или {"text": ...})"""
+        method, url, body = self.render(spec, payload)
+        key = (method, url, json.dumps(body, sort_keys=True, default=str) if body is not None else None)
+
+        if spec.cache_ttl > 0:
+            data = self.cache.get(key)
+            if data is not None:
+                logger.debug("🔌 %s: ответ из кэша", spec.name)
+                return data
+            future = self._inflight.get(key)
+            if future is not None:
+                return await asyncio.shield(future)
+            future = self._inflight[key] = asyncio.get_running_loop().create_future()
+            try:
+                data = await self._request(spec, method, url, body)
+                self.cache.put(key, data, spec.cache_ttl)
+                future.set_result(data)
+                return data
+            except BaseException as e:
+                future.set_exception(e if isinstance(e, Exception) else IntegrationError("вызов отменён"))
+                future.exception()
+                raise
+            finally:
+                del self._inflight[key]
+
+        return await self._request(spec, method, url, body)
+
+    async def _request(self, spec, method, url, body):
+        breaker = self.breaker(url)
+        probe = breaker.state == "half-open"
+        if not breaker.allow():
+            raise IntegrationError(f"{spec.name}: адрес недоступен, цепь разомкнута")
+        try:
+            return await self._send(spec, method, url, body, breaker)
+        finally:
+            # Проба без исхода (таймаут в очереди, отмена) не должна держать цепь разомкнутой навсегда
+            if probe:
+                breaker.release_probe()
+
+    async def _send(self, spec, method, url, body, breaker):
+        semaphore = self._semaphores.get(spec.name)
+        if semaphore is None:
+            semaphore = self._semaphores[spec.name] = asyncio.Semaphore(spec.concurrency or self.concurrency)
+
+        timeout = spec.timeout or self.timeout
+        started = time.perf_counter()
+        sent = False
+
+        async def request():
+            nonlocal sent
+            async with semaphore:
+                sent = True
+                async with self._get_session().request(
+                    method, url, json=body, headers=dict(spec.headers) or None
+                ) as response:
+                    return response.status, await response.text()
+
+        try:
+            # Таймаут на весь вызов: ожидание свободного места тоже ограничено
+            status, text = await asyncio.wait_for(request(), timeout)
+        except asyncio.TimeoutError:
+            # Таймаут в очереди своей интеграции — не вина адреса
+            if sent:
+                breaker.record_failure()
+            raise IntegrationError(f"{spec.name}: нет ответа за {timeout} с")
+        except aiohttp.ClientError as e:
+            breaker.record_failure()
+            raise IntegrationError(f"{spec.name}: {e}")
+
+        if status >= 500:
+            breaker.record_failure()
+            raise IntegrationError(f"{spec.name}: HTTP {status}")
+        # Ответ 4xx — адрес жив, ошибка в запросе: цепь не размыкается
+        breaker.record_success()
+        if status >= 400:
+            raise IntegrationError(f"{spec.name}: HTTP {status}")
+
+        logger.debug("🔌 %s: HTTP %s за %.0f мс", spec.name, status, (time.perf_counter() - started) * 1000)
+        try:
+            return json.loads(text) if text else {}
+        except ValueError:
+            return {"text": text}
+
+    async def run(self, integration, payload):
+        """Выполняет интеграцию из ячейки и записывает поля ответа в payload. True — успех"""
+        try:
+            spec = self.resolve(integration)
+            data = await self.call(spec, payload)
+        except ValueError as e:
+            logger.error("❌ Интеграция %r: %s", integration, e)
+            return False
+        except IntegrationError as e:
+            logger.warning("⚠️ Интеграция: %s", e)
+            return False
+
+        for field, path in spec.mapping:
+            value = _extract(data, path)
+            if value is None:
+                logger.debug("🔌 %s: в ответе нет %s", spec.name, path)
+                continue
+            payload[field] = value
+        return True
+
+    async def close(self):
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+            logger.info("🔌 HTTP-сессия интеграций закрыта")
+        self._session = None
+
+
+_engine = None
+
+
+def get_integration_engine():
+    """Общий исполнитель интеграций процесса, настраивается переменными окружения.
+
+    INTEGRATION_HTTP_LIMIT    — соединений всего (50)
+    INTEGRATION_HTTP_PER_HOST — соединений на хост (10)
+    INTEGRATION_TIMEOUT       — таймаут вызова по умолчанию, секунд (5)
+    INTEGRATION_CONCURRENCY   — одновременных вызовов одной интеграции по умолчанию (10)
+    INTEGRATION_BREAKER_FAILURES / INTEGRATION_BREAKER_RESET — ошибок подряд до
+                                размыкания (5) и пауза до пробного вызова, секунд (30)
+    INTEGRATION_CACHE_SIZE    — ответов в кэше (1000)
+    INTEGRATIONS_FILE         — именованные интеграции (integrations.json)
+    """
+    global _engine
+    if _engine is None:
+        registry_path = os.getenv("INTEGRATIONS_FILE", "integrations.json")
+        try:
+            registry = load_integrations_file(registry_path)
+        except (OSError, ValueError) as e:
+            logger.error("❌ Файл интеграций %s: %s", registry_path, e)
+            registry = {}
+        _engine = IntegrationEngine(
+            limit=int(os.getenv("INTEGRATION_HTTP_LIMIT", "50")),
+            limit_per_host=int(os.getenv("INTEGRATION_HTTP_PER_HOST", "10")),
+            timeout=float(os.getenv("INTEGRATION_TIMEOUT", "5")),
+            concurrency=int(os.getenv("INTEGRATION_CONCURRENCY", "10")),
+            failure_threshold=int(os.getenv("INTEGRATION_BREAKER_FAILURES", "5")),
+            reset_timeout=float(os.getenv("INTEGRATION_BREAKER_RESET", "30")),
+            cache_size=int(os.getenv("INTEGRATION_CACHE_SIZE", "1000")),
+            registry=registry,
+        )
+    return _engine
@@ -0,0 +1,88 @@
+# \tablebot-pipe-advanced\core\log.py
+# Copyright (C) 2025 Leonid Yasin
+# This file is part of Tablebot-pipe-Advanced and is licensed under the GNU GPL v3.0.
+# See the LICENSE file for details.
+#!/usr/bin/env python3
+import os
+import sys
+import queue
+import atexit
+import logging
+import logging.handlers
+
+ROOT_LOGGER = "tablebot"
+
+_listener = None
+
+
+class DebugSampler(logging.Filter):
+    """Под нагрузкой пропускает в очередь только каждую N-ю DEBUG-запись.
+
+    Нагрузка определяется по длине очереди записи: пока фоновый писатель
+    успевает, DEBUG-записи проходят все.
+    """
+
+    def __init__(self, log_queue, every, high_water):
+        super().__init__()
+        self.log_queue = log_queue
+        self.every = max(1, every)
+        self.high_water = high_water
+        self._counter = 0
+        self.dropped = 0
+
+    def filter(self, record):
+        if record.levelno > logging.DEBUG or self.every == 1:
+            return True
+        if self.log_queue.qsize() < self.high_water:
+            return True
+        self._counter += 1
+        if self._counter % self.every == 0:
+            return True
+        self.dropped += 1
+        return False
+
+
+def setup_logging(level=None, debug_sample=None, high_water=None):
+    """Настраивает логирование: уровни, очередь и фоновый писатель в stderr.
+
+    LOG_LEVEL           — уровень (DEBUG, INFO, WARNING, ...), по умолчанию INFO
+    LOG_DEBUG_SAMPLE    — под нагрузкой писать каждую N-ю DEBUG-запись (1 — все)
+    LOG_QUEUE_HIGH_WATER — длина очереди, с которой включается семплирование
+    """
+    global _listener
+    if _listener is not None:
+        return logging.getLogger(ROOT_LOGGER)
+
+    level = (level or os.getenv("LOG_LEVEL", "INFO")).upper()
+    debug_sample = int(debug_sample or os.getenv("LOG_DEBUG_SAMPLE", "1"))
+    high_water = int(high_water or os.getenv("LOG_QUEUE_HIGH_WATER", "1000"))
+
+    log_queue = queue.SimpleQueue()
+    queue_handler = logging.handlers.QueueHandler(log_queue)
+    queue_handler.addFilter(DebugSampler(log_queue, debug_sample, high_water))
+
+    stream_handler = logging.StreamHandler(sys.stderr)
+    stream_handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)-7s [%(name)s] %(message)s"))
+
+    root = logging.getLogger(ROOT_LOGGER)
+    root.setLevel(level)
+    root.handlers[:] = [queue_handler]
+    root.propagate = False
+
+    _listener = logging.handlers.QueueListener(log_queue, stream_handler, respect_handler_level=True)
+    _listener.start()
+    atexit.register(shutdown_logging)
+    return root
+
+
+def shutdown_logging():
+    """Дописывает очередь и останавливает фоновый писатель"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+def get_logger(name):
+    """Логгер модуля: tablebot.<name>"""
+    return logging.getLogger(f"{ROOT_LOGGER}.{name}")
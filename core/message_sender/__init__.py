@@ -1,17 +1,27 @@
 #!/usr/bin/env python3
-from .base import send_message_by_content
+from .base import send_message_by_content, post_message_by_content, send_plain_text
+from .scheduler import get_scheduler, close_schedulers, PRIORITY_REPLY, PRIORITY_NOTIFICATION, PRIORITY_BACKGROUND
 from .text_sender import send_text_message
-from .media_sender import send_photo_message, send_document_message, send_video_message
+from .media_sender import send_photo_message, send_document_message, send_video_message, warm_up_media, detect_media_type
 from .poll_sender import send_poll_message
 from .markup_builder import build_reply_markup, build_inline_markup
 from .format_detector import detect_parse_mode
 
 __all__ = [
     'send_message_by_content',
+    'post_message_by_content',
+    'send_plain_text',
+    'get_scheduler',
+    'close_schedulers',
+    'PRIORITY_REPLY',
+    'PRIORITY_NOTIFICATION',
+    'PRIORITY_BACKGROUND',
     'send_text_message',
     'send_photo_message', 
     'send_document_message',
     'send_video_message',
+    'warm_up_media',
+    'detect_media_type',
     'send_poll_message',
     'build_reply_markup',
     'build_inline_markup',
@@ -2,14 +2,32 @@
 # This file is part of Tablebot-pipe-Advanced and is licensed under the GNU GPL v3.0.
 # See the LICENSE file for details.
 #!/usr/bin/env python3
-import sys
 from .text_sender import send_text_message
 from .media_sender import send_photo_message, send_document_message, send_video_message
 from .poll_sender import send_poll_message
+from .scheduler import get_scheduler, PRIORITY_REPLY, PRIORITY_NOTIFICATION
 from aiogram.types import ReplyKeyboardMarkup, KeyboardButton
+from core.log import get_logger
 
-async def send_message_by_content(bot, chat_id, content):
-    """Отправляет сообщение на основе описания контента"""
+logger = get_logger("base")
+
+async def send_message_by_content(bot, chat_id, content, priority=PRIORITY_REPLY):
+    """Отправляет сообщение на основе описания контента через общий планировщик отправки"""
+    return await get_scheduler(bot.id).submit(chat_id, lambda: _send_by_type(bot, chat_id, content), priority)
+
+def post_message_by_content(bot, chat_id, content, priority=PRIORITY_NOTIFICATION):
+    """Ставит сообщение в очередь планировщика, не дожидаясь отправки; возвращает future.
+
+    Для уведомлений в чужие чаты: лимит чата получателя не должен задерживать
+    обработку апдейта отправителя.
+    """
+    return get_scheduler(bot.id).enqueue(chat_id, lambda: _send_by_type(bot, chat_id, content), priority)
+
+async def send_plain_text(bot, chat_id, text, priority=PRIORITY_REPLY):
+    """Отправляет служебный текст без разметки и клавиатуры через планировщик"""
+    return await get_scheduler(bot.id).submit(chat_id, lambda: bot.send_message(chat_id, text), priority)
+
+async def _send_by_type(bot, chat_id, content):
     message_type = content.get("type", "text")
     
     if message_type == "text":
@@ -25,7 +43,7 @@ async def send_message_by_content(bot, chat_id, content):
     elif message_type == "location":
         return await send_location_request(bot, chat_id, content)
     else:
-        print(f"[message_sender] ⚠️ Неизвестный тип сообщения: {message_type}", file=sys.stderr)
+        logger.warning("⚠️ Неизвестный тип сообщения: %s", message_type)
         return await send_text_message(bot, chat_id, content)
 
 async def send_location_request(bot, chat_id, content):
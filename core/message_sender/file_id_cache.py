@@ -0,0 +1,94 @@
+# \tablebot-pipe-advanced\core\message_sender\file_id_cache.py
+# Copyright (C) 2025 Leonid Yasin
+# This file is part of Tablebot-pipe-Advanced and is licensed under the GNU GPL v3.0.
+# See the LICENSE file for details.
+#!/usr/bin/env python3
+import os
+import sqlite3
+import threading
+from pathlib import Path
+from core.log import get_logger
+
+logger = get_logger("file_id_cache")
+
+
+class FileIdCache:
+    """Кэш Telegram file_id для локальных медиафайлов.
+
+    Ключ — (абсолютный путь, размер, mtime, тип отправки): изменённый файл
+    получает новый ключ и будет загружен заново. Записи хранятся в SQLite,
+    горячие ключи — в памяти, поэтому чтение не обращается к диску.
+    """
+
+    def __init__(self, db_path):
+        self.db_path = str(db_path)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS file_ids ("
+            " path TEXT NOT NULL, size INTEGER NOT NULL, mtime INTEGER NOT NULL,"
+            " kind TEXT NOT NULL, file_id TEXT NOT NULL,"
+            " PRIMARY KEY (path, size, mtime, kind))"
+        )
+        self._conn.commit()
+        self._memory = {
+            (path, size, mtime, kind): file_id
+            for path, size, mtime, kind, file_id in self._conn.execute(
+                "SELECT path, size, mtime, kind, file_id FROM file_ids"
+            )
+        }
+        logger.info("📦 Загружено %s file_id из %s", len(self._memory), self.db_path)
+
+    @staticmethod
+    def make_key(media_file, kind, bot_id=None):
+        """Ключ кэша для файла или None, если файла нет.
+
+        file_id действителен только для бота, который его получил, поэтому
+        id бота входит в ключ (в поле типа: "photo:123456").
+        """
+        try:
+            path = Path(media_file).resolve()
+            stat = path.stat()
+        except OSError:
+            return None
+        if bot_id is not None:
+            kind = f"{kind}:{bot_id}"
+        return (str(path), stat.st_size, stat.st_mtime_ns, kind)
+
+    def get(self, key):
+        return self._memory.get(key) if key else None
+
+    def put(self, key, file_id):
+        if not key or not file_id or self._memory.get(key) == file_id:
+            return
+        self._memory[key] = file_id
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO file_ids (path, size, mtime, kind, file_id) VALUES (?, ?, ?, ?, ?)",
+                (*key, file_id),
+            )
+            self._conn.commit()
+
+    def forget(self, key):
+        if not key or self._memory.pop(key, None) is None:
+            return
+        with self._lock:
+            self._conn.execute(
+                "DELETE FROM file_ids WHERE path = ? AND size = ? AND mtime = ? AND kind = ?", key
+            )
+            self._conn.commit()
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+_cache = None
+
+
+def get_file_id_cache():
+    """Общий кэш процесса (путь к базе — MEDIA_CACHE_DB, по умолчанию .file_ids.sqlite)"""
+    global _cache
+    if _cache is None:
+        _cache = FileIdCache(os.getenv("MEDIA_CACHE_DB", ".file_ids.sqlite"))
+    return _cache
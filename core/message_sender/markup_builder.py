@@ -3,8 +3,10 @@
 # This file is part of Tablebot-pipe-Advanced and is licensed under the GNU GPL v3.0.
 # See the LICENSE file for details.
 #!/usr/bin/env python3
-import sys
 from aiogram.types import ReplyKeyboardMarkup, KeyboardButton, InlineKeyboardMarkup, InlineKeyboardButton
+from core.log import get_logger
+
+logger = get_logger("markup_builder")
 
 def build_reply_markup(buttons_str):
     """Создает обычную клавиатуру"""
@@ -23,7 +25,7 @@ def build_reply_markup(buttons_str):
         resize_keyboard=True
     )
     
-    print(f"[markup_builder] 📋 Создана Reply клавиатура: {buttons}", file=sys.stderr)
+    logger.debug("📋 Создана Reply клавиатура: %s", buttons)
     return keyboard
 
 def build_inline_markup(buttons_str):
@@ -48,5 +50,40 @@ def build_inline_markup(buttons_str):
     
     keyboard = InlineKeyboardMarkup(inline_keyboard=inline_buttons)
     
-    print(f"[markup_builder] 🔘 Создана Inline клавиатура: {buttons_str}", file=sys.stderr)
-    return keyboard
\ No newline at end of file
+    logger.debug("🔘 Создана Inline клавиатура: %s", buttons_str)
+    return keyboard
+
+def build_location_request_markup(buttons_str):
+    """Создает клавиатуру с кнопкой отправки геолокации (и альтернативными кнопками)"""
+    buttons = []
+
+    # Добавляем альтернативные кнопки если есть
+    if buttons_str:
+        for btn_text in [btn.strip() for btn in buttons_str.split('|') if btn.strip()]:
+            buttons.append([KeyboardButton(text=btn_text)])
+
+    # Добавляем кнопку геолокации (работает в мобильных приложениях)
+    buttons.append([KeyboardButton(text="📍 Отправить геолокацию", request_location=True)])
+
+    logger.debug("📍 Создана клавиатура с запросом геолокации")
+    return ReplyKeyboardMarkup(
+        keyboard=buttons,
+        resize_keyboard=True,
+        one_time_keyboard=True
+    )
+
+def resolve_markup(content_type, reply_buttons="", inline_buttons="", integrations=""):
+    """Выбирает клавиатуру для сообщения данного типа (логика совпадает с отправителями)"""
+    if content_type == "photo":
+        # Используем inline-кнопки если есть, иначе обычные
+        return build_inline_markup(inline_buttons) or build_reply_markup(reply_buttons)
+
+    if content_type in ("document", "video", "poll"):
+        return build_reply_markup(reply_buttons)
+
+    # Текст и все остальные типы отправляются как текст
+    if integrations == "request_location":
+        return build_location_request_markup(reply_buttons)
+
+    # Inline-кнопки, иначе обычные; пустые reply-кнопки очищают клавиатуру
+    return build_inline_markup(inline_buttons) or build_reply_markup(reply_buttons)
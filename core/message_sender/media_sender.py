@@ -2,93 +2,154 @@
 # This file is part of Tablebot-pipe-Advanced and is licensed under the GNU GPL v3.0.
 # See the LICENSE file for details.
 #!/usr/bin/env python3
-import sys
 from aiogram.types import FSInputFile
-from .markup_builder import build_reply_markup, build_inline_markup
+from aiogram.exceptions import TelegramBadRequest
+from .markup_builder import resolve_markup
 from .format_detector import detect_parse_mode
+from .file_id_cache import get_file_id_cache
+from .scheduler import get_scheduler, PRIORITY_BACKGROUND
+from core.log import get_logger
+
+logger = get_logger("media_sender")
+
+# Тип сообщения по расширению файла (проверка по вхождению — работает и для URL с параметрами)
+MEDIA_EXTENSIONS = (
+    ("photo", ('.jpg', '.jpeg', '.png', '.gif', '.webp')),
+    ("video", ('.mp4', '.avi', '.mov', '.mkv')),
+    ("document", ('.pdf', '.doc', '.docx', '.txt')),
+    ("audio", ('.mp3', '.wav', '.ogg')),
+)
+
+def detect_media_type(media_file):
+    """Определяет тип медиа по расширению файла или None"""
+    file_ext = media_file.lower()
+    for media_type, extensions in MEDIA_EXTENSIONS:
+        if any(ext in file_ext for ext in extensions):
+            return media_type
+    return None
+
+def _content_markup(content, kind):
+    """Клавиатура из плана ответа или построенная по описанию кнопок"""
+    if "markup" in content:
+        return content["markup"]
+    return resolve_markup(kind, content.get("reply_buttons", ""), content.get("inline_buttons", ""))
+
+def _caption_parse_mode(content):
+    if "caption_parse_mode" in content:
+        return content["caption_parse_mode"]
+    return detect_parse_mode(content.get("caption", ""))
+
+def _sent_file_id(message, kind):
+    """Извлекает file_id из ответа Telegram на отправку"""
+    if kind == "photo" and message.photo:
+        return message.photo[-1].file_id
+    media = getattr(message, kind, None)
+    return media.file_id if media else None
+
+async def _send_media(bot, kind, media_file, **kwargs):
+    """Отправляет медиа: URL как есть, локальный файл — по file_id из кэша или загрузкой"""
+    send = getattr(bot, f"send_{kind}")
+    if media_file.startswith(('http://', 'https://')):
+        return await send(**{kind: media_file}, **kwargs)
+
+    cache = get_file_id_cache()
+    key = cache.make_key(media_file, kind, bot.id)
+    file_id = cache.get(key)
+    if file_id:
+        try:
+            return await send(**{kind: file_id}, **kwargs)
+        except TelegramBadRequest as e:
+            # file_id мог устареть (например, другой токен бота) — загружаем заново
+            logger.warning("⚠️ file_id для %s отклонён: %s", media_file, e)
+            cache.forget(key)
+
+    message = await send(**{kind: FSInputFile(media_file)}, **kwargs)
+    cache.put(key, _sent_file_id(message, kind))
+    return message
 
 async def send_photo_message(bot, chat_id, content):
     """Отправляет фото"""
     media_file = content.get("media_file", "")
-    inline_markup = build_inline_markup(content.get("inline_buttons", ""))
-    reply_markup = build_reply_markup(content.get("reply_buttons", ""))
-    
-    # Используем inline-кнопки если есть, иначе обычные
-    markup = inline_markup if inline_markup else reply_markup
-    
+    markup = _content_markup(content, "photo")
     caption = content.get("caption", "")
-    parse_mode = detect_parse_mode(caption)
-    
-    print(f"[media_sender] 🖼️ Отправка фото: {media_file}", file=sys.stderr)
-    
-    if media_file.startswith(('http://', 'https://')):
-        return await bot.send_photo(
-            chat_id=chat_id,
-            photo=media_file,
-            caption=caption,
-            parse_mode=parse_mode,
-            reply_markup=markup
-        )
-    else:
-        photo = FSInputFile(media_file)
-        return await bot.send_photo(
-            chat_id=chat_id,
-            photo=photo,
-            caption=caption,
-            parse_mode=parse_mode,
-            reply_markup=markup
-        )
+    parse_mode = _caption_parse_mode(content)
+
+    logger.debug("🖼️ Отправка фото: %s", media_file)
+
+    return await _send_media(
+        bot, "photo", media_file,
+        chat_id=chat_id,
+        caption=caption,
+        parse_mode=parse_mode,
+        reply_markup=markup
+    )
 
 async def send_document_message(bot, chat_id, content):
     """Отправляет документ"""
     media_file = content.get("media_file", "")
-    reply_markup = build_reply_markup(content.get("reply_buttons", ""))
+    reply_markup = _content_markup(content, "document")
     caption = content.get("caption", "")
-    parse_mode = detect_parse_mode(caption)
-    
-    print(f"[media_sender] 📄 Отправка документа: {media_file}", file=sys.stderr)
-    
-    if media_file.startswith(('http://', 'https://')):
-        return await bot.send_document(
-            chat_id=chat_id,
-            document=media_file,
-            caption=caption,
-            parse_mode=parse_mode,
-            reply_markup=reply_markup
-        )
-    else:
-        document = FSInputFile(media_file)
-        return await bot.send_document(
-            chat_id=chat_id,
-            document=document,
-            caption=caption,
-            parse_mode=parse_mode,
-            reply_markup=reply_markup
-        )
+    parse_mode = _caption_parse_mode(content)
+
+    logger.debug("📄 Отправка документа: %s", media_file)
+
+    return await _send_media(
+        bot, "document", media_file,
+        chat_id=chat_id,
+        caption=caption,
+        parse_mode=parse_mode,
+        reply_markup=reply_markup
+    )
 
 async def send_video_message(bot, chat_id, content):
     """Отправляет видео"""
     media_file = content.get("media_file", "")
-    reply_markup = build_reply_markup(content.get("reply_buttons", ""))
+    reply_markup = _content_markup(content, "video")
     caption = content.get("caption", "")
-    parse_mode = detect_parse_mode(caption)
-    
-    print(f"[media_sender] 🎥 Отправка видео: {media_file}", file=sys.stderr)
-    
-    if media_file.startswith(('http://', 'https://')):
-        return await bot.send_video(
-            chat_id=chat_id,
-            video=media_file,
-            caption=caption,
-            parse_mode=parse_mode,
-            reply_markup=reply_markup
-        )
-    else:
-        video = FSInputFile(media_file)
-        return await bot.send_video(
-            chat_id=chat_id,
-            video=video,
-            caption=caption,
-            parse_mode=parse_mode,
-            reply_markup=reply_markup
-        )
\ No newline at end of file
+    parse_mode = _caption_parse_mode(content)
+
+    logger.debug("🎥 Отправка видео: %s", media_file)
+
+    return await _send_media(
+        bot, "video", media_file,
+        chat_id=chat_id,
+        caption=caption,
+        parse_mode=parse_mode,
+        reply_markup=reply_markup
+    )
+
+async def warm_up_media(bot, rows, chat_id):
+    """Заранее загружает все локальные media_file таблицы в служебный чат и кэширует file_id.
+
+    Загрузки идут через планировщик отправки с низшим приоритетом: лимиты
+    Telegram соблюдаются, а ответы пользователям обгоняют прогрев.
+    """
+    senders = {"photo": bot.send_photo, "document": bot.send_document, "video": bot.send_video}
+    cache = get_file_id_cache()
+    uploaded = 0
+
+    for media_file in dict.fromkeys(row.get("media_file") or "" for row in rows):
+        if not media_file or media_file == "—" or media_file.startswith(('http://', 'https://')):
+            continue
+        kind = detect_media_type(media_file)
+        if kind not in senders:
+            continue
+        key = cache.make_key(media_file, kind, bot.id)
+        if key is None:
+            logger.warning("⚠️ Прогрев: файл не найден %s", media_file)
+            continue
+        if cache.get(key):
+            continue
+        try:
+            message = await get_scheduler(bot.id).submit(
+                chat_id,
+                lambda send=senders[kind], kind=kind, media_file=media_file: send(chat_id=chat_id, **{kind: FSInputFile(media_file)}),
+                PRIORITY_BACKGROUND,
+            )
+            cache.put(key, _sent_file_id(message, kind))
+            uploaded += 1
+        except Exception as e:
+            logger.error("❌ Прогрев %s: %s", media_file, e)
+
+    logger.info("🔥 Прогрев медиа завершён: загружено %s файлов", uploaded)
+    return uploaded
@@ -0,0 +1,285 @@
+# \tablebot-pipe-advanced\core\message_sender\scheduler.py
+# Copyright (C) 2025 Leonid Yasin
+# This file is part of Tablebot-pipe-Advanced and is licensed under the GNU GPL v3.0.
+# See the LICENSE file for details.
+#!/usr/bin/env python3
+import os
+import heapq
+import asyncio
+import itertools
+from collections import deque
+
+from aiogram.exceptions import TelegramRetryAfter
+from core.log import get_logger
+
+logger = get_logger("scheduler")
+
+# Приоритеты: меньше — раньше
+PRIORITY_REPLY = 0          # ответ пользователю, который только что написал
+PRIORITY_NOTIFICATION = 10  # уведомления в другие чаты
+PRIORITY_BACKGROUND = 20    # фоновые отправки (прогрев медиа при старте)
+
+
+class TokenBucket:
+    """Ведро токенов: rate токенов в секунду, не больше capacity"""
+
+    __slots__ = ("rate", "capacity", "tokens", "updated", "blocked_until")
+
+    def __init__(self, rate, capacity, now):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = now
+        self.blocked_until = 0.0
+
+    def _refill(self, now):
+        if now > self.updated:
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+
+    def wait_time(self, now):
+        """Через сколько секунд будет доступен токен (0 — сейчас)"""
+        self._refill(now)
+        wait = 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+        return max(wait, self.blocked_until - now)
+
+    def take(self, now):
+        self._refill(now)
+        self.tokens -= 1
+
+    def is_idle(self, now):
+        self._refill(now)
+        return self.tokens >= self.capacity and self.blocked_until <= now
+
+
+class _Job:
+    __slots__ = ("priority", "seq", "factory", "future", "retries")
+
+    def __init__(self, priority, seq, factory, future):
+        self.priority = priority
+        self.seq = seq
+        self.factory = factory
+        self.future = future
+        self.retries = 0
+
+
+class SendScheduler:
+    """Единая очередь исходящих запросов к Bot API.
+
+    - глобальное ведро токенов (лимит бота) и ведро на каждый чат
+      (для групп — отдельный, более низкий лимит);
+    - в каждом чате сообщения уходят строго по очереди: следующий запрос
+      чата не начинается, пока не завершится предыдущий;
+    - между чатами выбирается голова очереди с наименьшим приоритетом
+      (ответы раньше уведомлений), при равном — более ранняя;
+    - на TelegramRetryAfter чат блокируется на retry_after секунд и запрос
+      повторяется.
+    """
+
+    def __init__(self, global_rate=None, chat_rate=None, group_rate=None, chat_burst=None, max_retries=None):
+        self.global_rate = float(global_rate or os.getenv("SEND_GLOBAL_RATE", "30"))
+        self.chat_rate = float(chat_rate or os.getenv("SEND_CHAT_RATE", "1"))
+        # Группы: 20 сообщений в минуту
+        self.group_rate = float(group_rate or os.getenv("SEND_GROUP_RATE", str(20 / 60)))
+        self.chat_burst = float(chat_burst or os.getenv("SEND_CHAT_BURST", "3"))
+        self.max_retries = int(max_retries or os.getenv("SEND_MAX_RETRIES", "5"))
+
+        self._global = None
+        self._buckets = {}      # chat_id -> TokenBucket
+        self._chats = {}        # chat_id -> deque[_Job]; голова — текущий запрос чата
+        self._ready = []        # куча (priority, seq, chat_id) чатов, готовых к отправке
+        self._pending = 0
+        self._seq = itertools.count()
+        self._wakeup = None
+        self._task = None
+        self._inflight = set()  # задачи _execute, ещё не завершившиеся
+
+    # --- Публичный интерфейс ---
+
+    @property
+    def queue_depth(self):
+        """Сколько запросов ждут отправки (включая выполняющиеся)"""
+        return self._pending
+
+    def chat_queue_depth(self, chat_id):
+        return len(self._chats.get(chat_id, ()))
+
+    async def submit(self, chat_id, factory, priority=PRIORITY_REPLY):
+        """Ставит запрос в очередь и ждёт результата.
+
+        factory — функция без аргументов, возвращающая корутину запроса
+        (вызывается заново при повторе).
+        """
+        return await self.enqueue(chat_id, factory, priority)
+
+    def enqueue(self, chat_id, factory, priority=PRIORITY_REPLY):
+        """Ставит запрос в очередь, не дожидаясь отправки; возвращает future результата"""
+        self._ensure_started()
+        loop = asyncio.get_running_loop()
+        job = _Job(priority, next(self._seq), factory, loop.create_future())
+
+        queue = self._chats.get(chat_id)
+        if queue is None:
+            queue = self._chats[chat_id] = deque()
+        queue.append(job)
+        self._pending += 1
+        if len(queue) == 1:
+            self._push_ready(chat_id)
+        return job.future
+
+    async def close(self):
+        """Останавливает планировщик: выполняющиеся и ждущие запросы завершаются ошибкой"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+        # Запросы в полёте отменяются — _execute сам завершит их future
+        inflight = list(self._inflight)
+        for task in inflight:
+            task.cancel()
+        await asyncio.gather(*inflight, return_exceptions=True)
+
+        # Остальные так и не начались: иначе отправители ждали бы их вечно
+        for queue in self._chats.values():
+            for job in queue:
+                if not job.future.done():
+                    job.future.set_exception(ConnectionError("Планировщик отправки закрыт"))
+        self._chats.clear()
+        self._ready.clear()
+        self._pending = 0
+
+    # --- Внутреннее ---
+
+    def _ensure_started(self):
+        if self._task is None or self._task.done():
+            loop = asyncio.get_running_loop()
+            self._global = self._global or TokenBucket(self.global_rate, self.global_rate, loop.time())
+            self._wakeup = asyncio.Event()
+            self._task = loop.create_task(self._run())
+
+    def _push_ready(self, chat_id):
+        job = self._chats[chat_id][0]
+        heapq.heappush(self._ready, (job.priority, job.seq, chat_id))
+        self._wakeup.set()
+
+    def _bucket(self, chat_id, now):
+        bucket = self._buckets.get(chat_id)
+        if bucket is None:
+            rate = self.group_rate if isinstance(chat_id, int) and chat_id < 0 else self.chat_rate
+            bucket = self._buckets[chat_id] = TokenBucket(rate, self.chat_burst, now)
+        return bucket
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            if not self._ready:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+
+            now = loop.time()
+            global_wait = self._global.wait_time(now)
+            if global_wait > 0:
+                await asyncio.sleep(global_wait)
+                continue
+
+            # Лучший по приоритету чат, у которого есть токен
+            postponed = []
+            picked = None
+            next_wait = None
+            while self._ready:
+                entry = heapq.heappop(self._ready)
+                wait = self._bucket(entry[2], now).wait_time(now)
+                if wait <= 0:
+                    picked = entry
+                    break
+                postponed.append(entry)
+                next_wait = wait if next_wait is None else min(next_wait, wait)
+            for entry in postponed:
+                heapq.heappush(self._ready, entry)
+
+            if picked is None:
+                # Все готовые чаты упёрлись в свой лимит — ждём токен или новый запрос
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), next_wait)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            chat_id = picked[2]
+            self._global.take(now)
+            self._bucket(chat_id, now).take(now)
+            task = loop.create_task(self._execute(chat_id))
+            self._inflight.add(task)
+            task.add_done_callback(self._inflight.discard)
+
+            if len(self._buckets) > 4 * max(len(self._chats), 256):
+                self._prune_buckets(now)
+
+    async def _execute(self, chat_id):
+        queue = self._chats[chat_id]
+        job = queue[0]
+        try:
+            result = await job.factory()
+        except TelegramRetryAfter as e:
+            job.retries += 1
+            if job.retries <= self.max_retries:
+                loop = asyncio.get_running_loop()
+                bucket = self._bucket(chat_id, loop.time())
+                bucket.blocked_until = loop.time() + e.retry_after
+                logger.warning("⚠️ Лимит Telegram для чата %s: повтор через %s с (попытка %s)",
+                               chat_id, e.retry_after, job.retries)
+                # Запрос остаётся головой очереди чата — порядок сохраняется
+                self._push_ready(chat_id)
+                return
+            self._finish(chat_id, job, error=e)
+        except Exception as e:
+            self._finish(chat_id, job, error=e)
+        except BaseException:
+            # Отмена (в т.ч. закрытие планировщика) — голова очереди снимается, future не зависает
+            self._finish(chat_id, job, error=ConnectionError("Запрос отправки отменён"))
+            raise
+        else:
+            self._finish(chat_id, job, result=result)
+
+    def _finish(self, chat_id, job, result=None, error=None):
+        queue = self._chats[chat_id]
+        queue.popleft()
+        self._pending -= 1
+        if not job.future.done():
+            if error is not None:
+                job.future.set_exception(error)
+            else:
+                job.future.set_result(result)
+        if queue:
+            self._push_ready(chat_id)
+        else:
+            del self._chats[chat_id]
+
+    def _prune_buckets(self, now):
+        """Удаляет вёдра чатов без очереди, которые уже полностью наполнились"""
+        for chat_id in [c for c, b in self._buckets.items() if c not in self._chats and b.is_idle(now)]:
+            del self._buckets[chat_id]
+
+
+_schedulers = {}
+
+
+def get_scheduler(bot_id=None):
+    """Планировщик отправки бота: лимиты Telegram действуют на каждый токен отдельно"""
+    scheduler = _schedulers.get(bot_id)
+    if scheduler is None:
+        scheduler = _schedulers[bot_id] = SendScheduler()
+    return scheduler
+
+
+async def close_schedulers():
+    """Закрывает планировщики всех ботов процесса"""
+    for scheduler in list(_schedulers.values()):
+        await scheduler.close()
+    _schedulers.clear()
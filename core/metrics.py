@@ -0,0 +1,240 @@
+# \tablebot-pipe-advanced\core\metrics.py
+# Copyright (C) 2025 Leonid Yasin
+# This file is part of Tablebot-pipe-Advanced and is licensed under the GNU GPL v3.0.
+# See the LICENSE file for details.
+#!/usr/bin/env python3
+"""Метрики процесса в формате Prometheus.
+
+Гистограммы длительности этапов обработки апдейта, счётчики апдейтов
+и ошибок, число апдейтов в обработке. Метки — бот и process_name строки
+таблицы (не chat_id: число рядов метрик не растёт с числом пользователей).
+METRICS_PORT включает HTTP-эндпоинт /metrics (METRICS_HOST, по умолчанию 0.0.0.0).
+"""
+import os
+import time
+from bisect import bisect_left
+
+from aiohttp import web
+from core.log import get_logger
+
+logger = get_logger("metrics")
+
+# Границы корзин, секунды: от 50 мкс (find_row) до 10 с (медленная интеграция)
+LATENCY_BUCKETS = (
+    0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005,
+    0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0,
+)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels_text(names, values, extra=""):
+    parts = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _number(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children = {}
+
+    def labels(self, *values):
+        """Ряд метрики для значений меток (создаётся при первом обращении)"""
+        child = self._children.get(values)
+        if child is None:
+            if len(values) != len(self.labelnames):
+                raise ValueError(f"{self.name}: ожидаются метки {self.labelnames}")
+            child = self._children[values] = self._new_child()
+        return child
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        for values, child in sorted(self._children.items()):
+            lines.extend(self._render_child(values, child))
+        return lines
+
+
+class _Value:
+    __slots__ = ("value",)
+
+    def __init__(self):
+        self.value = 0
+
+    def inc(self, amount=1):
+        self.value += amount
+
+    def dec(self, amount=1):
+        self.value -= amount
+
+    def set(self, value):
+        self.value = value
+
+
+class Counter(_Metric):
+    kind = "counter"
+    _new_child = _Value
+
+    def _render_child(self, values, child):
+        yield f"{self.name}{_labels_text(self.labelnames, values)} {_number(child.value)}"
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+
+class _HistogramValue:
+    __slots__ = ("bounds", "counts", "sum", "count")
+
+    def __init__(self, bounds):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)    # последняя корзина — +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        # Некумулятивные счётчики: одна запись на замер; накопление — при выдаче
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def _new_child(self):
+        return _HistogramValue(self.buckets)
+
+    def _render_child(self, values, child):
+        cumulative = 0
+        for bound, count in zip(self.buckets + (float("inf"),), child.counts):
+            cumulative += count
+            le = f'le="{_number(bound)}"'
+            yield f"{self.name}_bucket{_labels_text(self.labelnames, values, le)} {cumulative}"
+        labels = _labels_text(self.labelnames, values)
+        yield f"{self.name}_sum{labels} {_number(child.sum)}"
+        yield f"{self.name}_count{labels} {child.count}"
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = {}
+
+    def register(self, metric):
+        if metric.name in self._metrics:
+            raise ValueError(f"Метрика {metric.name} уже зарегистрирована")
+        self._metrics[metric.name] = metric
+        return metric
+
+    def render(self):
+        """Все метрики в текстовом формате Prometheus 0.0.4"""
+        lines = []
+        for metric in self._metrics.values():
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+STAGE_SECONDS = REGISTRY.register(Histogram(
+    "tablebot_stage_seconds", "Длительность этапа обработки апдейта", ("bot", "process", "stage"),
+))
+UPDATE_SECONDS = REGISTRY.register(Histogram(
+    "tablebot_update_seconds", "Полное время обработки апдейта", ("bot", "process"),
+))
+UPDATES_TOTAL = REGISTRY.register(Counter(
+    "tablebot_updates_total", "Обработанные апдейты по исходу (ok, not_found, error)", ("bot", "process", "outcome"),
+))
+ERRORS_TOTAL = REGISTRY.register(Counter(
+    "tablebot_errors_total", "Апдейты, завершившиеся исключением", ("bot",),
+))
+IN_FLIGHT = REGISTRY.register(Gauge(
+    "tablebot_updates_in_flight", "Апдейты в обработке", ("bot",),
+))
+
+# id бота -> метка (имя из манифеста)
+_bot_labels = {}
+
+
+def register_bot(bot_id, name):
+    """Имя бота для метки bot вместо числового id"""
+    _bot_labels[bot_id] = name
+
+
+def bot_label(bot_id):
+    label = _bot_labels.get(bot_id)
+    return label if label is not None else str(bot_id)
+
+
+class UpdateTimer:
+    """Замер одного апдейта.
+
+    lap(stage) закрывает этап: длительность считается от предыдущего lap.
+    finish() пишет все этапы разом — когда уже известен process_name строки.
+    """
+
+    __slots__ = ("bot", "started", "last", "laps")
+
+    def __init__(self, bot_id):
+        self.bot = bot_label(bot_id)
+        self.started = self.last = time.perf_counter()
+        self.laps = []
+        IN_FLIGHT.labels(self.bot).inc()
+
+    def lap(self, stage):
+        now = time.perf_counter()
+        self.laps.append((stage, now - self.last))
+        self.last = now
+
+    def finish(self, process, outcome):
+        process = process or "-"
+        for stage, seconds in self.laps:
+            STAGE_SECONDS.labels(self.bot, process, stage).observe(seconds)
+        UPDATE_SECONDS.labels(self.bot, process).observe(time.perf_counter() - self.started)
+        UPDATES_TOTAL.labels(self.bot, process, outcome).inc()
+        if outcome == "error":
+            ERRORS_TOTAL.labels(self.bot).inc()
+        IN_FLIGHT.labels(self.bot).dec()
+
+
+def create_metrics_app(registry=REGISTRY):
+    app = web.Application()
+
+    async def metrics(request):
+        return web.Response(
+            text=registry.render(),
+            headers={"Content-Type": "text/plain; version=0.0.4; charset=utf-8"},
+        )
+
+    app.router.add_get("/metrics", metrics)
+    return app
+
+
+async def start_metrics_server(host=None, port=None):
+    """Запускает /metrics в текущем цикле событий; возвращает AppRunner или None, если METRICS_PORT не задан"""
+    port = port or os.getenv("METRICS_PORT")
+    if not port:
+        return None
+    host = host or os.getenv("METRICS_HOST", "0.0.0.0")
+    runner = web.AppRunner(create_metrics_app())
+    await runner.setup()
+    await web.TCPSite(runner, host, int(port)).start()
+    logger.info("📈 Метрики: http://%s:%s/metrics", host, port)
+    return runner
@@ -2,85 +2,179 @@
 # This file is part of Tablebot-pipe-Advanced and is licensed under the GNU GPL v3.0.
 # See the LICENSE file for details.
 #!/usr/bin/env python3
-import json
-import subprocess
-import sys
-import tempfile
 import os
+import sys
+import json
+import asyncio
+import itertools
+from pathlib import Path
+from core.log import get_logger
 
-async def execute_pipeline(table_path, payload, scripts_chain):
-    """Выполняет цепочку микросервисов и возвращает результат"""
-    try:
-        # Создаем временный файл с входными данными
-        with tempfile.NamedTemporaryFile(mode='w', encoding='utf-8', suffix='.json', delete=False) as f:
-            json.dump(payload, f, ensure_ascii=False)
-            input_file = f.name
-
-        result_file = None
-        intermediate_files = []
-        success = True
-        
-        for i, (script_name, script_args) in enumerate(scripts_chain):
-            # Определяем входной файл
-            if i == 0:
-                input_f = input_file
-            else:
-                input_f = intermediate_files[-1]
+logger = get_logger("pipeline_executor")
 
-            # Определяем выходной файл
-            if i == len(scripts_chain) - 1:
-                with tempfile.NamedTemporaryFile(mode='w', encoding='utf-8', suffix='.json', delete=False) as f:
-                    result_file = f.name
-                output_f = result_file
-            else:
-                with tempfile.NamedTemporaryFile(mode='w', encoding='utf-8', suffix='.json', delete=False) as f:
-                    intermediate_files.append(f.name)
-                output_f = intermediate_files[-1]
-
-            # Запускаем скрипт
-            cmd = [sys.executable, script_name] + script_args
-            print(f"[pipeline] 🔧 Запуск {script_name}...", file=sys.stderr)
-            
-            with open(input_f, 'r', encoding='utf-8') as infile:
-                with open(output_f, 'w', encoding='utf-8') as outfile:
-                    process = subprocess.run(
-                        cmd,
-                        stdin=infile,
-                        stdout=outfile,
-                        stderr=subprocess.PIPE,
-                        text=True,
-                        timeout=5
-                    )
-                    
-                    if process.stderr:
-                        print(f"[pipeline] {script_name} stderr: {process.stderr.strip()}", file=sys.stderr)
-                    
-                    if process.returncode != 0:
-                        print(f"[pipeline] ❌ {script_name} завершился с ошибкой", file=sys.stderr)
-                        success = False
-                        break
-
-        # Читаем результат
-        result = None
-        if success and result_file and os.path.exists(result_file):
-            with open(result_file, 'r', encoding='utf-8') as f:
-                result_data = f.read().strip()
-                if result_data:
-                    result = json.loads(result_data)
-
-        # Очистка временных файлов
-        for f in [input_file, result_file] + intermediate_files:
+WORKER_SCRIPT = str(Path(__file__).with_name("pipeline_worker.py"))
+_CLOSED = object()  # метка закрытого пула в очереди свободных слотов
+
+
+class PipelineError(RuntimeError):
+    """Скрипт пайплайна завершился с ошибкой"""
+
+
+class _Worker:
+    """Один процесс core/pipeline_worker.py"""
+
+    def __init__(self, process):
+        self.process = process
+        self.calls = 0
+        self._stderr_task = asyncio.get_running_loop().create_task(self._pump_stderr())
+
+    @classmethod
+    async def start(cls):
+        process = await asyncio.create_subprocess_exec(
+            sys.executable, WORKER_SCRIPT,
+            stdin=asyncio.subprocess.PIPE,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE,
+            limit=16 * 1024 * 1024,
+        )
+        logger.debug("🔧 Запущен процесс пайплайна pid=%s", process.pid)
+        return cls(process)
+
+    @property
+    def alive(self):
+        return self.process.returncode is None
+
+    async def _pump_stderr(self):
+        # Вывод в stderr вне запросов (например, print при импорте скрипта)
+        async for line in self.process.stderr:
+            logger.debug("[worker %s] %s", self.process.pid, line.decode("utf-8", "replace").rstrip())
+
+    async def call(self, request):
+        self.calls += 1
+        self.process.stdin.write((json.dumps(request, ensure_ascii=False) + "\n").encode("utf-8"))
+        await self.process.stdin.drain()
+        line = await self.process.stdout.readline()
+        if not line:
+            raise PipelineError("процесс пайплайна завершился")
+        return json.loads(line)
+
+    async def stop(self):
+        if self.alive:
+            self.process.kill()
+        await self.process.wait()
+        self._stderr_task.cancel()
+
+
+class WorkerPool:
+    """Пул долгоживущих процессов для микросервисов пайплайна.
+
+    Процесс импортирует скрипт один раз и получает запросы JSON-строками
+    через pipe. Запрос, превысивший timeout, убивает свой процесс; процесс
+    также пересоздаётся после max_calls запросов или при падении.
+    """
+
+    def __init__(self, size=None, timeout=None, max_calls=None):
+        self.size = int(size or os.getenv("PIPELINE_WORKERS", "2"))
+        self.timeout = float(timeout or os.getenv("PIPELINE_TIMEOUT", "5"))
+        self.max_calls = int(max_calls or os.getenv("PIPELINE_WORKER_MAX_CALLS", "500"))
+        self._idle = None
+        self._workers = set()   # все живые процессы пула, в том числе занятые запросом
+        self._ids = itertools.count(1)
+
+    def _ensure_started(self):
+        if self._idle is None:
+            self._idle = asyncio.Queue()
+            # Слоты пула; процесс создаётся при первом запросе в слот
+            for _ in range(self.size):
+                self._idle.put_nowait(None)
+
+    async def call(self, script, args, data):
+        """Выполняет один скрипт в свободном процессе пула. Возвращает результат скрипта"""
+        self._ensure_started()
+        idle = self._idle
+        worker = await idle.get()
+        if worker is _CLOSED:
+            # Пул закрыт, пока запрос ждал слот — будим следующего ожидающего
+            idle.put_nowait(_CLOSED)
+            raise PipelineError("пул процессов пайплайна закрыт")
+        try:
+            if worker is None or not worker.alive:
+                if worker is not None:
+                    await self._stop_worker(worker)
+                worker = await _Worker.start()
+                self._workers.add(worker)
+
+            request = {"id": next(self._ids), "script": script, "args": list(args), "data": data}
             try:
-                if f and os.path.exists(f):
-                    os.unlink(f)
-            except:
-                pass
+                response = await asyncio.wait_for(worker.call(request), self.timeout)
+            except BaseException as e:
+                # Прерванный запрос оставляет протокол в неизвестном состоянии — процесс убиваем
+                if isinstance(e, asyncio.TimeoutError):
+                    logger.error("❌ %s: превышен таймаут %s с, процесс перезапускается", script, self.timeout)
+                await self._stop_worker(worker)
+                worker = None
+                raise
+
+            if response.get("stderr"):
+                logger.debug("%s stderr: %s", script, response["stderr"].strip())
+            if not response.get("ok"):
+                raise PipelineError(f"{script}: {response.get('error')}")
+            return response.get("result")
+
+        finally:
+            if self._idle is not idle:
+                # Пул закрыли во время запроса: слот не возвращаем, процесс не оставляем
+                if worker is not None:
+                    await self._stop_worker(worker)
+            else:
+                if worker is not None and worker.calls >= self.max_calls:
+                    logger.debug("♻️ Процесс пайплайна pid=%s обработал %s запросов — перезапуск", worker.process.pid, worker.calls)
+                    await self._stop_worker(worker)
+                    worker = None
+                idle.put_nowait(worker)
+
+    async def _stop_worker(self, worker):
+        self._workers.discard(worker)
+        await worker.stop()
+
+    async def close(self):
+        """Останавливает все процессы пула, включая занятые; ждущие слот получают PipelineError"""
+        if self._idle is None:
+            return
+        idle, self._idle = self._idle, None
+        idle.put_nowait(_CLOSED)
+        for worker in list(self._workers):
+            await self._stop_worker(worker)
 
-        return result
 
-    except subprocess.TimeoutExpired:
-        print("[pipeline] ❌ Пайплайн завис", file=sys.stderr)
+_pool = None
+
+
+def get_worker_pool():
+    """Общий пул процессов пайплайна"""
+    global _pool
+    if _pool is None:
+        _pool = WorkerPool()
+    return _pool
+
+
+async def execute_pipeline(table_path, payload, scripts_chain):
+    """Выполняет цепочку микросервисов и возвращает результат"""
+    pool = get_worker_pool()
+    data = payload
+    try:
+        # Выход каждого скрипта — вход следующего
+        for script_name, script_args in scripts_chain:
+            logger.debug("🔧 Запуск %s...", script_name)
+            data = await pool.call(script_name, script_args, data)
+        return data
+
+    except asyncio.TimeoutError:
+        logger.error("❌ Пайплайн завис")
+        return None
+    except PipelineError as e:
+        logger.error("❌ Ошибка скрипта пайплайна: %s", e)
         return None
     except Exception as e:
-        print(f"[pipeline] 💥 Ошибка: {e}", file=sys.stderr)
-        return None
\ No newline at end of file
+        logger.error("💥 Ошибка: %s", e)
+        return None
@@ -0,0 +1,111 @@
+# \tablebot-pipe-advanced\core\pipeline_worker.py
+# Copyright (C) 2025 Leonid Yasin
+# This file is part of Tablebot-pipe-Advanced and is licensed under the GNU GPL v3.0.
+# See the LICENSE file for details.
+#!/usr/bin/env python3
+"""Долгоживущий процесс-исполнитель микросервисов пайплайна.
+
+Запускается пулом из core/pipeline_executor.py. Протокол — JSON-строки:
+    запрос:  {"id": 1, "script": "path.py", "args": [...], "data": {...}}
+    ответ:   {"id": 1, "ok": true, "result": ..., "stderr": "..."}
+             {"id": 1, "ok": false, "error": "...", "stderr": "..."}
+
+Скрипт с функцией process(data, args) импортируется один раз (повторно —
+только если файл изменился) и вызывается напрямую. Обычный скрипт
+«stdin JSON -> stdout JSON» выполняется в этом же процессе через runpy
+с подменёнными stdin/stdout/argv — без запуска нового интерпретатора.
+"""
+import io
+import os
+import ast
+import sys
+import json
+import runpy
+import traceback
+import importlib.util
+from contextlib import redirect_stdout, redirect_stderr
+
+# script path -> (mtime, module или None для скриптов без process)
+_modules = {}
+
+
+def _load(script):
+    path = os.path.abspath(script)
+    mtime = os.stat(path).st_mtime_ns
+    cached = _modules.get(path)
+    if cached and cached[0] == mtime:
+        return cached[1]
+
+    # Импортируем только скрипты с функцией process: код обычного скрипта
+    # на верхнем уровне может читать stdin, а это канал протокола
+    module = None
+    with open(path, encoding="utf-8") as f:
+        tree = ast.parse(f.read(), path)
+    if any(isinstance(node, ast.FunctionDef) and node.name == "process" for node in tree.body):
+        # Блок if __name__ == "__main__" при импорте не выполняется
+        spec = importlib.util.spec_from_file_location(f"_pipeline_script_{len(_modules)}", path)
+        module = importlib.util.module_from_spec(spec)
+        script_dir = os.path.dirname(path)
+        if script_dir not in sys.path:
+            sys.path.insert(0, script_dir)
+        spec.loader.exec_module(module)
+    _modules[path] = (mtime, module)
+    return module
+
+
+def _run_script(script, args, data):
+    """Выполняет скрипт как __main__ с JSON в stdin; возвращает разобранный stdout"""
+    stdin = io.StringIO(json.dumps(data, ensure_ascii=False) if data is not None else "")
+    stdout = io.StringIO()
+    saved_stdin, saved_argv = sys.stdin, sys.argv
+    sys.stdin, sys.argv = stdin, [script] + list(args)
+    try:
+        with redirect_stdout(stdout):
+            try:
+                runpy.run_path(script, run_name="__main__")
+            except SystemExit as e:
+                if e.code not in (None, 0):
+                    raise RuntimeError(f"{script} завершился с кодом {e.code}")
+    finally:
+        sys.stdin, sys.argv = saved_stdin, saved_argv
+
+    output = stdout.getvalue().strip()
+    return json.loads(output) if output else None
+
+
+def handle(request):
+    script = request["script"]
+    args = request.get("args") or []
+    data = request.get("data")
+
+    module = _load(script)
+    if module is not None:
+        return module.process(data, args)
+    return _run_script(script, args, data)
+
+
+def main():
+    # Канал протокола — копия stdout; сам stdout уводим в stderr,
+    # чтобы случайный print в скрипте не ломал протокол
+    protocol = os.fdopen(os.dup(sys.stdout.fileno()), "w", encoding="utf-8")
+    os.dup2(sys.stderr.fileno(), sys.stdout.fileno())
+
+    for line in sys.stdin:
+        if not line.strip():
+            continue
+        request = json.loads(line)
+        captured = io.StringIO()
+        try:
+            with redirect_stderr(captured):
+                result = handle(request)
+            response = {"id": request.get("id"), "ok": True, "result": result}
+        except Exception as e:
+            captured.write(traceback.format_exc())
+            response = {"id": request.get("id"), "ok": False, "error": f"{type(e).__name__}: {e}"}
+        response["stderr"] = captured.getvalue()
+        protocol.write(json.dumps(response, ensure_ascii=False, default=str) + "\n")
+        protocol.flush()
+
+
+if __name__ == "__main__":
+    main()
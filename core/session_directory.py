@@ -0,0 +1,111 @@
+# \tablebot-pipe-advanced\core\session_directory.py
+# Copyright (C) 2025 Leonid Yasin
+# This file is part of Tablebot-pipe-Advanced and is licensed under the GNU GPL v3.0.
+# See the LICENSE file for details.
+#!/usr/bin/env python3
+import os
+from core.log import get_logger
+
+logger = get_logger("session_directory")
+
+# Поля сессии, которые индексируются всегда
+BASE_FIELDS = ("user_role", "current_state")
+
+
+class SessionDirectory:
+    """Справочник сессий с вторичными индексами: поле -> значение -> chat_id.
+
+    Индексируются роль, текущее состояние и поля из SESSION_INDEX_FIELDS.
+    Обновляется инкрементально при сохранении сессии, поэтому поиск
+    «всех операторов» или «всех свободных исполнителей» — пересечение
+    готовых множеств, а не перебор всех сессий.
+    """
+
+    def __init__(self, fields=None):
+        extra = fields if fields is not None else os.getenv("SESSION_INDEX_FIELDS", "").split(",")
+        self.fields = tuple(dict.fromkeys(BASE_FIELDS + tuple(f.strip() for f in extra if f.strip())))
+        self._entries = {}                                # chat_id -> {поле: значение}
+        self._indexes = {field: {} for field in self.fields}
+        self._round_robin = 0                             # счётчик назначений бота (assign_executor)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def update(self, chat_id, data):
+        """Обновляет индексы чата по данным его сессии"""
+        new = {field: str(data[field]) for field in self.fields if data.get(field) not in (None, "")}
+        old = self._entries.get(chat_id, {})
+        if new == old:
+            return
+
+        for field in self.fields:
+            before, after = old.get(field), new.get(field)
+            if before == after:
+                continue
+            index = self._indexes[field]
+            if before is not None:
+                chats = index[before]
+                chats.discard(chat_id)
+                if not chats:
+                    del index[before]
+            if after is not None:
+                index.setdefault(after, set()).add(chat_id)
+
+        if new:
+            self._entries[chat_id] = new
+        else:
+            self._entries.pop(chat_id, None)
+
+    def remove(self, chat_id):
+        self.update(chat_id, {})
+
+    def get(self, chat_id):
+        return self._entries.get(chat_id)
+
+    def find(self, **criteria):
+        """chat_id всех сессий, у которых все поля criteria равны заданным значениям.
+
+        Поле не из индекса — ValueError: поиск перебором справочник не делает.
+        """
+        if not criteria:
+            return set(self._entries)
+
+        sets = []
+        for field, value in criteria.items():
+            index = self._indexes.get(field)
+            if index is None:
+                raise ValueError(f"Поле {field!r} не индексируется (SESSION_INDEX_FIELDS)")
+            chats = index.get(str(value))
+            if not chats:
+                return set()
+            sets.append(chats)
+
+        sets.sort(key=len)
+        result = set(sets[0])
+        for chats in sets[1:]:
+            result &= chats
+        return result
+
+    def pick_round_robin(self, candidates):
+        """Следующий по кругу из candidates: счётчик свой у каждого бота"""
+        self._round_robin += 1
+        return candidates[self._round_robin % len(candidates)]
+
+    def load(self, sessions):
+        """Заполняет справочник из пар (chat_id, data) — при старте"""
+        count = 0
+        for chat_id, data in sessions:
+            self.update(chat_id, data)
+            count += 1
+        logger.info("📇 Справочник сессий: %s сессий, индексы %s", count, ", ".join(self.fields))
+
+
+_directories = {}
+
+
+def get_session_directory(bot_id=None):
+    """Справочник сессий бота: у каждого бота процесса свои пользователи и роли"""
+    directory = _directories.get(bot_id)
+    if directory is None:
+        directory = _directories[bot_id] = SessionDirectory()
+    return directory
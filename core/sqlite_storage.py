@@ -0,0 +1,223 @@
+# \tablebot-pipe-advanced\core\sqlite_storage.py
+# Copyright (C) 2025 Leonid Yasin
+# This file is part of Tablebot-pipe-Advanced and is licensed under the GNU GPL v3.0.
+# See the LICENSE file for details.
+#!/usr/bin/env python3
+import os
+import json
+import sqlite3
+import asyncio
+import threading
+from collections import OrderedDict
+
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import BaseStorage
+from core.log import get_logger
+
+logger = get_logger("sqlite_storage")
+
+
+def _storage_key(key):
+    """Строковый ключ сессии для базы"""
+    return f"{key.bot_id}:{key.chat_id}:{key.user_id}:{key.thread_id or ''}:{key.destiny}"
+
+
+class _Session:
+    __slots__ = ("state", "data", "version")
+
+    def __init__(self, state=None, data=None):
+        self.state = state
+        self.data = data or {}
+        self.version = 0
+
+
+class SQLiteStorage(BaseStorage):
+    """FSM-хранилище aiogram на SQLite (WAL) с отложенной пакетной записью.
+
+    Горячие сессии живут в ограниченном LRU-кэше в памяти: чтение и запись
+    состояния не обращаются к диску. Изменённые сессии помечаются «грязными»
+    и раз в flush_interval секунд записываются в базу одной транзакцией
+    (а также при close()). Грязные сессии не вытесняются из кэша, пока
+    не будут записаны. На диск обращается только первое чтение «холодной» сессии.
+    """
+
+    def __init__(self, db_path, cache_size=None, flush_interval=None):
+        self.db_path = str(db_path)
+        self.cache_size = int(cache_size or os.getenv("FSM_CACHE_SIZE", "10000"))
+        self.flush_interval = float(flush_interval or os.getenv("FSM_FLUSH_INTERVAL", "1"))
+
+        self._cache = OrderedDict()   # key -> _Session, порядок — LRU
+        self._dirty = {}              # key -> версия сессии, ещё не записанная в базу
+        self._flush_task = None
+        self._flush_lock = asyncio.Lock()
+        self._db_lock = threading.Lock()
+
+        self._conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS fsm_sessions ("
+            " key TEXT PRIMARY KEY, state TEXT, data TEXT NOT NULL)"
+        )
+        self._conn.commit()
+        logger.info("🗄️ FSM-хранилище: %s (кэш %s сессий, запись раз в %s с)",
+                    self.db_path, self.cache_size, self.flush_interval)
+
+    # --- База (вызывается в отдельном потоке) ---
+
+    def _db_load(self, key):
+        with self._db_lock:
+            row = self._conn.execute(
+                "SELECT state, data FROM fsm_sessions WHERE key = ?", (key,)
+            ).fetchone()
+        if row is None:
+            return _Session()
+        return _Session(row[0], json.loads(row[1]))
+
+    def _db_write(self, upserts, deletes):
+        with self._db_lock:
+            with self._conn:
+                if upserts:
+                    self._conn.executemany(
+                        "INSERT OR REPLACE INTO fsm_sessions (key, state, data) VALUES (?, ?, ?)", upserts
+                    )
+                if deletes:
+                    self._conn.executemany("DELETE FROM fsm_sessions WHERE key = ?", deletes)
+
+    # --- Кэш ---
+
+    async def _session(self, key):
+        skey = _storage_key(key)
+        session = self._cache.get(skey)
+        if session is not None:
+            self._cache.move_to_end(skey)
+            return skey, session
+
+        loaded = await asyncio.to_thread(self._db_load, skey)
+        # Пока читали базу, сессию могли создать в кэше — она новее
+        session = self._cache.get(skey)
+        if session is None:
+            session = self._cache[skey] = loaded
+            self._evict()
+        else:
+            self._cache.move_to_end(skey)
+        return skey, session
+
+    def _evict(self):
+        """Вытесняет самые старые записанные сессии сверх лимита кэша"""
+        excess = len(self._cache) - self.cache_size
+        if excess <= 0:
+            return
+        for skey in list(self._cache):
+            if excess <= 0:
+                break
+            if skey not in self._dirty:
+                del self._cache[skey]
+                excess -= 1
+
+    def _mark_dirty(self, skey, session):
+        session.version += 1
+        self._dirty[skey] = session.version
+        if self._flush_task is None and self.flush_interval > 0:
+            self._flush_task = asyncio.create_task(self._flush_loop())
+
+    # --- Запись в базу ---
+
+    async def _flush_loop(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.error("❌ Ошибка записи FSM-сессий: %s", e)
+
+    async def flush(self):
+        """Записывает все изменённые сессии одной транзакцией"""
+        async with self._flush_lock:
+            if not self._dirty:
+                return 0
+
+            batch = dict(self._dirty)
+            upserts = []
+            deletes = []
+            for skey in batch:
+                session = self._cache[skey]
+                if session.state is None and not session.data:
+                    deletes.append((skey,))
+                else:
+                    upserts.append((skey, session.state, json.dumps(session.data, ensure_ascii=False, default=str)))
+
+            await asyncio.to_thread(self._db_write, upserts, deletes)
+
+            # Сессии, изменённые во время записи, остаются грязными до следующего раза
+            for skey, version in batch.items():
+                if self._dirty.get(skey) == version:
+                    del self._dirty[skey]
+            self._evict()
+
+            logger.debug("💾 Записано FSM-сессий: %s (удалено %s)", len(upserts), len(deletes))
+            return len(batch)
+
+    # --- BaseStorage ---
+
+    async def set_state(self, key, state=None):
+        skey, session = await self._session(key)
+        state = state.state if isinstance(state, State) else state
+        if session.state != state:
+            session.state = state
+            self._mark_dirty(skey, session)
+
+    async def get_state(self, key):
+        _, session = await self._session(key)
+        return session.state
+
+    async def set_data(self, key, data):
+        skey, session = await self._session(key)
+        session.data = data.copy()
+        self._mark_dirty(skey, session)
+
+    async def get_data(self, key):
+        _, session = await self._session(key)
+        return session.data.copy()
+
+    async def update_data(self, key, data):
+        skey, session = await self._session(key)
+        session.data.update(data)
+        self._mark_dirty(skey, session)
+        return session.data.copy()
+
+    async def apply_delta(self, key, updated, deleted=()):
+        """Применяет к данным сессии только изменённые и удалённые ключи"""
+        skey, session = await self._session(key)
+        session.data.update(updated)
+        for field in deleted:
+            session.data.pop(field, None)
+        self._mark_dirty(skey, session)
+
+    async def iter_sessions(self):
+        """Все сохранённые сессии: список (chat_id, data) — для заполнения справочника при старте"""
+        await self.flush()
+
+        def load_all():
+            with self._db_lock:
+                return self._conn.execute("SELECT key, data FROM fsm_sessions").fetchall()
+
+        sessions = []
+        for skey, data in await asyncio.to_thread(load_all):
+            # Сессии из кэша новее записанных
+            session = self._cache.get(skey)
+            sessions.append((int(skey.split(":")[1]), session.data if session else json.loads(data)))
+        return sessions
+
+    async def close(self):
+        if self._flush_task is not None:
+            self._flush_task.cancel()
+            try:
+                await self._flush_task
+            except asyncio.CancelledError:
+                pass
+            self._flush_task = None
+        await self.flush()
+        with self._db_lock:
+            self._conn.close()
+        logger.info("🗄️ FSM-хранилище закрыто")
@@ -0,0 +1,185 @@
+# \tablebot-pipe-advanced\core\table_artifact.py
+# Copyright (C) 2025 Leonid Yasin
+# This file is part of Tablebot-pipe-Advanced and is licensed under the GNU GPL v3.0.
+# See the LICENSE file for details.
+#!/usr/bin/env python3
+"""Скомпилированная таблица: артефакт рядом с исходным файлом.
+
+CSV/XLSX разбирается один раз в <таблица>.compiled — нормализованные строки,
+индекс переходов, состояния, команды меню, ошибки условий и замечания
+статической проверки (core/table_validator.py). Артефакт привязан
+к sha256 содержимого исходника и к версии формата; при следующих запусках он
+распаковывается за миллисекунды, без повторного разбора.
+
+Собрать артефакт и проверить таблицу заранее (например, при деплое):
+    python -m core.table_artifact table.xlsx --report table_report.json
+Код выхода 1 — в таблице есть ошибки (с --strict — и предупреждения).
+"""
+import os
+import sys
+import json
+import pickle
+import argparse
+import hashlib
+from dataclasses import dataclass
+from pathlib import Path
+
+from core.table_loader import load_table
+from core.table_index import TableRow, TableIndex, compile_table_index
+from core.fsm_builder import extract_states_from_table
+from core.commands_loader import extract_commands_from_rows
+from pipeline.check_guard import compile_guards
+from core.table_validator import Issue, validate_rows, check_environment, build_report, log_issues, count_issues
+from core.log import get_logger
+
+logger = get_logger("table_artifact")
+
+# Меняется при любом изменении формата артефакта или правил компиляции
+ARTIFACT_VERSION = 4
+ARTIFACT_SUFFIX = ".compiled"
+
+
+@dataclass(frozen=True)
+class CompiledTable:
+    """Результат компиляции таблицы, не зависящий от процесса"""
+    source_hash: str
+    index: TableIndex
+    states: frozenset
+    commands: tuple        # (command, description)
+    guard_errors: tuple    # (line, condition, error)
+    issues: tuple          # Issue статической проверки (без проверок окружения)
+
+    @property
+    def rows(self):
+        return self.index.rows
+
+
+def source_hash(table_path):
+    with open(table_path, "rb") as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+def artifact_path(table_path):
+    return Path(str(table_path) + ARTIFACT_SUFFIX)
+
+
+def compile_table(table_path, digest=None):
+    """Разбирает исходную таблицу и компилирует её"""
+    digest = digest or source_hash(table_path)
+    index = compile_table_index(load_table(str(table_path)))
+    # Только проверка: сообщения об ошибках пишет build_snapshot
+    guard_errors = tuple(compile_guards(index.rows, log=False))
+    return CompiledTable(
+        source_hash=digest,
+        index=index,
+        states=frozenset(extract_states_from_table(index.rows)),
+        commands=tuple((c.command, c.description) for c in extract_commands_from_rows(index.rows)),
+        guard_errors=guard_errors,
+        issues=tuple(validate_rows(index.rows, guard_errors)),
+    )
+
+
+def save_artifact(compiled, path):
+    """Атомарно записывает артефакт (только данные: объекты условий и шаблонов не сохраняются)"""
+    data = {
+        "version": ARTIFACT_VERSION,
+        "source_hash": compiled.source_hash,
+        "rows": [(row.line, dict(row)) for row in compiled.rows],
+        "index": compiled.index.parts(),
+        "states": sorted(compiled.states),
+        "commands": list(compiled.commands),
+        "guard_errors": list(compiled.guard_errors),
+        "issues": [(i.severity, i.code, i.line, i.message) for i in compiled.issues],
+    }
+    path = Path(path)
+    tmp_path = path.with_name(path.name + ".tmp")
+    with open(tmp_path, "wb") as f:
+        pickle.dump(data, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp_path, path)
+
+
+def load_artifact(path, expected_hash):
+    """Загружает артефакт; None, если его нет, он устарел или повреждён"""
+    try:
+        with open(path, "rb") as f:
+            data = pickle.load(f)
+    except FileNotFoundError:
+        return None
+    except Exception as e:
+        logger.warning("⚠️ Артефакт %s повреждён: %s", path, e)
+        return None
+
+    if data.get("version") != ARTIFACT_VERSION or data.get("source_hash") != expected_hash:
+        return None
+
+    rows = [TableRow(row, line=line) for line, row in data["rows"]]
+    return CompiledTable(
+        source_hash=expected_hash,
+        index=TableIndex.from_parts(rows, *data["index"]),
+        states=frozenset(data["states"]),
+        commands=tuple(data["commands"]),
+        guard_errors=tuple(data["guard_errors"]),
+        issues=tuple(Issue(*issue) for issue in data["issues"]),
+    )
+
+
+def load_compiled_table(table_path, use_artifact=None):
+    """Возвращает скомпилированную таблицу: из артефакта, если он актуален, иначе компилирует и сохраняет.
+
+    TABLE_ARTIFACT=0 отключает артефакт (таблица каждый раз разбирается заново).
+    """
+    if use_artifact is None:
+        use_artifact = os.getenv("TABLE_ARTIFACT", "1") != "0"
+    digest = source_hash(table_path)
+    if not use_artifact:
+        return compile_table(table_path, digest)
+
+    path = artifact_path(table_path)
+    compiled = load_artifact(path, digest)
+    if compiled is not None:
+        logger.debug("📦 Таблица из артефакта %s", path)
+        return compiled
+
+    compiled = compile_table(table_path, digest)
+    try:
+        save_artifact(compiled, path)
+        logger.info("📦 Артефакт таблицы сохранён: %s", path)
+    except OSError as e:
+        logger.warning("⚠️ Не удалось сохранить артефакт %s: %s", path, e)
+    return compiled
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Компиляция и проверка таблицы бота")
+    parser.add_argument("tables", nargs="*", default=["table.csv"], help="файлы таблиц (CSV/XLSX)")
+    parser.add_argument("--report", help="JSON-отчёт проверки (для нескольких таблиц — список)")
+    parser.add_argument("--strict", action="store_true", help="предупреждения тоже дают код выхода 1")
+    parser.add_argument("--no-artifact", action="store_true", help="только проверка, без записи .compiled")
+    args = parser.parse_args(argv)
+
+    from core.log import setup_logging, shutdown_logging
+    setup_logging("INFO")
+    reports = []
+    failed = False
+    for table_file in args.tables:
+        compiled = compile_table(table_file)
+        if not args.no_artifact:
+            save_artifact(compiled, artifact_path(table_file))
+        issues = compiled.issues + tuple(check_environment(compiled.rows))
+        log_issues(table_file, issues)
+        errors, warnings = count_issues(issues)
+        failed = failed or bool(errors) or (args.strict and bool(warnings))
+        reports.append(build_report(table_file, compiled.rows, compiled.states, issues))
+        logger.info("📦 %s: %s строк, %s состояний, %s команд, ошибок: %s, предупреждений: %s",
+                    table_file, len(compiled.rows), len(compiled.states),
+                    len(compiled.commands), errors, warnings)
+    shutdown_logging()
+
+    if args.report:
+        with open(args.report, "w", encoding="utf-8") as f:
+            json.dump(reports[0] if len(reports) == 1 else reports, f, ensure_ascii=False, indent=2)
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,161 @@
+# \tablebot-pipe-advanced\core\table_index.py
+# Copyright (C) 2025 Leonid Yasin
+# This file is part of Tablebot-pipe-Advanced and is licensed under the GNU GPL v3.0.
+# See the LICENSE file for details.
+#!/usr/bin/env python3
+from core.command_patterns import PatternMatcher, is_pattern
+from core.log import get_logger
+
+logger = get_logger("table_index")
+
+ANY_STATE = "any"
+ANY_ROLE = "any"
+WILDCARD_COMMANDS = ("<text>", "<location>")
+
+class _Wildcard:
+    """Ключ команды для строк с <text>/<location>: такие строки подходят под любой ввод"""
+
+    def __reduce__(self):
+        # При распаковке скомпилированной таблицы ключ остаётся тем же объектом
+        return "_WILDCARD"
+
+    def __repr__(self):
+        return "<wildcard>"
+
+
+_WILDCARD = _Wildcard()
+
+
+class TableRow(dict):
+    """Строка таблицы: обычный dict + номер строки в исходном файле"""
+
+    def __init__(self, data, line=0):
+        super().__init__(data)
+        self.line = line
+
+
+class TableIndex:
+    """Скомпилированный индекс переходов таблицы.
+
+    Строки раскладываются по ключу (from_state, command, role) один раз при загрузке.
+    Для каждого ключа хранится позиция первой строки в порядке таблицы, поэтому
+    поиск — это несколько обращений к dict, независимо от размера таблицы.
+    Шаблонные команды (core/command_patterns.py) собираются в один PatternMatcher
+    на (from_state, role) — плюс один fullmatch на состояние.
+    """
+
+    def __init__(self, rows):
+        self.rows = tuple(
+            row if isinstance(row, TableRow) else TableRow(row, line=i + 2)
+            for i, row in enumerate(rows)
+        )
+        # (from_state, command_key, role_key) -> позиция первой подходящей строки
+        self._by_role = {}
+        # (from_state, command_key) -> позиция первой строки без учёта роли
+        self._any_role = {}
+        # Точные команды таблицы (без <text>/<location> и шаблонов)
+        commands = set()
+        # (from_state, role_key или None — любая роль) -> [(позиция, шаблон)]
+        patterns = {}
+
+        for pos, row in enumerate(self.rows):
+            from_state = (row.get("from_state") or "").strip()
+            command = (row.get("command") or "").strip()
+            role = (row.get("role") or "").strip()
+
+            # Строки с пустыми обязательными полями никогда не совпадают
+            if not from_state or not command:
+                continue
+
+            role_key = role if role and role != ANY_ROLE else ANY_ROLE
+            if is_pattern(command):
+                patterns.setdefault((from_state, role_key), []).append((pos, command))
+                patterns.setdefault((from_state, None), []).append((pos, command))
+                continue
+
+            command_key = _WILDCARD if command in WILDCARD_COMMANDS else command
+            if command_key is not _WILDCARD:
+                commands.add(command)
+
+            # setdefault сохраняет первую строку: "первая в таблице побеждает"
+            self._by_role.setdefault((from_state, command_key, role_key), pos)
+            self._any_role.setdefault((from_state, command_key), pos)
+
+        self.commands = frozenset(commands)
+        self._patterns = {key: PatternMatcher(entries) for key, entries in patterns.items()}
+
+        logger.debug("🗂️ Индекс построен: %s строк, %s ключей, %s шаблонных", len(self.rows), len(self._by_role), len(self._patterns))
+
+    @classmethod
+    def from_parts(cls, rows, by_role, any_role, commands, patterns=None):
+        """Восстанавливает индекс из готовых частей (скомпилированная таблица)"""
+        index = cls.__new__(cls)
+        index.rows = tuple(rows)
+        index._by_role = by_role
+        index._any_role = any_role
+        index.commands = frozenset(commands)
+        index._patterns = patterns or {}
+        return index
+
+    def parts(self):
+        """Части индекса для сохранения: (by_role, any_role, commands, patterns)"""
+        return self._by_role, self._any_role, self.commands, self._patterns
+
+    def __len__(self):
+        return len(self.rows)
+
+    def is_command(self, user_input):
+        """True, если ввод совпадает с точной командой таблицы (кнопка, /команда)"""
+        return user_input in self.commands
+
+    def match(self, current_state, user_input, user_role=None):
+        """Позиция первой подходящей строки и захваты шаблона (dict или None); None — нет строки"""
+        states = (current_state, ANY_STATE) if current_state != ANY_STATE else (ANY_STATE,)
+        commands = (user_input, _WILDCARD)
+
+        best = None
+        if user_role:
+            roles = (user_role, ANY_ROLE) if user_role != ANY_ROLE else (ANY_ROLE,)
+            for state in states:
+                for command in commands:
+                    for role in roles:
+                        pos = self._by_role.get((state, command, role))
+                        if pos is not None and (best is None or pos < best):
+                            best = pos
+        else:
+            # Роль пользователя неизвестна — подходят строки с любой ролью
+            roles = (None,)
+            for state in states:
+                for command in commands:
+                    pos = self._any_role.get((state, command))
+                    if pos is not None and (best is None or pos < best):
+                        best = pos
+
+        captures = None
+        # Шаблоны применяются к тексту: геолокация совпадает только с <location>
+        if self._patterns and user_input != "<location>":
+            for state in states:
+                for role in roles:
+                    matcher = self._patterns.get((state, role))
+                    if matcher is None:
+                        continue
+                    found = matcher.match(user_input)
+                    if found is not None and (best is None or found[0] < best):
+                        best, captures = found
+
+        return (best, captures) if best is not None else None
+
+    def lookup(self, current_state, user_input, user_role=None):
+        """Возвращает позицию первой подходящей строки или None"""
+        found = self.match(current_state, user_input, user_role)
+        return found[0] if found is not None else None
+
+    def find(self, current_state, user_input, user_role=None):
+        """Возвращает первую подходящую строку таблицы или None"""
+        pos = self.lookup(current_state, user_input, user_role)
+        return self.rows[pos] if pos is not None else None
+
+
+def compile_table_index(rows):
+    """Компилирует строки таблицы в индекс переходов"""
+    return TableIndex(rows)
@@ -2,20 +2,30 @@
 # This file is part of Tablebot-pipe-Advanced and is licensed under the GNU GPL v3.0.
 # See the LICENSE file for details.
 #!/usr/bin/env python3
+import os
 import csv
-import sys  # ← ДОБАВИТЬ
 from pathlib import Path
+from itertools import repeat
+from concurrent.futures import ProcessPoolExecutor
+from core.table_index import TableRow
+from core.log import get_logger
+
+logger = get_logger("table_loader")
 
 def load_table(file_path):
     """Загружает таблицу из CSV или XLSX файла"""
     path = Path(file_path)
     
-    if path.suffix.lower() in ['.xlsx', '.xls']:
+    if path.suffix.lower() == '.xls':
+        # openpyxl читает только .xlsx; старый двоичный формат дал бы невнятную ошибку разбора
+        logger.error("❌ Формат .xls не поддерживается: %s", file_path)
+        raise ValueError(f"Формат .xls не поддерживается — сохраните {path.name} как .xlsx или .csv")
+    if path.suffix.lower() == '.xlsx':
         return load_excel_table(file_path)
     elif path.suffix.lower() == '.csv':
         return load_csv_table(file_path)
     else:
-        print(f"[table_loader] ❌ Неподдерживаемый формат: {path.suffix}", file=sys.stderr)
+        logger.error("❌ Неподдерживаемый формат: %s", path.suffix)
         raise ValueError(f"Неподдерживаемый формат: {path.suffix}")
 
 def load_csv_table(file_path):
@@ -23,41 +33,102 @@ def load_csv_table(file_path):
     try:
         with open(file_path, encoding="utf-8") as f:
             rows = list(csv.DictReader(f))
-        
-        # Проверка на возможные дублирования
-        state_transitions = {}
-        for i, row in enumerate(rows):
-            key = (row.get("from_state", ""), row.get("command", ""), row.get("role", ""))
-            if key in state_transitions:
-                print(f"[table_loader] ⚠️  Возможное дублирование: строки {state_transitions[key] + 2} и {i + 2} имеют одинаковые from_state, command, role", file=sys.stderr)
-            state_transitions[key] = i
-        
-        print(f"[table_loader] 📄 Загружен CSV: {len(rows)} строк", file=sys.stderr)
+        # Дубликаты и прочие ошибки таблицы ищет core/table_validator.py при компиляции
+        logger.debug("📄 Загружен CSV: %s строк", len(rows))
         return rows
     except Exception as e:
-        print(f"[table_loader] ❌ Ошибка загрузки CSV: {e}", file=sys.stderr)
+        logger.error("❌ Ошибка загрузки CSV: %s", e)
         raise Exception(f"Ошибка загрузки CSV: {e}")
 
-def load_excel_table(file_path):
-    """Загружает Excel таблицу"""
+# Обрезаются ключевые и разбираемые колонки (ключ строки, условия, действия, пути);
+# тексты сообщений остаются как есть — так же, как в CSV
+STRIPPED_COLUMNS = frozenset((
+    "from_state", "command", "role", "to_state",
+    "condition", "result_action", "integrations", "media_file",
+))
+
+def _cell_text(value, strip=True):
+    """Значение ячейки как строка таблицы: пустая ячейка — "", остальное — str (strip — без пробелов по краям)"""
+    if value is None:
+        return ""
+    return str(value).strip() if strip else str(value)
+
+def _open_workbook(file_path):
     try:
-        import pandas as pd
-        df = pd.read_excel(file_path)
-        rows = df.to_dict('records')
-        
-        # Конвертируем все значения в строки
-        for row in rows:
-            for key in row:
-                if pd.isna(row[key]):
-                    row[key] = ""
-                else:
-                    row[key] = str(row[key]).strip()
-        
-        print(f"[table_loader] 📊 Загружен Excel: {len(rows)} строк", file=sys.stderr)
-        return rows
+        from openpyxl import load_workbook
     except ImportError:
-        print("[table_loader] ❌ Для работы с Excel установите: pip install pandas openpyxl", file=sys.stderr)
-        raise Exception("Для работы с Excel установите: pip install pandas openpyxl")
+        logger.error("❌ Для работы с Excel установите: pip install openpyxl")
+        raise Exception("Для работы с Excel установите: pip install openpyxl")
+    # read_only — потоковое чтение листа, data_only — значения формул вместо самих формул
+    return load_workbook(file_path, read_only=True, data_only=True)
+
+def excel_sheet_names(file_path):
+    """Листы книги, похожие на таблицу переходов (в заголовке есть from_state), в порядке книги"""
+    workbook = _open_workbook(file_path)
+    try:
+        names = []
+        for sheet in workbook.worksheets:
+            header = next(sheet.iter_rows(max_row=1, values_only=True), ())
+            if "from_state" in (_cell_text(value) for value in header):
+                names.append(sheet.title)
+        return names
+    finally:
+        workbook.close()
+
+def iter_excel_rows(file_path, sheet=None, qualify_lines=False):
+    """Лениво читает лист (по умолчанию первый) строка за строкой.
+
+    Ячейки нормализуются за один проход; в памяти — только текущая строка.
+    Пустые строки пропускаются, номер строки — как в Excel
+    (с qualify_lines — "Лист!номер", для книг из нескольких листов).
+    """
+    workbook = _open_workbook(file_path)
+    try:
+        worksheet = workbook[sheet] if sheet else workbook.worksheets[0]
+        rows = worksheet.iter_rows(values_only=True)
+        header = [_cell_text(value) for value in next(rows, ())]
+        # Колонки без заголовка не попадают в строки таблицы
+        columns = [(i, name, name in STRIPPED_COLUMNS) for i, name in enumerate(header) if name]
+
+        for number, values in enumerate(rows, start=2):
+            row = {name: _cell_text(values[i], strip) if i < len(values) else "" for i, name, strip in columns}
+            if not any(value.strip() for value in row.values()):
+                continue
+            line = f"{worksheet.title}!{number}" if qualify_lines else number
+            yield TableRow(row, line=line)
+    finally:
+        workbook.close()
+
+def _load_sheet(file_path, sheet, qualify_lines):
+    # Функция модуля: выполняется и в процессах пула
+    return list(iter_excel_rows(file_path, sheet, qualify_lines))
+
+def load_excel_table(file_path, sheets=None, workers=None):
+    """Загружает Excel таблицу.
+
+    Книга может хранить каждый процесс на отдельном листе: загружаются все листы
+    с колонкой from_state (или перечисленные в sheets), строки склеиваются в
+    порядке листов — правило «первая строка побеждает» действует по этому порядку.
+    Если таких листов нет — загружается первый лист.
+
+    TABLE_SHEET_WORKERS > 1 разбирает листы параллельно в отдельных процессах.
+    """
+    try:
+        if sheets is None:
+            sheets = excel_sheet_names(file_path) or [None]
+        if workers is None:
+            workers = int(os.getenv("TABLE_SHEET_WORKERS", "1"))
+        qualify_lines = len(sheets) > 1
+
+        if workers > 1 and len(sheets) > 1:
+            with ProcessPoolExecutor(max_workers=min(workers, len(sheets))) as pool:
+                parts = list(pool.map(_load_sheet, repeat(file_path), sheets, repeat(qualify_lines)))
+        else:
+            parts = [_load_sheet(file_path, sheet, qualify_lines) for sheet in sheets]
+
+        rows = [row for part in parts for row in part]
+        logger.debug("📊 Загружен Excel: %s строк, листы: %s", len(rows), ", ".join(map(str, sheets)))
+        return rows
     except Exception as e:
-        print(f"[table_loader] ❌ Ошибка загрузки Excel: {e}", file=sys.stderr)
-        raise Exception(f"Ошибка загрузки Excel: {e}")
\ No newline at end of file
+        logger.error("❌ Ошибка загрузки Excel: %s", e)
+        raise Exception(f"Ошибка загрузки Excel: {e}")
@@ -0,0 +1,165 @@
+# \tablebot-pipe-advanced\core\table_reloader.py
+# Copyright (C) 2025 Leonid Yasin
+# This file is part of Tablebot-pipe-Advanced and is licensed under the GNU GPL v3.0.
+# See the LICENSE file for details.
+#!/usr/bin/env python3
+import os
+import asyncio
+import threading
+from dataclasses import dataclass
+from pathlib import Path
+
+from aiogram import types
+
+from core.table_artifact import load_compiled_table
+from core.table_validator import check_environment, log_issues, check_strict
+from core.fsm_builder import create_fsm_from_states
+from pipeline.check_guard import compile_guards
+from pipeline.template import compile_row_templates
+from pipeline.response_plan import compile_response_plans
+from core.log import get_logger
+
+logger = get_logger("table_reloader")
+
+
+@dataclass(frozen=True)
+class TableSnapshot:
+    """Неизменяемый снимок скомпилированной таблицы.
+
+    Обработчик берёт снимок один раз в начале обработки апдейта и работает с ним
+    до конца, даже если в это время таблица была перезагружена.
+    """
+    path: str
+    mtime: int
+    version: int
+    rows: tuple
+    index: object
+    states: frozenset
+    fsm: type
+    commands: tuple
+    guard_errors: tuple
+    issues: tuple
+
+
+def build_snapshot(table_path, version=1, strict=None):
+    """Загружает и компилирует таблицу в новый снимок.
+
+    Замечания проверки таблицы пишутся в лог один раз здесь; с TABLE_STRICT=1
+    ошибки таблицы прерывают сборку (TableValidationError).
+    """
+    path = Path(table_path)
+    mtime_before = path.stat().st_mtime_ns
+
+    # Разбор исходника — только если нет актуального артефакта (core/table_artifact.py)
+    compiled = load_compiled_table(path)
+    index = compiled.index
+    # Замечания: из артефакта и проверки окружения (файлы media_file, интеграции)
+    issues = compiled.issues + tuple(check_environment(index.rows))
+    log_issues(table_path, issues)
+    check_strict(table_path, issues, strict)
+
+    # Объекты процесса: предикаты условий, шаблоны, планы ответа, FSM.
+    # Ошибки условий уже в замечаниях — повторно не логируем
+    compile_guards(index.rows, log=False)
+    compile_row_templates(index.rows)
+    compile_response_plans(index.rows)
+    states = compiled.states
+    fsm = create_fsm_from_states(states)
+    commands = tuple(types.BotCommand(command=command, description=description) for command, description in compiled.commands)
+
+    # Если файл поменялся во время чтения — могли прочитать половину записи
+    if path.stat().st_mtime_ns != mtime_before:
+        raise RuntimeError(f"Таблица {table_path} изменилась во время загрузки")
+
+    return TableSnapshot(
+        path=str(path),
+        mtime=mtime_before,
+        version=version,
+        rows=index.rows,
+        index=index,
+        states=states,
+        fsm=fsm,
+        commands=commands,
+        guard_errors=compiled.guard_errors,
+        issues=issues,
+    )
+
+
+class TableReloader:
+    """Следит за файлом таблицы и атомарно подменяет скомпилированный снимок.
+
+    Перекомпиляция идёт в фоновом потоке; замена — одно присваивание ссылки,
+    поэтому обработчики никогда не видят наполовину разобранную таблицу.
+    """
+
+    def __init__(self, table_path, interval=None, on_reload=None):
+        self.table_path = str(table_path)
+        self.interval = interval if interval is not None else float(os.getenv("TABLE_RELOAD_INTERVAL", "2"))
+        self.on_reload = on_reload  # async callback(snapshot), вызывается в event loop
+        self._snapshot = build_snapshot(self.table_path)
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self._loop = None
+
+    @property
+    def snapshot(self):
+        return self._snapshot
+
+    def start(self, loop=None):
+        """Запускает фоновый поток опроса mtime"""
+        if self._thread or self.interval <= 0:
+            return
+        self._loop = loop or asyncio.get_running_loop()
+        self._thread = threading.Thread(target=self._watch, name="table-reloader", daemon=True)
+        self._thread.start()
+        logger.info("👀 Слежение за %s (каждые %s с)", self.table_path, self.interval)
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout=self.interval + 1)
+            self._thread = None
+
+    def reload(self, force=False):
+        """Перекомпилирует таблицу, если файл изменился. Возвращает новый снимок или None"""
+        with self._lock:
+            current = self._snapshot
+            try:
+                mtime = Path(self.table_path).stat().st_mtime_ns
+            except OSError as e:
+                logger.error("❌ Таблица недоступна: %s", e)
+                return None
+            if not force and mtime == current.mtime:
+                return None
+
+            try:
+                snapshot = build_snapshot(self.table_path, version=current.version + 1)
+            except Exception as e:
+                # Оставляем старый снимок: битая или недописанная таблица не должна ронять бота
+                logger.error("❌ Ошибка перезагрузки, остаётся версия %s: %s", current.version, e)
+                return None
+
+            self._snapshot = snapshot
+        logger.info("✅ Таблица перезагружена: версия %s, %s строк", snapshot.version, len(snapshot.rows))
+        return snapshot
+
+    def _watch(self):
+        seen_mtime = self._snapshot.mtime
+        failed_mtime = None     # версия файла, которую собрать не удалось: ждём следующего изменения
+        while not self._stop.wait(self.interval):
+            try:
+                mtime = Path(self.table_path).stat().st_mtime_ns
+            except OSError:
+                continue
+            # Перекомпилируем только когда файл не менялся целый интервал — запись завершена
+            if mtime == self._snapshot.mtime or mtime != seen_mtime:
+                seen_mtime = mtime
+                continue
+            if mtime == failed_mtime:
+                continue
+            snapshot = self.reload()
+            if snapshot is None and self._snapshot.mtime != mtime:
+                failed_mtime = mtime
+            if snapshot and self.on_reload and self._loop:
+                asyncio.run_coroutine_threadsafe(self.on_reload(snapshot), self._loop)
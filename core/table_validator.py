@@ -0,0 +1,259 @@
+# \tablebot-pipe-advanced\core\table_validator.py
+# Copyright (C) 2025 Leonid Yasin
+# This file is part of Tablebot-pipe-Advanced and is licensed under the GNU GPL v3.0.
+# See the LICENSE file for details.
+#!/usr/bin/env python3
+"""Статическая проверка таблицы при компиляции.
+
+Все проверки — один-два линейных прохода по строкам со словарями и
+множествами, поэтому на обработку сообщений диагностика не переносится:
+
+    duplicate_key       строка перекрыта более ранней с тем же (from_state, command, role)
+    empty_key           строка без from_state или command никогда не совпадёт
+    dangling_to_state   to_state, из которого нет ни одной строки
+    unreachable_state   состояние не достижимо из start
+    no_start            нет строк из start (и any) — бот молчит после /start
+    bad_command         шаблонная команда (re:, range: ...) не разбирается
+    bad_condition       условие не разбирается (переход всегда блокируется)
+    bad_action          неизвестное или неверно записанное действие result_action
+    save_before_set     save: подставляет поле, которое та же цепочка result_action
+                        заполняет позже (шаблон заполняется один раз — в момент save:)
+    bad_integration     http:-интеграция не разбирается
+    missing_media       локальный media_file не найден
+    unknown_integration http:@имя нет в файле интеграций
+
+Последние две проверки зависят от окружения (файлы рядом с ботом), поэтому
+выполняются при каждой сборке снимка, а не хранятся в артефакте таблицы.
+"""
+import os
+from dataclasses import dataclass, asdict
+from pathlib import Path
+
+from core.table_index import ANY_STATE, ANY_ROLE, WILDCARD_COMMANDS
+from core.command_patterns import is_pattern, pattern_error
+from pipeline.execute_effect import action_error, action_outputs
+from pipeline.template import compile_template
+from core.log import get_logger
+
+logger = get_logger("table_validator")
+
+START_STATE = "start"
+ERROR = "error"
+WARNING = "warning"
+
+# Сколько замечаний каждого уровня выводить в лог; полный список — в JSON-отчёте
+LOG_LIMIT = 20
+
+
+class TableValidationError(ValueError):
+    """Таблица содержит ошибки, а запуск требует чистой таблицы (TABLE_STRICT=1)"""
+
+
+@dataclass(frozen=True)
+class Issue:
+    severity: str   # error | warning
+    code: str
+    line: object    # номер строки (или "Лист!N") первой затронутой строки
+    message: str
+
+    def to_dict(self):
+        return asdict(self)
+
+
+def _cell(row, name):
+    value = (row.get(name) or "").strip()
+    return "" if value == "—" else value
+
+
+def validate_rows(rows, guard_errors=()):
+    """Проверки, зависящие только от содержимого таблицы. Возвращает список Issue"""
+    issues = []
+    first_by_key = {}
+    from_states = {}        # состояние -> строка первого перехода из него
+    targets = {}            # to_state -> (строка, число ссылок)
+    edges = {}              # from_state -> множество to_state
+    action_errors = {}      # result_action -> ошибки (одинаковые ячейки проверяются один раз)
+    integration_errors = {}
+
+    for row in rows:
+        line = row.line
+        # Ключ — как в TableIndex, чтобы замечания совпадали с тем, что найдёт find_row
+        from_state = (row.get("from_state") or "").strip()
+        command = (row.get("command") or "").strip()
+        to_state = _cell(row, "to_state")
+
+        if not from_state or not command:
+            if any(_cell(row, name) for name in ("from_state", "command", "to_state", "message_text")):
+                issues.append(Issue(WARNING, "empty_key", line, "Нет from_state или command — строка никогда не совпадёт"))
+        else:
+            role = (row.get("role") or "").strip() or ANY_ROLE
+            key = (from_state, "<wildcard>" if command in WILDCARD_COMMANDS else command, role)
+            first = first_by_key.setdefault(key, line)
+            if first != line:
+                issues.append(Issue(WARNING, "duplicate_key", line,
+                                    f"Перекрыта строкой {first}: тот же from_state={from_state!r}, "
+                                    f"command={command!r}, role={role!r}"))
+            if is_pattern(command):
+                error = pattern_error(command)
+                if error:
+                    issues.append(Issue(ERROR, "bad_command", line, error))
+            from_states.setdefault(from_state, line)
+            if to_state:
+                edges.setdefault(from_state, set()).add(to_state)
+
+        if to_state:
+            target_line, count = targets.get(to_state, (line, 0))
+            targets[to_state] = (target_line, count + 1)
+
+        result_action = _cell(row, "result_action")
+        if result_action:
+            errors = action_errors.get(result_action)
+            if errors is None:
+                errors = action_errors[result_action] = _action_issues(
+                    [a.strip() for a in result_action.split("|") if a.strip()]
+                )
+            issues.extend(Issue(severity, code, line, message) for severity, code, message in errors)
+
+        integration = _cell(row, "integrations")
+        if integration.startswith("http:") and not integration.startswith("http:@"):
+            if integration not in integration_errors:
+                integration_errors[integration] = _integration_error(integration)
+            if integration_errors[integration]:
+                issues.append(Issue(ERROR, "bad_integration", line, integration_errors[integration]))
+
+    issues.extend(Issue(ERROR, "bad_condition", line, f"{condition!r}: {error}")
+                  for line, condition, error in guard_errors)
+
+    # Тупиковое состояние: дальше — только строки any и /start (он сбрасывает состояние всегда)
+    issues.extend(Issue(WARNING, "dangling_to_state", line, f"Из состояния {state!r} нет переходов (ссылок: {count})")
+                  for state, (line, count) in targets.items()
+                  if state not in from_states and state != ANY_STATE)
+
+    issues.extend(_reachability(from_states, edges))
+    return issues
+
+
+def _action_issues(actions):
+    """(уровень, код, текст) для одной цепочки result_action"""
+    issues = [(ERROR, "bad_action", error) for error in map(action_error, actions) if error]
+    for i, action in enumerate(actions):
+        if not action.startswith("save:"):
+            continue
+        _, _, template = action[len("save:"):].partition(":")
+        earlier = {field for a in actions[:i] for field in action_outputs(a)}
+        later = {field for a in actions[i + 1:] for field in action_outputs(a)}
+        for field in dict.fromkeys(compile_template(template).fields):
+            if field in later and field not in earlier:
+                issues.append((WARNING, "save_before_set", f"{action!r}: поле {field!r} заполняется позже "
+                                                           f"в той же цепочке — перенесите save: после него"))
+    return issues
+
+
+def _integration_error(integration):
+    from core.integrations import parse_integration
+    try:
+        parse_integration(integration)
+    except ValueError as e:
+        return str(e)
+    return None
+
+
+def _reachability(from_states, edges):
+    """Состояния, в которые нельзя попасть из start (обход графа переходов)"""
+    if not from_states:
+        return []
+    if START_STATE not in from_states and ANY_STATE not in from_states:
+        return [Issue(ERROR, "no_start", None, f"Нет строк из состояния {START_STATE!r} — бот не ответит после /start")]
+
+    # Переходы строк any доступны из любого состояния
+    reachable = {START_STATE, ANY_STATE}
+    queue = [START_STATE, *edges.get(ANY_STATE, ())]
+    reachable.update(queue)
+    while queue:
+        state = queue.pop()
+        for target in edges.get(state, ()):
+            if target not in reachable:
+                reachable.add(target)
+                queue.append(target)
+
+    return [Issue(WARNING, "unreachable_state", line, f"Состояние {state!r} недостижимо из {START_STATE!r}")
+            for state, line in from_states.items() if state not in reachable]
+
+
+def check_environment(rows, base_dir=None, integrations=None):
+    """Проверки, зависящие от окружения: media_file на диске и именованные интеграции.
+
+    base_dir — откуда бот открывает относительные пути (по умолчанию текущий каталог);
+    integrations — имена из файла интеграций (по умолчанию читается INTEGRATIONS_FILE).
+    """
+    base = Path(base_dir or os.getcwd())
+    media = {}
+    named = {}
+    for row in rows:
+        media_file = _cell(row, "media_file")
+        if media_file and not media_file.startswith(("http://", "https://")):
+            line, count = media.get(media_file, (row.line, 0))
+            media[media_file] = (line, count + 1)
+        integration = _cell(row, "integrations")
+        if integration.startswith("http:@"):
+            named.setdefault(integration[len("http:@"):].strip(), row.line)
+
+    issues = [Issue(ERROR, "missing_media", line, f"Файл {media_file!r} не найден (строк: {count})")
+              for media_file, (line, count) in media.items() if not (base / media_file).exists()]
+
+    if named:
+        if integrations is None:
+            from core.integrations import load_integrations_file
+            try:
+                integrations = load_integrations_file(os.getenv("INTEGRATIONS_FILE", "integrations.json"))
+            except (OSError, ValueError):
+                integrations = {}
+        issues.extend(Issue(ERROR, "unknown_integration", line, f"Интеграции @{name} нет в файле интеграций")
+                      for name, line in named.items() if name not in integrations)
+    return issues
+
+
+def count_issues(issues):
+    errors = sum(1 for issue in issues if issue.severity == ERROR)
+    return errors, len(issues) - errors
+
+
+def build_report(table_path, rows, states, issues):
+    """Машиночитаемый отчёт проверки"""
+    errors, warnings = count_issues(issues)
+    return {
+        "table": str(table_path),
+        "rows": len(rows),
+        "states": len(states),
+        "errors": errors,
+        "warnings": warnings,
+        "issues": [issue.to_dict() for issue in issues],
+    }
+
+
+def log_issues(table_path, issues):
+    """Пишет замечания в лог (не больше LOG_LIMIT каждого уровня) и итог"""
+    errors, warnings = count_issues(issues)
+    if not issues:
+        logger.debug("🧪 %s: замечаний нет", table_path)
+        return
+    shown = {ERROR: 0, WARNING: 0}
+    for issue in issues:
+        shown[issue.severity] += 1
+        if shown[issue.severity] > LOG_LIMIT:
+            continue
+        log = logger.error if issue.severity == ERROR else logger.warning
+        log("%s Строка %s [%s]: %s", "❌" if issue.severity == ERROR else "⚠️",
+            issue.line if issue.line is not None else "—", issue.code, issue.message)
+    logger.warning("🧪 %s: ошибок %s, предупреждений %s%s", table_path, errors, warnings,
+                   f" (в лог выведено по {LOG_LIMIT}, полный отчёт: python -m core.table_artifact --report)"
+                   if max(errors, warnings) > LOG_LIMIT else "")
+
+
+def check_strict(table_path, issues, strict=None):
+    """TABLE_STRICT=1: ошибки таблицы не дают собрать снимок (бот не запускается, перезагрузка отменяется)"""
+    if strict is None:
+        strict = os.getenv("TABLE_STRICT", "0") == "1"
+    errors, _ = count_issues(issues)
+    if strict and errors:
+        raise TableValidationError(f"Таблица {table_path}: ошибок {errors} (TABLE_STRICT=1)")
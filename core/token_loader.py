@@ -3,14 +3,16 @@
 # See the LICENSE file for details.
 #!/usr/bin/env python3
 import os
-import sys  # ← ДОБАВИТЬ ЭТО
 from pathlib import Path
+from core.log import get_logger
+
+logger = get_logger("token_loader")
 
 def load_bot_token():
     """Загружает токен бота из переменных окружения или файлов"""
     token = os.getenv("BOT_TOKEN")
     if token:
-        print("[core] 🗝️ Токен из переменной окружения", file=sys.stderr)
+        logger.debug("🗝️ Токен из переменной окружения")
         return token.strip()
 
     # Проверяем .env файл
@@ -21,7 +23,7 @@ def load_bot_token():
             if line.startswith("BOT_TOKEN="):
                 value = line.split("=", 1)[1].strip().strip('"\'')
                 if value:
-                    print("[core] 🗝️ Токен из .env", file=sys.stderr)
+                    logger.debug("🗝️ Токен из .env")
                     return value
 
     # Проверяем token.env
@@ -29,7 +31,7 @@ def load_bot_token():
     if token_file.exists():
         raw = token_file.read_text(encoding="utf-8").strip()
         if raw:
-            print("[core] 🗝️ Токен из token.env", file=sys.stderr)
+            logger.debug("🗝️ Токен из token.env")
             return raw
 
     return None
\ No newline at end of file
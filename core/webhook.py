@@ -0,0 +1,106 @@
+# \tablebot-pipe-advanced\core\webhook.py
+# Copyright (C) 2025 Leonid Yasin
+# This file is part of Tablebot-pipe-Advanced and is licensed under the GNU GPL v3.0.
+# See the LICENSE file for details.
+#!/usr/bin/env python3
+import os
+import asyncio
+import secrets
+from dataclasses import dataclass
+
+from aiohttp import web
+from aiogram.webhook.aiohttp_server import SimpleRequestHandler, setup_application
+from core.log import get_logger
+
+logger = get_logger("webhook")
+
+
+@dataclass(frozen=True)
+class WebhookConfig:
+    """Параметры webhook-режима"""
+    url: str = None          # публичный адрес (без path); None — webhook не регистрируется
+    path: str = "/webhook"
+    host: str = "0.0.0.0"
+    port: int = 8080
+    secret: str = None       # X-Telegram-Bot-Api-Secret-Token
+    drop_pending: bool = False
+
+
+def webhook_config_from_env():
+    """Читает параметры webhook из переменных окружения.
+
+    WEBHOOK_URL    — публичный адрес бота, например https://bot.example.com
+    WEBHOOK_PATH   — путь обработчика (по умолчанию /webhook)
+    WEBHOOK_HOST / WEBHOOK_PORT — где слушает aiohttp (по умолчанию 0.0.0.0:8080)
+    WEBHOOK_SECRET — секрет для проверки запросов; если задан WEBHOOK_URL,
+                     а секрет нет — генерируется при запуске
+    WEBHOOK_DROP_PENDING — 1: отбросить накопившиеся апдейты при регистрации
+    """
+    url = os.getenv("WEBHOOK_URL") or None
+    secret = os.getenv("WEBHOOK_SECRET") or None
+    if url and not secret:
+        secret = secrets.token_urlsafe(32)
+    return WebhookConfig(
+        url=url.rstrip("/") if url else None,
+        path=os.getenv("WEBHOOK_PATH", "/webhook"),
+        host=os.getenv("WEBHOOK_HOST", "0.0.0.0"),
+        port=int(os.getenv("WEBHOOK_PORT", "8080")),
+        secret=secret,
+        drop_pending=os.getenv("WEBHOOK_DROP_PENDING", "0") == "1",
+    )
+
+
+def create_webhook_app(bots, config):
+    """Собирает aiohttp-приложение для ботов процесса.
+
+    bots — список (dp, bot, path): у каждого бота свой путь обработчика,
+    регистрация webhook при старте и снятие при остановке.
+    """
+    app = web.Application()
+
+    def register(bot, path):
+        async def on_startup(app):
+            if config.url:
+                await bot.set_webhook(
+                    config.url + path,
+                    secret_token=config.secret,
+                    drop_pending_updates=config.drop_pending,
+                )
+                logger.info("🌐 Webhook зарегистрирован: %s%s", config.url, path)
+            else:
+                logger.warning("⚠️ WEBHOOK_URL не задан — webhook %s не регистрируется (локальный режим)", path)
+
+        async def on_shutdown(app):
+            if config.url:
+                try:
+                    await bot.delete_webhook()
+                    logger.info("🌐 Webhook %s снят", path)
+                except Exception as e:
+                    logger.error("❌ Не удалось снять webhook %s: %s", path, e)
+
+        app.on_startup.append(on_startup)
+        app.on_shutdown.append(on_shutdown)
+
+    # Снятие webhook всех ботов должно пройти до закрытия сессий обработчиками
+    for dp, bot, path in bots:
+        register(bot, path)
+
+    # Апдейты обрабатываются в фоне: Telegram получает ответ сразу, апдейты идут параллельно
+    for dp, bot, path in bots:
+        SimpleRequestHandler(dp, bot, handle_in_background=True, secret_token=config.secret).register(app, path=path)
+        setup_application(app, dp, bot=bot)
+    return app
+
+
+async def run_webhook(bots, config, stop=None):
+    """Запускает aiohttp-сервер и работает до события stop (или отмены задачи)"""
+    runner = web.AppRunner(create_webhook_app(bots, config))
+    await runner.setup()
+    try:
+        await web.TCPSite(runner, config.host, config.port).start()
+        logger.info("🚀 Webhook-сервер слушает %s:%s (%s)", config.host, config.port,
+                    ", ".join(path for _, _, path in bots))
+        await (stop or asyncio.Event()).wait()
+        logger.info("🛑 Остановка по запросу пользователя...")
+    finally:
+        await runner.cleanup()
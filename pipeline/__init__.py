@@ -2,20 +2,22 @@
 # This file is part of Tablebot-pipe-Advanced and is licensed under the GNU GPL v3.0.
 # See the LICENSE file for details.
 
-from .find_row import find_row
+from .find_row import find_row, match_row
 from .check_guard import check_guard
 from .execute_effect import execute_effect
 from .build_message import build_message_content
-from .prepare_integration import prepare_integration
+from .prepare_integration import prepare_integration, run_integration
 from .determine_transition import determine_transition
 from .format_notification import format_notification
 
 __all__ = [
     'find_row',
+    'match_row',
     'check_guard', 
     'execute_effect',
     'build_message_content',
     'prepare_integration',
+    'run_integration',
     'determine_transition',
     'format_notification'
 ]
\ No newline at end of file
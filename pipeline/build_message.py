@@ -3,174 +3,94 @@
 # This file is part of Tablebot-pipe-Advanced and is licensed under the GNU GPL v3.0.
 # See the LICENSE file for details.
 #!/usr/bin/env python3
-import sys
-from .format_notification import format_notification
+from .template import escaper_for
+from .response_plan import compile_response_plan
+from core.log import get_logger
+
+logger = get_logger("build_message")
+
+def render_progress(progress, payload):
+    """Строит текст прогресса по разобранному progress_config"""
+    progress_text = ""
+    total_steps = 0
+    bar_length = 8 # Длина визуального прогресс-бара по умолчанию
+
+    for part in progress:
+        kind = part[0]
+        if kind == "disabled":
+            return "" # Отключаем прогресс для этой строки
+        elif kind == "manual":
+            # Формат: manual:current/total
+            _, current_step, total_steps = part
+            progress_text += f"[Шаг {current_step}/{total_steps}] "
+        elif kind == "track":
+            # Формат: track:field_name — отображаем значение поля
+            field_name = part[1]
+            current_val = payload.get(field_name, 0)
+            try:
+                progress_text += f"[Прогресс: {int(current_val)}] "
+            except (ValueError, TypeError):
+                logger.warning("⚠️ Значение поля %s не является числом: %s", field_name, current_val)
+        elif kind == "bar":
+            # Формат: bar:field_name
+            bar_field_name = part[1]
+            current_val = payload.get(bar_field_name, 0)
+            try:
+                current_step = int(current_val)
+                # Общее число шагов: max_steps из payload (по умолчанию 8),
+                # его можно переопределить полем total_steps_for_bar
+                total_steps = payload.get("max_steps", bar_length)
+                total_steps_bar = payload.get("total_steps_for_bar", total_steps if total_steps > 0 else bar_length)
+
+                # Создание визуального бара
+                filled = '█' * min(current_step, total_steps_bar)
+                empty = '░' * max(0, total_steps_bar - current_step)
+                progress_text += f"[{filled}{empty}]"
+            except (ValueError, TypeError):
+                logger.warning("⚠️ Значение поля %s для бара не является числом: %s", bar_field_name, current_val)
+
+    return progress_text
 
 def build_message_content(row, payload):
-    
-    # В функции build_message_content в начале:
-    print(f"[build_message] 🔍 DEBUG: Все поля в payload для состояния {payload.get('current_state')}:", file=sys.stderr)
-    for key, value in payload.items():
-        print(f"[build_message] 🔍   {key}: {value!r}", file=sys.stderr)
-        
     """Строит полное описание сообщения для отправки"""
     if not row:
         return None
 
-    content = {"type": "text"}
+    # План ответа скомпилирован при загрузке таблицы; для строк вне снимка — компилируем сейчас
+    plan = getattr(row, "plan", None) or compile_response_plan(row)
 
-    # --- НАЧАЛО: Логика для progress_config ---
-    progress_text = ""
-    progress_config = row.get("progress_config", "").strip()
-    if progress_config:
-        print(f"[build_message] 🔍 Обработка progress_config: '{progress_config}'", file=sys.stderr)
-
-        # Простой парсер для progress_config
-        parts = progress_config.split('|') # Поддержка комбинаций через |
-        current_step = 0
-        total_steps = 0
-        field_name = ""
-        bar_length = 8 # Длина визуального прогресс-бара
-
-        for part in parts:
-            part = part.strip()
-            if part == "disabled":
-                progress_text = ""
-                break # Отключаем прогресс для этой строки
-            elif part.startswith("manual:"):
-                # Формат: manual:current/total
-                try:
-                    current_str, total_str = part[len("manual:"):].split('/')
-                    current_step = int(current_str)
-                    total_steps = int(total_str)
-                    progress_text += f"[Шаг {current_step}/{total_steps}] "
-                except (ValueError, IndexError):
-                    print(f"[build_message] ⚠️ Неверный формат manual в progress_config: '{part}'", file=sys.stderr)
-            elif part.startswith("track:"):
-                # Формат: track:field_name
-                field_name = part[len("track:"):]
-                current_val = payload.get(field_name, 0)
-                try:
-                    current_step = int(current_val) # Предполагаем, что значение числовое
-                    # total_steps может быть задано отдельно или извлекаться из другого места
-                    # Для простоты, если не задано в manual, можно задать вручную или извлекать из payload
-                    # Пока просто отобразим значение поля
-                    progress_text += f"[Прогресс: {current_step}] "
-                except (ValueError, TypeError):
-                    print(f"[build_message] ⚠️ Значение поля {field_name} не является числом: {current_val}", file=sys.stderr)
-            elif part.startswith("bar:"):
-                # Формат: bar:field_name
-                # Для бара нужен current_step и total_steps
-                bar_field_name = part[len("bar:"):]
-                current_val = payload.get(bar_field_name, 0)
-                try:
-                    current_step = int(current_val)
-                    # total_steps должен быть известен. Его можно задать в manual или в payload
-                    # Попробуем найти из payload или использовать значение по умолчанию/из manual
-                    # Попробуем получить total_steps из payload, например, как max_steps
-                    total_steps = payload.get("max_steps", 8) # Значение по умолчанию 8
-                    # Если в manual был задан total, используем его
-                    # Это требует более сложной логики парсинга, чтобы передать total сюда
-                    # Упрощаем: если manual был, его total_steps уже использовалось выше для текста
-                    # или мы можем использовать отдельное поле в payload или фиксированное значение.
-                    # Для этого примера, используем payload.get("total_steps_for_bar") или 8
-                    total_steps_bar = payload.get("total_steps_for_bar", total_steps if total_steps > 0 else 8)
-
-                    # Создание визуального бара
-                    filled = '█' * min(current_step, total_steps_bar)
-                    empty = '░' * max(0, total_steps_bar - current_step)
-                    bar_str = f"[{filled}{empty}]"
-                    progress_text += bar_str
-                except (ValueError, TypeError):
-                    print(f"[build_message] ⚠️ Значение поля {bar_field_name} для бара не является числом: {current_val}", file=sys.stderr)
-
-        if progress_text:
-             print(f"[build_message] ✅ Сформирован прогресс: '{progress_text}'", file=sys.stderr)
-        else:
-             print(f"[build_message] 📉 Прогресс отключен или не рассчитан для config: '{progress_config}'", file=sys.stderr)
-    # --- КОНЕЦ: Логика для progress_config ---
-
-
-    # --- НАЧАЛО: Обработка message_text с учетом progress_text ---
-    # Текст сообщения (приоритет у message_text, потом notification)
-    message_text = ""
-    if row.get("message_text") and row["message_text"] != "—":
-        message_text = row["message_text"]
-    elif row.get("notification") and row["notification"] != "—":
-        message_text = format_notification(row, payload)
-
-    # Если есть текст, добавляем к нему progress_text (если он есть)
-    if message_text:
-        # Вставляем progress_text в начало message_text
-        full_message_text = progress_text + message_text
-        print(f"[build] message_text до fmt: {full_message_text!r}, payload: {payload}", file=sys.stderr)
-
-        # форматируем {placeholders} самостоятельно
-        # Обратите внимание: форматирование теперь применяется к объединённому тексту
-        if "{" in full_message_text:
-            # В цикле замены плейсхолдеров добавьте специальную обработку для location:
-            if "{" in full_message_text:
-                for key, value in payload.items():
-                    # Обрабатываем обычные плейсхолдеры {key}
-                    placeholder = "{" + key + "}"
-                    if placeholder in full_message_text:
-                        safe_val = str(value).replace("&", "&amp;").replace("<", "&lt;").replace(">", "&gt;")
-                        full_message_text = full_message_text.replace(placeholder, safe_val)
-                    
-                    # Обрабатываем вложенные плейсхолдеры {key[subkey]} для location
-                    if key == "location" and isinstance(value, dict):
-                        for subkey, subvalue in value.items():
-                            nested_placeholder = "{" + key + "[" + subkey + "]}"
-                            if nested_placeholder in full_message_text:
-                                safe_subval = str(subvalue).replace("&", "&amp;").replace("<", "&lt;").replace(">", "&gt;")
-                                full_message_text = full_message_text.replace(nested_placeholder, safe_subval)
-            print(f"[build] отформатировано: {full_message_text!r}", file=sys.stderr)
-            print(f"[build_message] 🔍 До форматирования: {full_message_text!r}", file=sys.stderr)
-            print(f"[build_message] 🔍 Payload keys: {list(payload.keys())}", file=sys.stderr)
-            if 'location' in payload:
-                print(f"[build_message] 🔍 Location в payload: {payload['location']}", file=sys.stderr)
-
-        content["text"] = full_message_text # <-- Теперь content["text"] содержит и прогресс, и основной текст
-
-    # --- КОНЕЦ: Обработка message_text с учетом progress_text ---
+    content = {"type": plan.content_type, "markup": plan.markup}
 
+    # Текст сообщения с прогрессом в начале
+    if plan.text_template:
+        progress_text = render_progress(plan.progress, payload) if plan.progress else ""
+        content["text"] = progress_text + plan.text_template.render(payload, escape=escaper_for(plan.parse_mode))
+        content["parse_mode"] = plan.parse_mode
 
     # Подпись для медиа
-    if row.get("caption") and row["caption"] != "—":
-        content["caption"] = row["caption"]
+    if plan.caption:
+        content["caption"] = plan.caption
+        content["caption_parse_mode"] = plan.caption_parse_mode
 
     # Медиа файлы
-    if row.get("media_file") and row["media_file"] != "—":
-        content["media_file"] = row["media_file"]
-
-        file_ext = row["media_file"].lower()
-        # Для URL файлов определяем тип по расширению в URL
-        if any(ext in file_ext for ext in ['.jpg', '.jpeg', '.png', '.gif', '.webp']):
-            content["type"] = "photo"
-        elif any(ext in file_ext for ext in ['.mp4', '.avi', '.mov', '.mkv']):
-            content["type"] = "video"
-        elif any(ext in file_ext for ext in ['.pdf', '.doc', '.docx', '.txt']):
-            content["type"] = "document"
-        elif any(ext in file_ext for ext in ['.mp3', '.wav', '.ogg']):
-            content["type"] = "audio"
+    if plan.media_file:
+        content["media_file"] = plan.media_file
 
     # Клавиатуры
-    if row.get("reply_markup") and row["reply_markup"] != "—":
-        content["reply_buttons"] = row["reply_markup"]
+    if plan.reply_buttons:
+        content["reply_buttons"] = plan.reply_buttons
 
-    if row.get("inline_markup") and row["inline_markup"] != "—":
-        content["inline_buttons"] = row["inline_markup"]
+    if plan.inline_buttons:
+        content["inline_buttons"] = plan.inline_buttons
 
-    # ДОБАВЛЕНО: Передача integrations для запроса геолокации
-    if row.get("integrations") and row["integrations"] != "—":
-        content["integrations"] = row["integrations"]
-        print(f"[build_message] 🔌 Интеграции: {row['integrations']}", file=sys.stderr)
+    # Передача integrations для запроса геолокации
+    if plan.integrations:
+        content["integrations"] = plan.integrations
 
-    # Опросы (только если тип ещё не определён)
-    if row.get("entities") and row["entities"] != "—" and content.get("type") == "text":
-        content["options"] = [opt.strip() for opt in row["entities"].split(',')]
-        content["type"] = "poll"
+    # Опросы
+    if plan.options:
+        content["options"] = list(plan.options)
 
-    print(f"[build_message] 🎨 Создан контент: {content['type']}, text: {bool(content.get('text'))}, media: {content.get('media_file')}, integrations: {content.get('integrations', 'нет')}", file=sys.stderr)
+    logger.debug("🎨 Создан контент: %s, text: %s, media: %s, integrations: %s", content['type'], bool(content.get('text')), content.get('media_file'), content.get('integrations', 'нет'))
 
-    return content
\ No newline at end of file
+    return content
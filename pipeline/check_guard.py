@@ -3,92 +3,400 @@
 # This file is part of Tablebot-pipe-Advanced and is licensed under the GNU GPL v3.0.
 # See the LICENSE file for details.
 #!/usr/bin/env python3
-import sys
+"""Guard-условия колонки condition.
 
-def check_guard(row, payload, current_state):
-    """Проверяет guard-условия для перехода"""
-    # БЕЗОПАСНОЕ ИЗВЛЕЧЕНИЕ - используем .get() с значением по умолчанию
-    condition = (row.get("condition") or "").strip()
-    
+Условие разбирается один раз (при загрузке таблицы) в объект-предикат;
+на каждое сообщение остаётся один вызов predicate(payload).
+
+Грамматика:
+    expr      := or_expr
+    or_expr   := and_expr ("or" and_expr)*
+    and_expr  := not_expr ("and" not_expr)*
+    not_expr  := "not" not_expr | "(" expr ")" | atom
+
+Атомы:
+    not_empty:field          поле не пустое
+    equals:field:value       str(payload[field]) == value
+    in:field:a,b,c           str(payload[field]) входит в множество
+    role:role                user_role == role
+    length>N:field           len(str(payload[field])) > N
+    has_location             в payload есть location
+    field>=N (>, <, <=, ==, !=)  числовое сравнение
+
+Значения с пробелами, and/or/not и скобками:
+    Слова and/or — операторы только между законченными атомами: слева стоит
+    разбираемое условие, справа начинается новое (атом, "not" или "(").
+    Иначе слово остаётся частью значения: equals:status:yes or no — одно
+    условие со значением «yes or no». Внутри значения "not" — обычное слово.
+    Значение можно взять в двойные кавычки — тогда and/or/not и скобки в нём
+    никогда не разбираются: equals:status:"yes or role:x", in:tag:"a (b)",c.
+    Кавычки вокруг значения (и каждого элемента in:) снимаются.
+"""
+import re
+from functools import lru_cache
+from core.log import get_logger
+
+logger = get_logger("check_guard")
+
+_KEYWORDS = ("and", "or", "not")
+_TOKEN_RE = re.compile(r'\(|\)|(?:[^\s()"]|"[^"]*")+')
+_ATOM_PREFIXES = ("not_empty:", "equals:", "in:", "role:", "length>")
+_FIELD_RE = re.compile(r"^[A-Za-z_]\w*$")
+_COMPARE_START_RE = re.compile(r"^[A-Za-z_]\w*(>=|<=|==|!=|>|<)")
+_OPERATOR_START_RE = re.compile(r"^(>=|<=|==|!=|>|<)")
+_VALUE_SPLIT_RE = re.compile(r',(?=(?:[^"]*"[^"]*")*[^"]*$)')   # запятая вне кавычек
+_COMPARE_RE = re.compile(r"^([A-Za-z_][\w]*)\s*(>=|<=|==|!=|>|<)\s*(-?\d+(?:[.,]\d+)?)$")
+
+
+class ConditionError(ValueError):
+    """Условие не удалось разобрать"""
+
+
+def _unquote(value):
+    """Снимает двойные кавычки вокруг значения"""
+    value = value.strip()
+    if len(value) >= 2 and value[0] == value[-1] == '"':
+        return value[1:-1]
+    return value
+
+
+def _to_number(value):
+    return float(str(value).strip().replace(",", "."))
+
+
+# --- Предикаты: вызов возвращает True, если условие выполнено ---
+
+class NotEmpty:
+    def __init__(self, field):
+        self.field = field
+
+    def __call__(self, payload):
+        value = payload.get(self.field, "")
+        return bool(value) and str(value).strip() != ""
+
+    def __repr__(self):
+        return f"not_empty:{self.field}"
+
+
+class Equals:
+    def __init__(self, field, value):
+        self.field = field
+        self.value = value
+
+    def __call__(self, payload):
+        return str(payload.get(self.field, "")) == self.value
+
+    def __repr__(self):
+        return f"equals:{self.field}:{self.value}"
+
+
+class InSet:
+    def __init__(self, field, values):
+        self.field = field
+        self.values = frozenset(values)
+
+    def __call__(self, payload):
+        return str(payload.get(self.field, "")) in self.values
+
+    def __repr__(self):
+        return f"in:{self.field}:{','.join(sorted(self.values))}"
+
+
+class RoleIs:
+    def __init__(self, role):
+        self.role = role
+
+    def __call__(self, payload):
+        return payload.get("user_role", "client") == self.role
+
+    def __repr__(self):
+        return f"role:{self.role}"
+
+
+class LengthGreater:
+    def __init__(self, min_length, field):
+        self.min_length = min_length
+        self.field = field
+
+    def __call__(self, payload):
+        return len(str(payload.get(self.field, ""))) > self.min_length
+
+    def __repr__(self):
+        return f"length>{self.min_length}:{self.field}"
+
+
+class HasLocation:
+    def __call__(self, payload):
+        return bool(payload.get("location"))
+
+    def __repr__(self):
+        return "has_location"
+
+
+class Compare:
+    _OPS = {
+        ">": lambda a, b: a > b,
+        ">=": lambda a, b: a >= b,
+        "<": lambda a, b: a < b,
+        "<=": lambda a, b: a <= b,
+        "==": lambda a, b: a == b,
+        "!=": lambda a, b: a != b,
+    }
+
+    def __init__(self, field, op, number):
+        self.field = field
+        self.op = op
+        self.number = number
+        self._compare = self._OPS[op]
+
+    def __call__(self, payload):
+        try:
+            return self._compare(_to_number(payload.get(self.field, "")), self.number)
+        except (ValueError, TypeError):
+            # Нечисловое значение не удовлетворяет числовому условию
+            return False
+
+    def __repr__(self):
+        return f"{self.field}{self.op}{self.number:g}"
+
+
+class And:
+    def __init__(self, *parts):
+        self.parts = parts
+
+    def __call__(self, payload):
+        return all(part(payload) for part in self.parts)
+
+    def __repr__(self):
+        return "(" + " and ".join(map(repr, self.parts)) + ")"
+
+
+class Or:
+    def __init__(self, *parts):
+        self.parts = parts
+
+    def __call__(self, payload):
+        return any(part(payload) for part in self.parts)
+
+    def __repr__(self):
+        return "(" + " or ".join(map(repr, self.parts)) + ")"
+
+
+class Not:
+    def __init__(self, part):
+        self.part = part
+
+    def __call__(self, payload):
+        return not self.part(payload)
+
+    def __repr__(self):
+        return f"not {self.part!r}"
+
+
+class Invalid:
+    """Условие, которое не удалось разобрать: переход всегда блокируется"""
+
+    def __init__(self, condition, error):
+        self.condition = condition
+        self.error = error
+
+    def __call__(self, payload):
+        return False
+
+    def __repr__(self):
+        return f"invalid({self.condition!r})"
+
+
+# --- Разбор ---
+
+def _parse_atom(text):
+    """Разбирает одно элементарное условие"""
+    if text.startswith("not_empty:"):
+        field = text[len("not_empty:"):]
+        if field:
+            return NotEmpty(field)
+
+    elif text.startswith("equals:"):
+        parts = text[len("equals:"):].split(":", 1)
+        if len(parts) == 2 and parts[0]:
+            return Equals(parts[0], _unquote(parts[1]))
+
+    elif text.startswith("in:"):
+        parts = text[len("in:"):].split(":", 1)
+        if len(parts) == 2 and parts[0]:
+            return InSet(parts[0], (_unquote(v) for v in _split_values(parts[1])))
+
+    elif text.startswith("role:"):
+        role = _unquote(text[len("role:"):])
+        if role:
+            return RoleIs(role)
+
+    elif text.startswith("length>"):
+        parts = text[len("length>"):].split(":", 1)
+        if len(parts) == 2:
+            try:
+                return LengthGreater(int(parts[0]), parts[1])
+            except ValueError:
+                raise ConditionError(f"Неверный формат длины: {parts[0]!r}")
+
+    elif text == "has_location":
+        return HasLocation()
+
+    else:
+        match = _COMPARE_RE.match(text)
+        if match:
+            field, op, number = match.groups()
+            return Compare(field, op, _to_number(number))
+
+    raise ConditionError(f"Неизвестное условие: {text!r}")
+
+
+def _split_values(text):
+    """Элементы in: через запятую; запятые в кавычках не делят"""
+    return _VALUE_SPLIT_RE.split(text)
+
+
+def _is_atom(text):
+    try:
+        _parse_atom(text)
+    except ConditionError:
+        return False
+    return True
+
+
+class _Parser:
+    def __init__(self, tokens):
+        self.tokens = tokens
+        self.pos = 0
+
+    def peek(self):
+        return self.tokens[self.pos] if self.pos < len(self.tokens) else None
+
+    def take(self):
+        token = self.peek()
+        self.pos += 1
+        return token
+
+    def parse(self):
+        expr = self.parse_or()
+        if self.peek() is not None:
+            raise ConditionError(f"Лишний токен: {self.peek()!r}")
+        return expr
+
+    def parse_or(self):
+        parts = [self.parse_and()]
+        while self.peek() == "or":
+            self.take()
+            parts.append(self.parse_and())
+        return parts[0] if len(parts) == 1 else Or(*parts)
+
+    def parse_and(self):
+        parts = [self.parse_not()]
+        while self.peek() == "and":
+            self.take()
+            parts.append(self.parse_not())
+        return parts[0] if len(parts) == 1 else And(*parts)
+
+    def parse_not(self):
+        token = self.peek()
+        if token == "not":
+            self.take()
+            return Not(self.parse_not())
+        if token == "(":
+            self.take()
+            expr = self.parse_or()
+            if self.take() != ")":
+                raise ConditionError("Не закрыта скобка")
+            return expr
+        if token is None or token in _KEYWORDS or token == ")":
+            raise ConditionError(f"Ожидалось условие, получено {token!r}")
+
+        # Атом — подряд идущие слова до оператора между атомами или скобки
+        words = [self.take()]
+        while self.peek() is not None and self.peek() not in ("(", ")"):
+            if self.peek() in ("and", "or") and self.is_operator(words):
+                break
+            words.append(self.take())
+        return _parse_atom(" ".join(words))
+
+    def is_operator(self, words):
+        """and/or после words — оператор, если слева законченный атом, а справа начинается условие"""
+        return self.starts_operand(self.pos + 1) and _is_atom(" ".join(words))
+
+    def starts_operand(self, pos):
+        token = self.tokens[pos] if pos < len(self.tokens) else None
+        if token is None:
+            # and/or в конце — оператор без правой части: ошибка, а не часть значения
+            return True
+        if token == "(":
+            return True
+        if token == "not":
+            return self.starts_operand(pos + 1)
+        if token.startswith(_ATOM_PREFIXES) or token == "has_location" or _COMPARE_START_RE.match(token):
+            return True
+        # Сравнение с пробелами: «age >= 18»
+        following = self.tokens[pos + 1] if pos + 1 < len(self.tokens) else ""
+        return bool(_FIELD_RE.match(token) and _OPERATOR_START_RE.match(following))
+
+
+@lru_cache(maxsize=None)
+def compile_condition(condition):
+    """Компилирует строку условия в предикат. Пустое условие — None.
+
+    Бросает ConditionError, если условие не удалось разобрать.
+    """
+    condition = (condition or "").strip()
     if not condition or condition == "—":
+        return None
+
+    if condition.count('"') % 2:
+        # Одиночная кавычка допустима в простом условии (equals:size:5"), но не в выражении
+        if any(word in _KEYWORDS for word in condition.split()):
+            raise ConditionError(f"Не закрыта кавычка: {condition!r}")
+        return _parse_atom(condition)
+    tokens = _TOKEN_RE.findall(condition)
+    if not any(token in _KEYWORDS for token in tokens):
+        # Простое условие целиком: значения могут содержать пробелы и скобки
+        return _parse_atom(condition)
+    return _Parser(tokens).parse()
+
+
+def compile_guards(rows, log=True):
+    """Компилирует условия всех строк таблицы. Возвращает список ошибок (line, condition, error)"""
+    errors = []
+    for row in rows:
+        condition = (row.get("condition") or "").strip()
+        try:
+            row.guard = compile_condition(condition)
+        except ConditionError as e:
+            row.guard = Invalid(condition, str(e))
+            line = getattr(row, "line", "?")
+            errors.append((line, condition, str(e)))
+            if log:
+                logger.error("❌ Строка %s: %s — переход будет заблокирован", line, e)
+    return errors
+
+
+def check_guard(row, payload, current_state):
+    """Проверяет guard-условия для перехода. Возвращает True, если переход нужно пропустить"""
+    guard = getattr(row, "guard", False)
+    if guard is False:
+        # Строка не из скомпилированной таблицы — компилируем (результат кэшируется)
+        try:
+            guard = compile_condition(row.get("condition"))
+        except ConditionError as e:
+            logger.error("❌ %s", e)
+            return True
+
+    if guard is None:
         return False
-    
-    print(f"[check_guard] 🛡️ Проверка условия: {condition}", file=sys.stderr)
-    
+
     try:
-        if condition.startswith('not_empty:'):
-            field = condition[10:]
-            value = payload.get(field, "")
-            if not value or str(value).strip() == "":
-                print(f"[check_guard] ❌ Условие не выполнено: поле {field} пустое", file=sys.stderr)
-                return True
-            else:
-                print(f"[check_guard] ✅ Условие выполнено: поле {field} не пустое", file=sys.stderr)
-                return False
-                
-        elif condition.startswith('equals:'):
-            # Формат: equals:field:value
-            parts = condition[7:].split(':', 1)
-            if len(parts) == 2:
-                field, expected_value = parts
-                actual_value = str(payload.get(field, ""))
-                if actual_value != expected_value:
-                    print(f"[check_guard] ❌ Условие не выполнено: {field}={actual_value} != {expected_value}", file=sys.stderr)
-                    return True
-                else:
-                    print(f"[check_guard] ✅ Условие выполнено: {field}={actual_value}", file=sys.stderr)
-                    return False
-        
-        # ДОБАВЛЕНО: Проверка роли пользователя
-        elif condition.startswith('role:'):
-            # Формат: role:expected_role
-            expected_role = condition[5:]
-            user_role = payload.get("user_role", "client")
-            if user_role != expected_role:
-                print(f"[check_guard] ❌ Условие роли не выполнено: user_role={user_role} != {expected_role}", file=sys.stderr)
-                return True
-            else:
-                print(f"[check_guard] ✅ Условие роли выполнено: user_role={user_role}", file=sys.stderr)
-                return False
-        
-        # ДОБАВЛЕНО: Проверка длины текста
-        elif condition.startswith('length>'):
-            # Формат: length>min_length:field
-            parts = condition[7:].split(':', 1)
-            if len(parts) == 2:
-                min_length_str, field = parts
-                try:
-                    min_length = int(min_length_str)
-                    text = str(payload.get(field, ""))
-                    if len(text) <= min_length:
-                        print(f"[check_guard] ❌ Условие длины не выполнено: len({field})={len(text)} <= {min_length}", file=sys.stderr)
-                        return True
-                    else:
-                        print(f"[check_guard] ✅ Условие длины выполнено: len({field})={len(text)} > {min_length}", file=sys.stderr)
-                        return False
-                except ValueError:
-                    print(f"[check_guard] ❌ Неверный формат длины: {min_length_str}", file=sys.stderr)
-                    return True
-        
-        # ДОБАВЛЕНО: Проверка наличия location
-        elif condition == 'has_location':
-            location = payload.get("location")
-            if not location:
-                print(f"[check_guard] ❌ Условие location не выполнено: location отсутствует", file=sys.stderr)
-                return True
-            else:
-                print(f"[check_guard] ✅ Условие location выполнено", file=sys.stderr)
-                return False
-        
-        else:
-            print(f"[check_guard] ⚠️ Неизвестный тип условия: {condition}", file=sys.stderr)
+        if guard(payload):
             return False
-            
-        
-    
-    
     except Exception as e:
-        print(f"[check_guard] ❌ Ошибка проверки условия: {e}", file=sys.stderr)
+        logger.error("❌ Ошибка проверки условия %r: %s", guard, e)
         return True
-    
-    return False
\ No newline at end of file
+
+    logger.debug("🚫 Условие не выполнено: %r", guard)
+    return True
@@ -3,7 +3,9 @@
 # See the LICENSE file for details.
 #!/usr/bin/env python3
 
-import sys
+from core.log import get_logger
+
+logger = get_logger("determine_transition")
 
 def determine_transition(row, skip_guard):
     """Определяет следующий стейт для перехода"""
@@ -12,7 +14,7 @@ def determine_transition(row, skip_guard):
     
     next_state = row.get("to_state")
     if next_state and next_state != "—":
-        print(f"[determine_transition] 🔄 Переход: {next_state!r}")
+        logger.debug("🔄 Переход: %r", next_state)
         return next_state
     
     return None
\ No newline at end of file
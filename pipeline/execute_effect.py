@@ -3,33 +3,156 @@
 # This file is part of Tablebot-pipe-Advanced and is licensed under the GNU GPL v3.0.
 # See the LICENSE file for details.
 #!/usr/bin/env python3
-import sys
-import asyncio
+from .template import render_template
+from .format_notification import format_notification, notification_parse_mode
+from core.geocoder import get_geocoder
+from core.session_directory import get_session_directory
+from core.log import get_logger
+
+logger = get_logger("execute_effect")
+
+# Действия result_action (имя — до первого ':'); проверяются при компиляции таблицы
+KNOWN_ACTIONS = frozenset((
+    'save', 'clear', 'notify_user_by_chat_id', 'geocode_location', 'request_location',
+    'notify_operator', 'notify_executor', 'notify_client', 'assign_executor',
+    'order_done', 'order_cancelled',
+))
+
+
+def action_outputs(action):
+    """Поля payload, которые записывает действие (для проверки порядка save: в цепочке)"""
+    name, _, args = action.partition(':')
+    if name == 'save':
+        return (args.split(':', 1)[0],)
+    if name == 'geocode_location':
+        return ('address', 'from_address')
+    if name == 'assign_executor':
+        return ('executor_chat_id',)
+    return ()
+
+
+def action_error(action):
+    """Текст ошибки формата одного действия result_action или None"""
+    name, _, args = action.partition(':')
+    if name not in KNOWN_ACTIONS:
+        return f"Неизвестное действие: {action!r}"
+    if name == 'save' and (':' not in args or not args.split(':', 1)[0]):
+        return f"Ожидается save:поле:значение, получено {action!r}"
+    if name == 'clear' and not args:
+        return f"Ожидается clear:поле, получено {action!r}"
+    if name == 'notify_user_by_chat_id':
+        target, sep, _ = args.partition(':')
+        if not sep or not target.lstrip('-').isdigit():
+            return f"Ожидается notify_user_by_chat_id:chat_id:текст, получено {action!r}"
+    return None
+
+
+def _format_save_value(value):
+    """Значение для save: — location-объект подставляется как «lat, lon»"""
+    if isinstance(value, dict) and "latitude" in value:
+        return f"{value.get('latitude')}, {value.get('longitude')}"
+    return str(value)
+
 
 async def reverse_geocode(lat, lon):
-    """Преобразует координаты в адрес с помощью Nominatim"""
+    """Преобразует координаты в адрес (кэш по ячейкам, см. core.geocoder)"""
     try:
-        from geopy.geocoders import Nominatim
-        geolocator = Nominatim(user_agent="tablebot_taxi")
-        location = await asyncio.to_thread(geolocator.reverse, (lat, lon))
-        return location.address if location else "Адрес не определен"
-    except ImportError:
-        print("[execute_effect] ⚠️ Установите geopy: pip install geopy", file=sys.stderr)
-        return f"Координаты: {lat}, {lon}"
+        address = await get_geocoder().reverse(lat, lon)
+        return address or "Адрес не определен"
     except Exception as e:
-        print(f"[execute_effect] ❌ Ошибка геокодирования: {e}", file=sys.stderr)
+        logger.error("❌ Ошибка геокодирования: %s", e)
         return f"Координаты: {lat}, {lon}"
 
+def _parse_filters(spec):
+    """«:поле=значение,поле=значение» -> dict"""
+    filters = {}
+    for part in spec.strip().lstrip(':').split(','):
+        if '=' in part:
+            field, value = part.split('=', 1)
+            filters[field.strip()] = value.strip()
+    return filters
+
+
+def _log_delivery(chat_id):
+    """Done-callback уведомления: ошибка доставки пишется в лог, результат никто не ждёт"""
+    def callback(future):
+        if future.cancelled():
+            logger.warning("⚠️ Уведомление в чат %s отменено", chat_id)
+        elif future.exception() is not None:
+            logger.error("❌ Уведомление в чат %s не доставлено: %s", chat_id, future.exception())
+    return callback
+
+
+def post_notification(bot, chat_id, content):
+    """Ставит уведомление в очередь планировщика без ожидания доставки.
+
+    Обработчик апдейта держит блокировку своего чата и слот обработки, а
+    лимит чата получателя — около 1 сообщения в секунду: ожидание доставки
+    каждому получателю задерживало бы ответ отправителю.
+    """
+    from core.message_sender import post_message_by_content, PRIORITY_NOTIFICATION
+
+    future = post_message_by_content(bot, chat_id, content, priority=PRIORITY_NOTIFICATION)
+    future.add_done_callback(_log_delivery(chat_id))
+    return future
+
+
+async def send_notifications(bot, chat_ids, row, payload, default_text="🔔 Новое уведомление"):
+    """Ставит уведомление строки (колонка notification) в очередь для указанных чатов; возвращает их число"""
+    if not bot or not chat_ids:
+        return 0
+
+    text = format_notification(row, payload)
+    content = {"type": "text", "text": text or default_text,
+               "parse_mode": notification_parse_mode(row) if text else None, "markup": None}
+    for chat_id in chat_ids:
+        post_notification(bot, chat_id, content)
+    return len(chat_ids)
+
+
+def _bot_id(bot):
+    """id бота для справочника сессий (None — бот не передан)"""
+    return bot.id if bot else None
+
+
+async def notify_role(bot, role, row, payload, filters_spec=""):
+    """Уведомляет все сессии с ролью role (и полями из фильтра), кроме текущего чата"""
+    try:
+        targets = get_session_directory(_bot_id(bot)).find(user_role=role, **_parse_filters(filters_spec))
+    except ValueError as e:
+        logger.error("❌ %s", e)
+        return 0
+    targets.discard(payload.get("chat_id"))
+    if not targets:
+        logger.warning("⚠️ Нет получателей с ролью %s", role)
+        return 0
+    return await send_notifications(bot, sorted(targets), row, payload)
+
+
+def assign_executor(payload, filters_spec="", bot_id=None):
+    """Выбирает исполнителя из справочника (по кругу среди подходящих). None — некого назначить"""
+    directory = get_session_directory(bot_id)
+    try:
+        candidates = sorted(directory.find(user_role="executor", **_parse_filters(filters_spec)))
+    except ValueError as e:
+        logger.error("❌ %s", e)
+        return None
+    if not candidates:
+        logger.warning("⚠️ Нет свободных исполнителей")
+        return None
+    return directory.pick_round_robin(candidates)
+
+
 async def execute_effect(row, payload, bot):  # ДОБАВЛЕНО: async
     """Выполняет side-effect действия из result_action"""
     # БЕЗОПАСНОЕ ИЗВЛЕЧЕНИЕ - используем .get() с значением по умолчанию
     result_action = (row.get("result_action") or "").strip()
     
     if not result_action or result_action == "—":
-        print("[execute_effect] ⏹️ Нет действия", file=sys.stderr)
+        logger.debug("⏹️ Нет действия")
         return
     
-    print(f"[execute_effect] 🔧 Выполняю: {result_action}", file=sys.stderr)
+    logger.debug("🔧 Выполняю: %s", result_action)
     
     # Парсим действия (могут быть разделены |)
     actions = [a.strip() for a in result_action.split('|') if a.strip()]
@@ -46,61 +169,37 @@ async def execute_effect(row, payload, bot):  # ДОБАВЛЕНО: async
                     if field == "location" and "location" in payload and isinstance(payload["location"], dict):
                         # Сохраняем location как объект, а не как строку
                         payload[field] = payload["location"]
-                        print(f"[execute_effect] 💾 Сохранено location как объект: {payload[field]}", file=sys.stderr)
+                        logger.debug("💾 Сохранено location как объект: %s", payload[field])
                     else:
-                        # Подставляем значения из payload в value_template
-                        value = value_template
-                        
-                        # Обрабатываем все плейсхолдеры {field_name}
-                        for key, val in payload.items():
-                            placeholder = '{' + key + '}'
-                            if placeholder in value:
-                                # Для location объекта подставляем отдельные поля
-                                if key == "location" and isinstance(val, dict):
-                                    value = value.replace("{location[latitude]}", str(val.get('latitude', '')))
-                                    value = value.replace("{location[longitude]}", str(val.get('longitude', '')))
-                                    value = value.replace("{location}", f"{val.get('latitude')}, {val.get('longitude')}")
-                                else:
-                                    # Для обычных полей просто подставляем значение
-                                    value = value.replace(placeholder, str(val))
-                        
-                        # Если остались незамещенные плейсхолдеры, пробуем найти их в payload
-                        if "{" in value:
-                            for key, val in payload.items():
-                                placeholder = '{' + key + '}'
-                                if placeholder in value:
-                                    value = value.replace(placeholder, str(val))
+                        # Подставляем значения из payload в value_template за один проход
+                        value = render_template(value_template, payload, convert=_format_save_value)
                         
                         payload[field] = value
-                        print(f"[execute_effect] 💾 Сохранено: {field} = {value}", file=sys.stderr)
+                        logger.debug("💾 Сохранено: %s = %s", field, value)
             
             elif action.startswith('clear:'):
                 # Формат: clear:field_name
                 field = action[6:]
                 if field in payload:
                     del payload[field]
-                    print(f"[execute_effect] 🗑️ Очищено: {field}", file=sys.stderr)
+                    logger.debug("🗑️ Очищено: %s", field)
             
             elif action.startswith('notify_user_by_chat_id:'):
                 # Формат: notify_user_by_chat_id:target_chat_id:message_template
-                parts = action[22:].split(':', 1)
+                parts = action[len('notify_user_by_chat_id:'):].split(':', 1)
                 if len(parts) == 2:
                     target_chat_id_str, message_template = parts
                     try:
                         target_chat_id = int(target_chat_id_str)
                         # Подставляем значения в шаблон сообщения
-                        message = message_template
-                        for key, val in payload.items():
-                            placeholder = '{' + key + '}'
-                            message = message.replace(placeholder, str(val))
+                        message = render_template(message_template, payload)
                         
                         # Отправляем сообщение (нужен доступ к bot)
                         if bot:
-                            from core.message_sender import send_message_by_content
-                            await send_message_by_content(bot, target_chat_id, {"type": "text", "text": message})  # ДОБАВЛЕНО: await
-                            print(f"[execute_effect] 📨 Уведомление отправлено в чат {target_chat_id}", file=sys.stderr)
+                            post_notification(bot, target_chat_id, {"type": "text", "text": message})
+                            logger.debug("📨 Уведомление поставлено в очередь для чата %s", target_chat_id)
                     except ValueError:
-                        print(f"[execute_effect] ❌ Неверный chat_id: {target_chat_id_str}", file=sys.stderr)
+                        logger.error("❌ Неверный chat_id: %s", target_chat_id_str)
             
             # В execute_effect.py добавьте обработку location
             elif action.startswith('geocode_location'):
@@ -110,38 +209,51 @@ async def execute_effect(row, payload, bot):  # ДОБАВЛЕНО: async
                     # Вызов API для обратного геокодирования
                     address = await reverse_geocode(lat, lon)
                     payload['address'] = address
-                    print(f"[execute_effect] 🗺️ Геокодирование: {lat},{lon} -> {address}", file=sys.stderr)
+                    logger.debug("🗺️ Геокодирование: %s,%s -> %s", lat, lon, address)
             
             # В функцию execute_effect добавьте:
             elif action == 'request_location':
-                print(f"[execute_effect] 📍 Запрос геолокации", file=sys.stderr)
+                logger.debug("📍 Запрос геолокации")
                 # Это действие только для логирования, реальный запрос делается в message_sender
             
-            # ДОБАВЛЕНО: Поддержка многоролевых действий из вашей таблицы
+            # Многоролевые действия: адресаты ищутся в справочнике сессий
             elif action.startswith('notify_operator'):
-                # Уведомление оператора
-                print(f"[execute_effect] 📢 Уведомление оператора", file=sys.stderr)
-                # Здесь можно добавить логику уведомления конкретного оператора
+                # Формат: notify_operator[:поле=значение,...] — всем операторам
+                sent = await notify_role(bot, "operator", row, payload, action[len('notify_operator'):])
+                logger.debug("📢 Уведомление операторов: %s", sent)
                 
             elif action.startswith('notify_executor'):
-                # Уведомление исполнителя
-                print(f"[execute_effect] 📢 Уведомление исполнителя", file=sys.stderr)
+                # Формат: notify_executor[:поле=значение,...], например notify_executor:current_state=idle
+                sent = await notify_role(bot, "executor", row, payload, action[len('notify_executor'):])
+                logger.debug("📢 Уведомление исполнителей: %s", sent)
                 
             elif action.startswith('notify_client'):
-                # Уведомление клиента
-                print(f"[execute_effect] 📢 Уведомление клиента", file=sys.stderr)
+                # Клиенту заказа (client_chat_id в payload) или клиентам по фильтру
+                client_chat_id = payload.get("client_chat_id")
+                if client_chat_id:
+                    sent = await send_notifications(bot, [int(client_chat_id)], row, payload)
+                elif action[len('notify_client'):].strip(':'):
+                    sent = await notify_role(bot, "client", row, payload, action[len('notify_client'):])
+                else:
+                    logger.warning("⚠️ notify_client: нет client_chat_id и фильтра — уведомление пропущено")
+                    sent = 0
+                logger.debug("📢 Уведомление клиента: %s", sent)
                 
             elif action.startswith('assign_executor'):
-                # Назначение исполнителя
-                print(f"[execute_effect] 👤 Назначение исполнителя", file=sys.stderr)
+                # Формат: assign_executor[:поле=значение,...] — выбирает исполнителя и уведомляет его
+                executor_chat_id = assign_executor(payload, action[len('assign_executor'):], _bot_id(bot))
+                if executor_chat_id is not None:
+                    payload["executor_chat_id"] = executor_chat_id
+                    await send_notifications(bot, [executor_chat_id], row, payload, default_text="👤 Вам назначен заказ")
+                logger.debug("👤 Назначение исполнителя: %s", executor_chat_id)
                 
             elif action.startswith('order_done'):
                 # Заказ завершен
-                print(f"[execute_effect] ✅ Заказ завершен", file=sys.stderr)
+                logger.debug("✅ Заказ завершен")
                 
             elif action.startswith('order_cancelled'):
                 # Заказ отменен
-                print(f"[execute_effect] ❌ Заказ отменен", file=sys.stderr)
+                logger.info("❌ Заказ отменен")
             
             elif action == 'geocode_location':
                 if 'location' in payload and isinstance(payload['location'], dict):
@@ -151,14 +263,14 @@ async def execute_effect(row, payload, bot):  # ДОБАВЛЕНО: async
                         address = await reverse_geocode(lat, lon)
                         payload['address'] = address
                         payload['from_address'] = address
-                        print(f"[execute_effect] 🗺️ Геокодирование: {lat},{lon} -> {address}", file=sys.stderr)
+                        logger.debug("🗺️ Геокодирование: %s,%s -> %s", lat, lon, address)
             
             
             
             else:
-                print(f"[execute_effect] ⚠️ Неизвестное действие: {action}", file=sys.stderr)
+                logger.warning("⚠️ Неизвестное действие: %s", action)
                 
         except Exception as e:
-            print(f"[execute_effect] ❌ Ошибка выполнения {action}: {e}", file=sys.stderr)
+            logger.error("❌ Ошибка выполнения %s: %s", action, e)
            
            
@@ -3,63 +3,57 @@
 # This file is part of Tablebot-pipe-Advanced and is licensed under the GNU GPL v3.0.
 # See the LICENSE file for details.
 #!/usr/bin/env python3
-import csv
-import sys
 from pathlib import Path
 
-def find_row(table_path, current_state, user_input, user_role=None):
-    """Находит подходящую строку в таблице для текущего состояния и ввода"""
-    try:
-        with open(table_path, encoding="utf-8") as f:
-            rows = list(csv.DictReader(f))
-    except Exception as e:
-        print(f"[find_row] ❌ Ошибка чтения таблицы: {e}", file=sys.stderr)
-        return None
+from core.table_index import TableIndex
+from core.log import get_logger
+
+logger = get_logger("find_row")
+
+# Кэш индексов для вызовов с путём к файлу: path -> (mtime, TableIndex)
+_index_cache = {}
+
+
+def _get_index(table_path):
+    """Возвращает скомпилированный индекс для файла таблицы (перечитывает только при изменении)"""
+    from core.table_artifact import load_compiled_table
 
-    print(f"[find_row] 🔍 Поиск: state={current_state!r}, text={user_input!r}, role={user_role!r}", file=sys.stderr)
+    path = Path(table_path)
+    mtime = path.stat().st_mtime_ns
+    cached = _index_cache.get(str(path))
+    if cached and cached[0] == mtime:
+        return cached[1]
 
-    matching_rows = []
-    
-    for i, row in enumerate(rows):
-        # Безопасное извлечение всех полей по именам
-        from_state = (row.get("from_state") or "").strip()
-        command = (row.get("command") or "").strip()
-        role = (row.get("role") or "").strip()
-        condition = (row.get("condition") or "").strip()
+    index = load_compiled_table(path).index
+    _index_cache[str(path)] = (mtime, index)
+    return index
+
+
+def match_row(table, current_state, user_input, user_role=None):
+    """Находит строку для текущего состояния и ввода: (row, captures).
+
+    table — скомпилированный TableIndex или путь к файлу таблицы.
+    captures — поля, захваченные шаблонной командой (re:, prefix:, range:,
+    <phone>, <email>), или None. Строка не найдена — (None, None).
+    """
+    try:
+        index = table if isinstance(table, TableIndex) else _get_index(table)
+    except Exception as e:
+        logger.error("❌ Ошибка чтения таблицы: %s", e)
+        return None, None
 
-        # Пропускаем строки с пустыми обязательными полями
-        if not from_state or not command:
-            continue
+    logger.debug("🔍 Поиск: state=%r, text=%r, role=%r", current_state, user_input, user_role)
 
-        # Проверяем совпадение состояния
-        if from_state != current_state and from_state != "any":
-            continue
+    found = index.match(current_state, user_input, user_role)
+    if found is None:
+        logger.debug("❌ Не найдено подходящих строк")
+        return None, None
 
-        # Проверяем совпадение роли (если роль указана в таблице)
-        if role and user_role and role != user_role and role != "any":
-            continue
+    row, captures = index.rows[found[0]], found[1]
+    logger.debug("✅ Найдена строка %s: state=%r, command=%r -> %r, захваты=%r", row.line, row.get('from_state'), row.get('command'), row.get('to_state', 'N/A'), captures)
+    return row, captures
 
-        # Проверяем совпадение команды
-        if command == user_input or command == "<text>" or command == "<location>":
-            matching_rows.append((i + 2, row))  # +2 потому что: 0-based index + 1 строка заголовков + 1 для человекочитаемого номера
-            print(f"[find_row] ✅ Найдено совпадение: строка {i+2}, state={from_state!r}, command={command!r}, role={role!r} -> {row.get('to_state', 'N/A')!r}", file=sys.stderr)
 
-    # Обработка дублирования строк
-    if len(matching_rows) > 1:
-        print(f"[find_row] ⚠️  Обнаружено дублирование! Найдено {len(matching_rows)} подходящих строк:", file=sys.stderr)
-        for line_num, row in matching_rows:
-            print(f"[find_row] ⚠️   - Строка {line_num}: from_state={row.get('from_state')!r}, command={row.get('command')!r}, to_state={row.get('to_state')!r}", file=sys.stderr)
-        
-        # Выбираем первую строку (приоритет по порядку в таблице)
-        selected_line, selected_row = matching_rows[0]
-        print(f"[find_row] ⚠️  Выбрана строка {selected_line} (первая в таблице)", file=sys.stderr)
-        print(f"[find_row] ✅ Финальный выбор: state={selected_row.get('from_state')!r}, command={selected_row.get('command')!r} -> {selected_row.get('to_state', 'N/A')!r}", file=sys.stderr)
-        return selected_row
-    
-    elif len(matching_rows) == 1:
-        line_num, row = matching_rows[0]
-        print(f"[find_row] ✅ Найдена одна подходящая строка {line_num}: state={row.get('from_state')!r}, command={row.get('command')!r} -> {row.get('to_state', 'N/A')!r}", file=sys.stderr)
-        return row
-    else:
-        print(f"[find_row] ❌ Не найдено подходящих строк", file=sys.stderr)
-        return None
\ No newline at end of file
+def find_row(table, current_state, user_input, user_role=None):
+    """Находит подходящую строку в таблице для текущего состояния и ввода (без захватов шаблона)"""
+    return match_row(table, current_state, user_input, user_role)[0]
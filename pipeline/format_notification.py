@@ -2,8 +2,18 @@
 # This file is part of Tablebot-pipe-Advanced and is licensed under the GNU GPL v3.0.
 # See the LICENSE file for details.
 #!/usr/bin/env python3
-import sys
-import html
+from .template import compile_template, escaper_for
+from core.message_sender.format_detector import detect_parse_mode
+from core.log import get_logger
+
+logger = get_logger("format_notification")
+
+def notification_parse_mode(row):
+    """parse_mode уведомления — как у обычных сообщений: по литералам шаблона, значения разметку не меняют"""
+    template = row.get("notification") if row else None
+    if not template or template == "—":
+        return None
+    return detect_parse_mode(compile_template(template).literal_text)
 
 def format_notification(row, payload):
     """Форматирует текст уведомления"""
@@ -12,17 +22,12 @@ def format_notification(row, payload):
     
     template = row["notification"]
     try:
-        # Заменяем {field} на значения из payload
-        text = template
-        for key, value in payload.items():
-            placeholder = "{" + key + "}"
-            if placeholder in text:
-                safe_value = html.escape(str(value))   # ← экранируем
-                text = text.replace(placeholder, str(safe_value))
+        # Заменяем {field} на значения из payload за один проход
+        text = compile_template(template).render(payload, escape=escaper_for(notification_parse_mode(row)))
         
-        print(f"[format_notification] 💬 Уведомление: {template!r} → {text!r}", file=sys.stderr)
+        logger.debug("💬 Уведомление: %r → %r", template, text)
         return text
     
     except Exception as e:
-        print(f"[format_notification] ❌ Ошибка форматирования: {e}", file=sys.stderr)
+        logger.error("❌ Ошибка форматирования: %s", e)
         return template
\ No newline at end of file
@@ -0,0 +1,109 @@
+# \tablebot-pipe-advanced\pipeline\payload.py
+# Copyright (C) 2025 Leonid Yasin
+# This file is part of Tablebot-pipe-Advanced and is licensed under the GNU GPL v3.0.
+# See the LICENSE file for details.
+#!/usr/bin/env python3
+import copy
+from core.log import get_logger
+
+logger = get_logger("payload")
+
+_MISSING = object()
+
+
+class SessionPayload(dict):
+    """Payload апдейта поверх данных сессии из FSM, запоминающий изменения.
+
+    Обычная запись (payload[key] = value, del, pop, update) отмечает ключ как
+    затронутый. changes() сравнивает затронутые ключи с данными сессии и
+    возвращает только реальные изменения. Вложенные значения сессии (dict, list,
+    set) копируются при создании и всегда сравниваются в changes(), поэтому
+    изменение на месте (payload["items"].append(...)) тоже сохраняется.
+    Значения через set_input() — входные
+    данные текущего апдейта (например, текст сообщения): они видны пайплайну,
+    но в сессию не пишутся, пока их явно не сохранят.
+    """
+
+    def __init__(self, stored=None):
+        stored = stored if stored is not None else {}
+        super().__init__(stored)
+        self._stored = stored
+        self._touched = set()
+        # Изменяемые значения — свои копии: иначе правка на месте видна и в stored, и сравнение её не заметит
+        self._nested = {key for key, value in stored.items() if isinstance(value, (dict, list, set))}
+        for key in self._nested:
+            dict.__setitem__(self, key, copy.deepcopy(stored[key]))
+
+    def set_input(self, key, value):
+        """Входное значение апдейта — не сохраняется в сессию"""
+        dict.__setitem__(self, key, value)
+
+    def __setitem__(self, key, value):
+        dict.__setitem__(self, key, value)
+        self._touched.add(key)
+
+    def __delitem__(self, key):
+        dict.__delitem__(self, key)
+        self._touched.add(key)
+
+    def pop(self, key, *default):
+        self._touched.add(key)
+        return dict.pop(self, key, *default)
+
+    def popitem(self):
+        key, value = dict.popitem(self)
+        self._touched.add(key)
+        return key, value
+
+    def setdefault(self, key, default=None):
+        if key not in self:
+            self[key] = default
+        return dict.__getitem__(self, key)
+
+    def update(self, *args, **kwargs):
+        for key, value in dict(*args, **kwargs).items():
+            self[key] = value
+
+    def clear(self):
+        self._touched.update(self.keys())
+        dict.clear(self)
+
+    def copy(self):
+        return dict(self)
+
+    def changes(self):
+        """Возвращает (изменённые ключи со значениями, удалённые ключи) относительно сессии"""
+        updated = {}
+        deleted = set()
+        stored = self._stored
+        for key in self._touched | self._nested:
+            value = self.get(key, _MISSING)
+            if value is _MISSING:
+                if key in stored:
+                    deleted.add(key)
+            elif stored.get(key, _MISSING) != value:
+                updated[key] = value
+        return updated, deleted
+
+
+async def persist_payload(state, payload):
+    """Сохраняет в FSM только изменения payload. Возвращает False, если писать нечего"""
+    updated, deleted = payload.changes()
+    if not updated and not deleted:
+        logger.debug("💤 Сессия не изменилась — запись пропущена")
+        return False
+
+    apply_delta = getattr(state.storage, "apply_delta", None)
+    if apply_delta is not None:
+        await apply_delta(state.key, updated, deleted)
+    elif deleted:
+        data = await state.get_data()
+        data.update(updated)
+        for key in deleted:
+            data.pop(key, None)
+        await state.set_data(data)
+    else:
+        await state.update_data(updated)
+
+    logger.debug("💾 Сессия: изменено %s, удалено %s", sorted(updated), sorted(deleted))
+    return True
@@ -3,7 +3,9 @@
 # See the LICENSE file for details.
 #!/usr/bin/env python3
 
-import sys
+from core.log import get_logger
+
+logger = get_logger("prepare_integration")
 
 def prepare_integration(row):
     """Подготавливает данные для интеграций"""
@@ -11,13 +13,27 @@ def prepare_integration(row):
         return None
     
     integration = row["integrations"]
-    print(f"[prepare_integration] 🔌 Интеграция: {integration!r}")
+    logger.debug("🔌 Интеграция: %r", integration)
     
     # Можно добавить парсинг разных типов интеграций
     if integration.startswith("http:"):
-        print(f"[prepare_integration] 🌐 HTTP запрос: {integration}")
+        logger.debug("🌐 HTTP запрос: %s", integration)
     
     elif integration.startswith("email:"):
-        print(f"[prepare_integration] 📧 Email: {integration}")
+        logger.debug("📧 Email: %s", integration)
     
-    return integration
\ No newline at end of file
+    return integration
+
+async def run_integration(integration, payload):
+    """Выполняет интеграцию строки: поля ответа записываются в payload.
+
+    True/False — HTTP-вызов удался или нет; None — интеграция не HTTP
+    (request_location, кнопки и т.п. обрабатываются при построении сообщения).
+    """
+    if not integration or not integration.startswith("http:"):
+        if integration and integration.startswith("email:"):
+            logger.warning("⚠️ Интеграция email: пока не поддерживается: %s", integration)
+        return None
+    # Импорт при вызове: core.integrations сам использует шаблоны pipeline
+    from core.integrations import get_integration_engine
+    return await get_integration_engine().run(integration, payload)
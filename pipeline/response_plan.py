@@ -0,0 +1,111 @@
+# \tablebot-pipe-advanced\pipeline\response_plan.py
+# Copyright (C) 2025 Leonid Yasin
+# This file is part of Tablebot-pipe-Advanced and is licensed under the GNU GPL v3.0.
+# See the LICENSE file for details.
+#!/usr/bin/env python3
+from dataclasses import dataclass
+
+from .template import compile_template
+from core.message_sender.format_detector import detect_parse_mode
+from core.message_sender.media_sender import detect_media_type
+from core.message_sender.markup_builder import resolve_markup
+from core.log import get_logger
+
+logger = get_logger("response_plan")
+
+
+@dataclass(frozen=True)
+class ResponsePlan:
+    """Всё, что в ответе не зависит от пользователя, посчитанное при загрузке таблицы.
+
+    На каждое сообщение остаётся только подстановка плейсхолдеров и прогресса.
+    """
+    content_type: str
+    text_template: object = None     # Template или None
+    parse_mode: str = None
+    progress: tuple = ()             # разобранный progress_config
+    caption: str = None
+    caption_parse_mode: str = None
+    media_file: str = None
+    reply_buttons: str = None
+    inline_buttons: str = None
+    integrations: str = None
+    options: tuple = None
+    markup: object = None            # готовый объект клавиатуры aiogram
+
+
+def _cell(row, column):
+    value = row.get(column)
+    return value if value and value != "—" else None
+
+
+def parse_progress_config(progress_config):
+    """Разбирает progress_config в кортеж шагов: ("manual", cur, total), ("track", field), ("bar", field), ("disabled",)"""
+    parts = []
+    for part in (progress_config or "").strip().split('|'):
+        part = part.strip()
+        if not part:
+            continue
+        if part == "disabled":
+            parts.append(("disabled",))
+        elif part.startswith("manual:"):
+            # Формат: manual:current/total
+            try:
+                current_str, total_str = part[len("manual:"):].split('/')
+                parts.append(("manual", int(current_str), int(total_str)))
+            except (ValueError, IndexError):
+                logger.warning("⚠️ Неверный формат manual в progress_config: '%s'", part)
+        elif part.startswith("track:"):
+            parts.append(("track", part[len("track:"):]))
+        elif part.startswith("bar:"):
+            parts.append(("bar", part[len("bar:"):]))
+    return tuple(parts)
+
+
+def compile_response_plan(row):
+    """Компилирует строку таблицы в неизменяемый план ответа"""
+    # Текст сообщения (приоритет у message_text, потом notification)
+    text_source = _cell(row, "message_text") or _cell(row, "notification")
+    text_template = compile_template(text_source) if text_source else None
+    # parse_mode по литералам шаблона: подставленные значения разметку не меняют
+    parse_mode = detect_parse_mode(text_template.literal_text) if text_template else None
+
+    content_type = "text"
+    media_file = _cell(row, "media_file")
+    if media_file:
+        # Для URL файлов тип определяется по расширению в URL
+        content_type = detect_media_type(media_file) or content_type
+
+    # Опросы (только если тип ещё не определён)
+    options = None
+    entities = _cell(row, "entities")
+    if entities and content_type == "text":
+        options = tuple(opt.strip() for opt in entities.split(','))
+        content_type = "poll"
+
+    caption = _cell(row, "caption")
+    reply_buttons = _cell(row, "reply_markup")
+    inline_buttons = _cell(row, "inline_markup")
+    integrations = _cell(row, "integrations")
+
+    return ResponsePlan(
+        content_type=content_type,
+        text_template=text_template,
+        parse_mode=parse_mode,
+        progress=parse_progress_config(row.get("progress_config")),
+        caption=caption,
+        caption_parse_mode=detect_parse_mode(caption) if caption else None,
+        media_file=media_file,
+        reply_buttons=reply_buttons,
+        inline_buttons=inline_buttons,
+        integrations=integrations,
+        options=options,
+        markup=resolve_markup(content_type, reply_buttons or "", inline_buttons or "", integrations or ""),
+    )
+
+
+def compile_response_plans(rows):
+    """Компилирует планы ответа для всех строк таблицы (row.plan)"""
+    for row in rows:
+        row.plan = compile_response_plan(row)
+    logger.debug("🧩 Скомпилировано планов ответа: %s", len(rows))
@@ -0,0 +1,134 @@
+# \tablebot-pipe-advanced\pipeline\template.py
+# Copyright (C) 2025 Leonid Yasin
+# This file is part of Tablebot-pipe-Advanced and is licensed under the GNU GPL v3.0.
+# See the LICENSE file for details.
+#!/usr/bin/env python3
+import re
+import html
+from functools import lru_cache
+
+# {field} или {field[key][subkey]}
+_PLACEHOLDER_RE = re.compile(r"\{([A-Za-z_]\w*)((?:\[[^\[\]{}]+\])*)\}")
+_PATH_RE = re.compile(r"\[([^\[\]{}]+)\]")
+_MARKDOWN_V2_RE = re.compile(r"([_*\[\]()~`>#+\-=|{}.!\\])")
+
+
+def escape_html(value):
+    return html.escape(value, quote=False)
+
+
+def escape_markdown_v2(value):
+    return _MARKDOWN_V2_RE.sub(r"\\\1", value)
+
+
+# Экранирование значений плейсхолдеров в зависимости от parse_mode сообщения
+ESCAPERS = {
+    "HTML": escape_html,
+    "MarkdownV2": escape_markdown_v2,
+}
+
+
+def escaper_for(parse_mode):
+    """Возвращает функцию экранирования для parse_mode (None — без экранирования)"""
+    return ESCAPERS.get(parse_mode)
+
+
+class Template:
+    """Шаблон, разобранный на литералы и поля.
+
+    Разбор выполняется один раз; render() собирает строку за один проход.
+    Плейсхолдер, которого нет в payload, остаётся в тексте как есть.
+    """
+
+    __slots__ = ("source", "segments", "literal_text", "fields")
+
+    def __init__(self, source):
+        self.source = source
+        segments = []
+        literals = []
+        fields = []
+        pos = 0
+        for match in _PLACEHOLDER_RE.finditer(source):
+            if match.start() > pos:
+                segments.append(source[pos:match.start()])
+                literals.append(source[pos:match.start()])
+            path = tuple(_PATH_RE.findall(match.group(2)))
+            # Поле: (имя, путь вложенных ключей, исходный текст плейсхолдера)
+            segments.append((match.group(1), path, match.group(0)))
+            fields.append(match.group(1))
+            pos = match.end()
+        if pos < len(source):
+            segments.append(source[pos:])
+            literals.append(source[pos:])
+
+        self.segments = tuple(segments)
+        self.literal_text = "".join(literals)
+        self.fields = tuple(fields)
+
+    def render(self, payload, escape=None, convert=str):
+        """Подставляет значения из payload. escape применяется только к значениям"""
+        if not self.fields:
+            return self.source
+
+        parts = []
+        for segment in self.segments:
+            if segment.__class__ is str:
+                parts.append(segment)
+                continue
+
+            name, path, raw = segment
+            if name not in payload:
+                parts.append(raw)
+                continue
+
+            value = payload[name]
+            for key in path:
+                if isinstance(value, dict) and key in value:
+                    value = value[key]
+                elif isinstance(value, (list, tuple)) and key.isdigit() and int(key) < len(value):
+                    value = value[int(key)]
+                else:
+                    value = None
+                    break
+            if value is None and path:
+                parts.append(raw)
+                continue
+
+            text = convert(value)
+            parts.append(escape(text) if escape else text)
+        return "".join(parts)
+
+
+@lru_cache(maxsize=4096)
+def compile_template(source):
+    """Возвращает разобранный шаблон (кэшируется по тексту шаблона)"""
+    return Template(source or "")
+
+
+def render_template(source, payload, escape=None, convert=str):
+    """Разбирает (с кэшем) и заполняет шаблон"""
+    return compile_template(source).render(payload, escape=escape, convert=convert)
+
+
+def compile_row_templates(rows):
+    """Заранее разбирает все шаблоны таблицы: message_text, notification и шаблоны в result_action"""
+    count = 0
+    for row in rows:
+        for column in ("message_text", "notification"):
+            value = row.get(column)
+            if value and value != "—":
+                compile_template(value)
+                count += 1
+        for action in (row.get("result_action") or "").split("|"):
+            action = action.strip()
+            if action.startswith("save:"):
+                parts = action[len("save:"):].split(":", 1)
+                if len(parts) == 2:
+                    compile_template(parts[1])
+                    count += 1
+            elif action.startswith("notify_user_by_chat_id:"):
+                parts = action[len("notify_user_by_chat_id:"):].split(":", 1)
+                if len(parts) == 2:
+                    compile_template(parts[1])
+                    count += 1
+    return count